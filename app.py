@@ -1,20 +1,26 @@
 import os
+import hashlib
 import streamlit as st
 import pandas as pd
 import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 from collections import OrderedDict
-from io import BytesIO
 
 # 自作モジュールのインポート
-from auth import check_password
-from utils.data_loader import load_shipping_rates, load_population_data
-from utils.calculator import (
-    calculate_regional_shipments,
-    calculate_shipping_costs,
-    calculate_summary
-)
+from auth import check_password, is_profiling_mode
+from utils.data_loader import load_rate_table, find_carrier_rates_paths
+from utils.validation import RateCsvError, read_rate_csv
+from utils.carriers import CarrierRates
+from utils.cache import ResultCache
+from utils.calculator import calculate_quote
+from utils.export import export_forecast_workbook, export_workbook, result_fingerprint
+from utils.forecast import MAX_PERIODS, calculate_forecast, forecast_total_summary, iter_period_summaries
+from utils.incremental import IncrementalCalculator
+from utils.profiling import RerunProfiler
+from utils.registry import TableRegistry
+from utils.simulation import simulate_costs
+from utils.surcharges import SurchargeRuleError
 
 # ページ設定
 st.set_page_config(
@@ -23,13 +29,70 @@ st.set_page_config(
     layout="wide"
 )
 
+# 開発用: 再実行ごとの区間別の処理時間を計測する（PROFILING_MODE=true の場合のみ）
+profiler = RerunProfiler(enabled=is_profiling_mode()).start()
+
 # パスワード認証
 if not check_password():
     st.stop()
+profiler.checkpoint("認証")
+
+def get_file_mtime(file_path):
+    """キャッシュキー用にファイルの更新時刻を取得する（ファイルがない場合は None）"""
+    return os.path.getmtime(file_path) if file_path else None
+
+# 送料データと人口データは全セッションで共有する（読み取り専用として扱う）
+# ファイルが更新されるとバックグラウンドで読み込み直して差し替えるため、再起動は不要
+@st.cache_resource(show_spinner=False)
+def get_table_registry():
+    return TableRegistry().start()
+
+# 運送会社別の送料データ（data/carriers/*.csv）
+# 現在の送料データと同じ形式なので、CarrierRates にまとめるまでは RateTable として共有する
+@st.cache_resource(max_entries=16, show_spinner=False)
+def get_carrier_rate_table(file_path, mtime):
+    return load_rate_table(file_path)
+
+# 計算結果のキャッシュ（全セッションで共有）
+@st.cache_resource(show_spinner=False)
+def get_result_cache():
+    return ResultCache(
+        max_entries=int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "256")),
+        max_bytes=int(os.getenv("RESULT_CACHE_MAX_MB", "64")) * 1024 * 1024
+    )
 
-# データ読み込み
-shipping_rates = load_shipping_rates()
-population_data = load_population_data()
+# Excelファイルは結果のハッシュ値ごとにキャッシュする（同じ結果は全セッションで共有）
+# 先頭が _ の引数はキャッシュキーに含めない
+@st.cache_resource(max_entries=32, show_spinner=False)
+def build_export_workbook(fingerprint, _size_results, _summary):
+    return export_workbook(_size_results, _summary)
+
+# 予測のExcelファイルも予測の条件ごとにキャッシュする
+@st.cache_resource(max_entries=16, show_spinner=False)
+def build_forecast_workbook(forecast_key, _forecast, _shipping_rates, _forecast_total):
+    return export_forecast_workbook(_forecast, iter_period_summaries(_forecast, _shipping_rates), _forecast_total)
+
+# アップロードする送料CSVの上限
+upload_limits = {
+    'max_bytes': int(os.getenv("UPLOAD_MAX_KB", "1024")) * 1024,
+    'max_rows': int(os.getenv("UPLOAD_MAX_ROWS", "1000"))
+}
+
+# 送料の範囲のシミュレーションに使うプロセス数（既定の1ではサーバーのプロセス内で計算する）
+simulation_workers = int(os.getenv("SIMULATION_WORKERS", "1"))
+
+# 差分計算の結果を毎回すべて計算し直した結果と比較する（検証用）
+incremental_check = os.getenv("INCREMENTAL_CHECK", "false").lower() in ("true", "1", "yes")
+
+# データ読み込み（1回の実行の間は同じ版の送料データ・人口データを使う）
+try:
+    table_snapshot = get_table_registry().current()
+except SurchargeRuleError as e:
+    st.error(f"割増・手数料の規則ファイルを読み込めませんでした: {str(e)}")
+    st.stop()
+shipping_rates = table_snapshot.rate_table
+population_data = table_snapshot.population_data
+profiler.checkpoint("データ読み込み")
 
 # サイドバー - 入力フォーム
 with st.sidebar:
@@ -49,8 +112,9 @@ with st.sidebar:
     st.subheader("荷物サイズと割合")
     st.markdown("各サイズの出荷割合を設定してください（合計が100%になるようにします）")
     
-    # サイズオプションの取得
-    size_options = shipping_rates[['size_code', 'size_name', 'weight']].copy()
+    # サイズオプションの取得（表示ラベルとサイズコードは送料テーブル作成時に計算済み）
+    size_display = shipping_rates.labels
+    size_values = shipping_rates.size_codes
     
     # サイズ選択と割合の入力用のコンテナ
     size_selections = []
@@ -65,16 +129,13 @@ with st.sidebar:
     size_distribution = {}
     
     # 各サイズ選択で使用できるサイズのリストを管理
-    available_size_indices = list(range(len(size_options)))
+    available_size_indices = list(range(len(size_values)))
     
     for i in range(size_count):
         st.markdown(f"**サイズ {i+1}**")
         col1, col2 = st.columns([2, 1])
         
         with col1:
-            size_display = [f"{row['size_name']} ({row['weight']})" for _, row in size_options.iterrows()]
-            size_values = size_options['size_code'].tolist()
-            
             # デフォルト値の設定 - 残りの選択肢から選ぶ
             default_index = min(i, len(available_size_indices) - 1)
             if available_size_indices:
@@ -144,6 +205,7 @@ with st.sidebar:
     
     # 計算実行ボタン
     calc_button = st.button("送料を計算", type="primary")
+profiler.checkpoint("入力フォーム")
 
 # サイドバー - 送料データのアップロード機能
 with st.sidebar:
@@ -158,42 +220,85 @@ with st.sidebar:
     uploaded_file = st.file_uploader("送料CSVファイルをアップロード", type="csv")
     
     if uploaded_file is not None:
-        try:
-            # アップロードされたCSVを読み込み
-            uploaded_shipping_rates = pd.read_csv(uploaded_file)
-            
-            # 必要なカラムが含まれているか確認
-            required_columns = ['size_code', 'size_name', 'weight', '北海道', '北東北', '南東北', 
-                              '関東', '信越', '北陸', '中部', '関西', '中国', '四国', '九州', '沖縄']
-            
-            missing_columns = [col for col in required_columns if col not in uploaded_shipping_rates.columns]
-            
-            if missing_columns:
-                st.error(f"以下の必須カラムがCSVファイルに含まれていません: {', '.join(missing_columns)}")
-            else:
+        upload_digest = hashlib.sha256(uploaded_file.getvalue()).hexdigest()
+        
+        # 同じ内容のファイルはウィジェット操作のたびに再解析しない
+        if st.session_state.get('custom_shipping_rates_digest') != upload_digest:
+            try:
+                # 見出し（サイズ情報と、人口データの全地域）・行数・サイズを検証しながら送料テーブルに変換し、
                 # セッションステートに保存（一時的な使用のみ）
-                st.session_state.custom_shipping_rates = uploaded_shipping_rates
-                st.success("送料データを正常に読み込みました！セッション中のみ有効です。")
-                
-                # アップロードされたデータの確認表示
-                with st.expander("アップロードしたデータを確認"):
-                    st.dataframe(uploaded_shipping_rates)
+                st.session_state.custom_shipping_rates = read_rate_csv(
+                    uploaded_file.getvalue(), list(population_data.index), **upload_limits
+                )
+                st.session_state.custom_shipping_rates_digest = upload_digest
                 
-        except Exception as e:
-            st.error(f"ファイルの読み込み中にエラーが発生しました: {str(e)}")
+            except RateCsvError as e:
+                st.error(str(e))
+            except Exception as e:
+                st.error(f"ファイルの読み込み中にエラーが発生しました: {str(e)}")
+        
+        if st.session_state.get('custom_shipping_rates_digest') == upload_digest:
+            st.success("送料データを正常に読み込みました！セッション中のみ有効です。")
+            
+            # アップロードされたデータの確認表示
+            with st.expander("アップロードしたデータを確認"):
+                st.dataframe(st.session_state.custom_shipping_rates.to_dataframe())
 
-# データ読み込み（アップロードされたデータを優先）
+# サイドバー - 運送会社の比較
+with st.sidebar:
+    st.markdown("---")
+    st.subheader("運送会社の比較")
+    
+    carrier_files = st.file_uploader(
+        "比較する運送会社の送料CSVファイル（ファイル名を運送会社名とします）",
+        type="csv",
+        accept_multiple_files=True
+    )
+    
+    # アップロードされた送料データは内容のハッシュ値ごとにセッション中のみ保持する
+    uploaded_carriers = {}
+    carrier_uploads = st.session_state.setdefault('carrier_uploads', {})
+    for carrier_file in carrier_files or []:
+        carrier_name = os.path.splitext(carrier_file.name)[0]
+        carrier_digest = hashlib.sha256(carrier_file.getvalue()).hexdigest()
+        if carrier_digest not in carrier_uploads:
+            try:
+                carrier_uploads[carrier_digest] = read_rate_csv(
+                    carrier_file.getvalue(), list(population_data.index), **upload_limits
+                )
+            except Exception as e:
+                st.error(f"{carrier_name}の読み込み中にエラーが発生しました: {str(e)}")
+                continue
+        uploaded_carriers[carrier_name] = carrier_uploads[carrier_digest]
+
+# データ読み込み（アップロードされたデータを優先、それ以外は共有キャッシュの送料データを使用）
 if 'custom_shipping_rates' in st.session_state:
     shipping_rates = st.session_state.custom_shipping_rates
     st.info("アップロードされた送料データを使用しています（セッション中のみ有効）")
-else:
-    shipping_rates = load_shipping_rates()
+
+# 比較する運送会社（現在の送料データ・data/carriers のファイル・アップロードされたファイル）
+carrier_tables = {"現在の送料データ": shipping_rates}
+for carrier_name, carrier_path in find_carrier_rates_paths().items():
+    try:
+        carrier_tables[carrier_name] = get_carrier_rate_table(carrier_path, get_file_mtime(carrier_path))
+    except Exception as e:
+        st.warning(f"{carrier_name}の送料データを読み込めませんでした: {str(e)}")
+carrier_tables.update(uploaded_carriers)
+
+carrier_rates = None
+if len(carrier_tables) > 1:
+    try:
+        carrier_rates = CarrierRates(carrier_tables, regions=list(population_data.index))
+    except ValueError as e:
+        st.warning(f"運送会社の比較を行えません: {str(e)}")
+profiler.checkpoint("送料データのアップロード・運送会社")
 
 # メインコンテンツ
 st.title("送料シミュレーター")
 
 # 初期状態または計算の実行
-if calc_button:
+# 一度計算した後は、出荷比率やサイズ別の割合を変更するたびに差分計算で結果を更新する
+if calc_button or st.session_state.get('has_result'):
     # 人口分布データの準備（カスタム比率を使用する場合は置き換え）
     working_population_data = population_data.copy()
     
@@ -209,27 +314,47 @@ if calc_button:
     #         st.write("選択したサイズ分布:", size_distribution)
     #         st.dataframe(shipping_rates.head())
     
-    # 地域別出荷数の計算
-    shipments_result = calculate_regional_shipments(total_shipments, working_population_data)
-    
     try:
-        # 送料計算（複数サイズ対応）
-        result, size_results = calculate_shipping_costs(shipments_result, shipping_rates, size_distribution)
-        
-        # 集計結果の計算
-        summary = calculate_summary(result, size_results)
+        calculator = st.session_state.get('incremental_calculator')
+        if calc_button or calculator is None or not calculator.matches(shipping_rates, carrier_rates):
+            # 地域別出荷数・送料（複数サイズ対応）・集計結果の計算（同じ入力の結果はキャッシュから取得）
+            result, size_results, summary = calculate_quote(
+                total_shipments,
+                working_population_data,
+                shipping_rates,
+                size_distribution,
+                cache=get_result_cache(),
+                carrier_rates=carrier_rates
+            )
+            # 以降の入力の変更は前回の計算状態からの差分で計算する（計算状態はセッションごとに保持）
+            st.session_state.incremental_calculator = IncrementalCalculator(
+                shipping_rates, carrier_rates, check=incremental_check
+            )
+            updated = True
+        else:
+            result, size_results, summary = calculator.update(
+                total_shipments,
+                working_population_data,
+                size_distribution
+            )
+            updated = calculator.last_update[0] != 'unchanged'
         
         # 結果を保存（セッションステートに格納）
-        st.session_state.result = result
-        st.session_state.size_results = size_results
-        st.session_state.summary = summary
-        st.session_state.size_distribution = size_distribution
-        st.session_state.has_result = True
+        # 入力が変わっていない場合は保存済みの結果をそのまま使う（ハッシュ値も計算し直さない）
+        if updated:
+            st.session_state.result = result
+            st.session_state.size_results = size_results
+            st.session_state.summary = summary
+            st.session_state.size_distribution = size_distribution
+            st.session_state.population_data = working_population_data
+            st.session_state.result_fingerprint = result_fingerprint(result, size_results, summary)
+            st.session_state.has_result = True
         
     except Exception as e:
         st.error(f"計算中にエラーが発生しました: {str(e)}")
         import traceback
         st.code(traceback.format_exc())
+profiler.checkpoint("計算")
 
 # 結果の表示（計算が実行された場合）
 if 'has_result' in st.session_state and st.session_state.has_result:
@@ -248,7 +373,183 @@ if 'has_result' in st.session_state and st.session_state.has_result:
         st.metric("総送料", f"{summary['total_cost']:,.0f}円")
     with col3:
         st.metric("1個あたりの平均送料", f"{summary['average_cost']:.1f}円")
+    # 割増・手数料（送料データと同じディレクトリに規則ファイルがある場合のみ）
+    if 'surcharge_info' in summary:
+        col1, col2 = st.columns(2)
+        with col1:
+            st.metric("割増・手数料の合計", f"{summary['surcharge_total']:,.0f}円")
+        with col2:
+            st.metric("請求額（送料＋割増・手数料）", f"{summary['invoice_total']:,.0f}円")
+        with st.expander("割増・手数料の内訳"):
+            st.dataframe(pd.DataFrame([
+                {
+                    "項目": info['name'],
+                    "種類": "割合" if info['type'] == 'percentage' else "1個あたり",
+                    "金額": f"{info['cost']:,.0f}円"
+                }
+                for info in summary['surcharge_info']
+            ]), use_container_width=True, hide_index=True)
+    st.caption(f"送料データのバージョン: {summary['rate_table_version']}")
+    profiler.checkpoint("集計結果の表示")
     
+    ############################
+    # 需要のばらつきを考慮した送料の範囲（モンテカルロシミュレーション）
+    with st.expander("送料の範囲（需要のばらつきを考慮）"):
+        sim_col1, sim_col2, sim_col3 = st.columns(3)
+        with sim_col1:
+            n_draws = st.select_slider("試行回数", options=[10_000, 100_000, 1_000_000], value=100_000)
+        with sim_col2:
+            region_concentration = st.number_input(
+                "地域別比率の集中度", min_value=1.0, value=200.0, step=10.0,
+                help="小さいほど地域別比率のばらつきが大きくなります"
+            )
+        with sim_col3:
+            size_concentration = st.number_input(
+                "サイズ構成の集中度", min_value=1.0, value=100.0, step=10.0,
+                help="小さいほどサイズ構成のばらつきが大きくなります"
+            )
+
+        if st.button("送料の範囲を計算"):
+            with st.spinner("シミュレーション中..."):
+                try:
+                    st.session_state.simulation = simulate_costs(
+                        summary['total_shipments'],
+                        st.session_state.population_data,
+                        shipping_rates,
+                        size_distribution,
+                        n_draws=n_draws,
+                        region_concentration=region_concentration,
+                        size_concentration=size_concentration,
+                        seed=0,
+                        workers=simulation_workers
+                    )
+                    st.session_state.simulation_fingerprint = st.session_state.result_fingerprint
+                except ValueError as e:
+                    st.error(f"シミュレーションの条件が正しくありません: {e}")
+
+        # 現在の計算結果に対するシミュレーション結果のみ表示する
+        if st.session_state.get('simulation_fingerprint') == st.session_state.result_fingerprint:
+            simulation = st.session_state.simulation
+            p_low, p_mid, p_high = simulation['percentiles']
+            range_col1, range_col2, range_col3 = st.columns(3)
+            with range_col1:
+                st.metric(f"総送料 P{p_low}", f"{simulation['total_cost'][p_low]:,.0f}円")
+            with range_col2:
+                st.metric(f"総送料 P{p_mid}", f"{simulation['total_cost'][p_mid]:,.0f}円")
+            with range_col3:
+                st.metric(f"総送料 P{p_high}", f"{simulation['total_cost'][p_high]:,.0f}円")
+
+            region_range_df = pd.DataFrame(
+                {f"P{p}": simulation['region_cost'][p] for p in simulation['percentiles']},
+                index=pd.Index(simulation['regions'], name="地域")
+            )
+            st.dataframe(region_range_df.style.format("{:,.0f}円"), use_container_width=True)
+
+    profiler.checkpoint("送料の範囲")
+
+    ############################
+    # 月ごとの送料予測（成長率・季節変動・地域別比率の変化）
+    with st.expander("期間別の予測（成長率・季節変動）"):
+        fc_col1, fc_col2, fc_col3 = st.columns(3)
+        with fc_col1:
+            forecast_periods = st.number_input("期間（か月）", min_value=1, max_value=MAX_PERIODS, value=12, step=1)
+        with fc_col2:
+            growth_percent = st.number_input(
+                "月次の成長率（%）", min_value=-50.0, max_value=100.0, value=0.0, step=0.5,
+                help="1か月目の出荷個数は現在の総出荷個数とし、毎月この割合で増減します"
+            )
+        with fc_col3:
+            forecast_start = st.text_input("開始年月（YYYY-MM）", value=pd.Timestamp.now().strftime('%Y-%m'))
+
+        season_col, drift_col = st.columns(2)
+        with season_col:
+            season_df = st.data_editor(
+                pd.DataFrame({"季節係数": [1.0] * 12}, index=pd.Index([f"{m}月" for m in range(1, 13)], name="月")),
+                use_container_width=True,
+                key="forecast_seasonality"
+            )
+        with drift_col:
+            drift_df = st.data_editor(
+                pd.DataFrame({"月次の変化率（%）": [0.0] * len(st.session_state.population_data)},
+                             index=pd.Index(st.session_state.population_data.index, name="地域")),
+                use_container_width=True,
+                key="forecast_drift"
+            )
+
+        if st.button("期間別に予測"):
+            try:
+                seasonality = season_df["季節係数"].to_numpy(dtype=float)
+                # 空欄の地域は変化なしとして扱う
+                region_drift = {
+                    region: rate / 100
+                    for region, rate in drift_df["月次の変化率（%）"].dropna().items() if rate != 0
+                }
+                forecast = calculate_forecast(
+                    summary['total_shipments'],
+                    st.session_state.population_data,
+                    shipping_rates,
+                    size_distribution,
+                    periods=int(forecast_periods),
+                    growth_rate=growth_percent / 100,
+                    seasonality=seasonality,
+                    start=forecast_start or None,
+                    region_drift=region_drift,
+                    carrier_rates=carrier_rates
+                )
+                st.session_state.forecast = forecast
+                st.session_state.forecast_total = forecast_total_summary(forecast, shipping_rates)
+                st.session_state.forecast_fingerprint = st.session_state.result_fingerprint
+                # 予測のExcelファイルのキャッシュキー（計算結果と予測の条件から作成する）
+                st.session_state.forecast_key = hashlib.sha1(repr((
+                    st.session_state.result_fingerprint,
+                    int(forecast_periods),
+                    growth_percent,
+                    seasonality.tolist(),
+                    forecast_start,
+                    sorted(region_drift.items()),
+                    list(carrier_tables)
+                )).encode('utf-8')).hexdigest()
+            except ValueError as e:
+                st.error(f"予測の条件が正しくありません: {e}")
+
+        # 現在の計算結果に対する予測のみ表示する
+        if st.session_state.get('forecast_fingerprint') == st.session_state.result_fingerprint:
+            forecast = st.session_state.forecast
+            forecast_total = st.session_state.forecast_total
+            total_col1, total_col2, total_col3 = st.columns(3)
+            with total_col1:
+                st.metric(f"{len(forecast['periods'])}か月の総出荷個数", f"{forecast_total['total_shipments']:,}個")
+            with total_col2:
+                st.metric(f"{len(forecast['periods'])}か月の総送料", f"{forecast_total['total_cost']:,.0f}円")
+            with total_col3:
+                st.metric("1個あたりの平均送料", f"{forecast_total['average_cost']:.1f}円")
+
+            period_df = pd.DataFrame(
+                {
+                    "出荷個数": forecast['total_shipments'],
+                    "送料合計(円)": forecast['total_cost'],
+                    "平均送料(円)": forecast['average_cost'].round(1)
+                },
+                index=pd.Index(forecast['periods'], name="期間")
+            )
+            st.bar_chart(period_df["送料合計(円)"])
+            st.dataframe(period_df, use_container_width=True)
+
+            # Excelファイルは「予測のExcelファイルを作成」が押されたときだけ作成し、予測の条件ごとにキャッシュする
+            forecast_key = st.session_state.forecast_key
+            if st.button("予測のExcelファイルを作成"):
+                st.session_state.forecast_export_key = forecast_key
+
+            if st.session_state.get('forecast_export_key') == forecast_key:
+                st.download_button(
+                    label="予測をExcelとしてダウンロード",
+                    data=build_forecast_workbook(forecast_key, forecast, shipping_rates, forecast_total),
+                    file_name=f"送料予測_{pd.Timestamp.now().strftime('%Y%m%d_%H%M')}.xlsx",
+                    mime="application/vnd.ms-excel",
+                )
+
+    profiler.checkpoint("期間別の予測")
+
     ############################
     # サイズ分布の情報表示
     st.subheader("サイズ別情報")
@@ -267,107 +568,51 @@ if 'has_result' in st.session_state and st.session_state.has_result:
     st.dataframe(size_info_df, use_container_width=True)
     
 
+    ############################
+    # 運送会社別の比較（比較する運送会社がある場合のみ）
+    if 'carrier_info' in summary:
+        st.subheader("運送会社別の比較")
+        
+        carrier_info_list = []
+        for info in summary['carrier_info']:
+            carrier_info_list.append({
+                "運送会社": info['carrier'],
+                "総送料": f"{info['cost']:,.0f}円" if info['complete'] else "取り扱いのないサイズあり",
+                "1個あたりの平均送料": f"{info['average_cost']:.1f}円" if info['complete'] else "-",
+                "最安となる出荷個数": f"{info['cheapest_shipments']:,}個"
+            })
+        
+        st.dataframe(pd.DataFrame(carrier_info_list), use_container_width=True)
+        st.metric(
+            "地域・サイズごとに最安の運送会社を選んだ場合の総送料",
+            f"{summary['cheapest_cost']:,.0f}円",
+            delta=f"{summary['cheapest_cost'] - summary['total_cost']:,.0f}円",
+            delta_color="inverse"
+        )
+
+    profiler.checkpoint("サイズ別情報・運送会社別の比較")
+
     ############################
     # エクスポート機能
     st.subheader("結果のエクスポート")
 
-    def export_to_csv():
-        """シミュレーション結果をCSVとしてエクスポートする"""
-        # サマリー情報
-        summary_df = pd.DataFrame({
-            "項目": ["総出荷個数", "総送料", "1個あたりの平均送料"],
-            "値": [f"{summary['total_shipments']:,}個", 
-                f"{summary['total_cost']:,.0f}円", 
-                f"{summary['average_cost']:.1f}円"]
-        })
-        
-        # サイズ別情報
-        size_info_df_export = pd.DataFrame(size_info_list)
-        
-        # 全てのサイズの詳細情報を結合
-        all_size_details = []
-        for i, size_result in enumerate(size_results):
-            size_code = size_result['size_code'].iloc[0]
-            size_name = size_result['size_name'].iloc[0]
-            weight = size_result['weight'].iloc[0]
-            proportion = size_result['proportion'].iloc[0]
-            
-            # データフレームの作成
-            df = size_result.reset_index()
-            df['サイズ'] = f"{size_name} ({weight}) - {proportion*100:.1f}%"
-            all_size_details.append(df)
-        
-        # 全てのデータを結合
-        if all_size_details:
-            all_details_df = pd.concat(all_size_details)
-        else:
-            all_details_df = pd.DataFrame()
-        
-        # BytesIOオブジェクトを作成してメモリ上でCSVファイルを作成
-        csv_buffer = BytesIO()
-        
-        # ExcelWriterオブジェクトを作成
-        with pd.ExcelWriter(csv_buffer, engine='xlsxwriter') as writer:
-            summary_df.to_excel(writer, sheet_name='サマリー', index=False)
-            size_info_df_export.to_excel(writer, sheet_name='サイズ別情報', index=False)
-            
-            for i, size_result in enumerate(size_results):
-                size_code = size_result['size_code'].iloc[0]
-                size_name = size_result['size_name'].iloc[0]
-                
-                # データフレームの整形
-                size_display_df = size_result.reset_index()
-                
-                # カラム名を確認して適切に選択
-                size_columns = size_display_df.columns.tolist()
-                
-                if 'region' in size_columns:
-                    region_col = 'region'
-                else:
-                    region_col = size_columns[0]
-                
-                selected_columns = [region_col]
-                if 'prefectures' in size_columns:
-                    selected_columns.append('prefectures')
-                if 'size_shipments' in size_columns:
-                    selected_columns.append('size_shipments')
-                if 'rate' in size_columns:
-                    selected_columns.append('rate')
-                if 'size_cost' in size_columns:
-                    selected_columns.append('size_cost')
-                
-                display_df = size_display_df[selected_columns]
-                
-                # カラム名を変更
-                column_mapping = {
-                    region_col: '地域',
-                    'prefectures': '都道府県',
-                    'size_shipments': '出荷個数',
-                    'rate': '送料単価(円)',
-                    'size_cost': '送料合計(円)'
-                }
-                
-                # 存在するカラムのみリネーム
-                rename_dict = {col: column_mapping[col] for col in selected_columns if col in column_mapping}
-                display_df = display_df.rename(columns=rename_dict)
-                
-                # シートに書き込み
-                sheet_name = f"{size_name[:10]}" if i < 30 else f"サイズ{i+1}"
-                display_df.to_excel(writer, sheet_name=sheet_name, index=False)
-        
-        # バッファの位置を先頭に戻す
-        csv_buffer.seek(0)
-        
-        return csv_buffer
+    # Excelファイルは「Excelファイルを作成」が押されたときだけ作成し、結果ごとにキャッシュする
+    export_fingerprint = st.session_state.result_fingerprint
+    
+    if st.button("Excelファイルを作成"):
+        st.session_state.export_fingerprint = export_fingerprint
+    
+    if st.session_state.get('export_fingerprint') == export_fingerprint:
+        # エクスポートボタン
+        if st.download_button(
+            label="Excelとしてダウンロード",
+            data=build_export_workbook(export_fingerprint, size_results, summary),
+            file_name=f"送料シミュレーション_{pd.Timestamp.now().strftime('%Y%m%d_%H%M')}.xlsx",
+            mime="application/vnd.ms-excel",
+        ):
+            st.success("エクスポートが完了しました！")
 
-    # エクスポートボタン
-    if st.download_button(
-        label="Excelとしてダウンロード",
-        data=export_to_csv(),
-        file_name=f"送料シミュレーション_{pd.Timestamp.now().strftime('%Y%m%d_%H%M')}.xlsx",
-        mime="application/vnd.ms-excel",
-    ):
-        st.success("エクスポートが完了しました！")
+    profiler.checkpoint("エクスポート")
 
     ########################################
     # サイズ別詳細タブ
@@ -375,49 +620,19 @@ if 'has_result' in st.session_state and st.session_state.has_result:
     
     with tab_size[0]:
         # サイズ別の詳細情報
-        for i, size_result in enumerate(size_results):
-            size_code = size_result['size_code'].iloc[0]
-            size_name = size_result['size_name'].iloc[0]
-            weight = size_result['weight'].iloc[0]
-            proportion = size_result['proportion'].iloc[0]
+        for i, (size_name, weight) in enumerate(zip(size_results.size_names, size_results.weights)):
+            proportion = size_results.proportions[i]
             
             st.markdown(f"### {size_name} ({weight}) - {proportion*100:.1f}%")
             
-            # DataFrameの整形
-            size_display_df = size_result.reset_index()
-            
-            # カラム名を確認して適切に選択
-            size_columns = size_display_df.columns.tolist()
-            
-            if 'region' in size_columns:
-                region_col = 'region'
-            else:
-                region_col = size_columns[0]  # 最初のカラムがリージョン名と仮定
-            
-            selected_columns = [region_col]
-            if 'prefectures' in size_columns:
-                selected_columns.append('prefectures')
-            if 'size_shipments' in size_columns:
-                selected_columns.append('size_shipments')
-            if 'rate' in size_columns:
-                selected_columns.append('rate')
-            if 'size_cost' in size_columns:
-                selected_columns.append('size_cost')
-            
-            size_display_df = size_display_df[selected_columns]
-            
-            # カラム名を変更
-            new_cols = ['地域']
-            if 'prefectures' in selected_columns:
-                new_cols.append('都道府県')
-            if 'size_shipments' in selected_columns:
-                new_cols.append('出荷個数')
-            if 'rate' in selected_columns:
-                new_cols.append('送料単価(円)')
-            if 'size_cost' in selected_columns:
-                new_cols.append('送料合計(円)')
-            
-            size_display_df.columns = new_cols
+            # 表示するサイズの分だけデータフレームを作成する
+            size_display_df = size_results.frame(i).reset_index().rename(columns={
+                'region': '地域',
+                'prefectures': '都道府県',
+                'size_shipments': '出荷個数',
+                'rate': '送料単価(円)',
+                'size_cost': '送料合計(円)'
+            })
             
             # 表示用の書式設定
             row_count = len(size_display_df)
@@ -463,4 +678,30 @@ if 'has_result' in st.session_state and st.session_state.has_result:
             #         st.error(f"グラフ作成エラー: {str(e)}")
             #         st.write(f"カラム: {size_df_reset.columns.tolist() if 'size_df_reset' in locals() else '不明'}")
             
-            st.markdown("---")
\ No newline at end of file
+            st.markdown("---")
+    profiler.checkpoint("サイズ別詳細")
+
+# 開発者向けパネル（区間別の処理時間・処理段階・cProfile の集計）
+# 記録は PROFILING_LOG_PATH の JSONL ファイルにも1行ずつ追記する
+profile_record = profiler.finish(
+    rate_table_version=shipping_rates.version,
+    has_result=bool(st.session_state.get('has_result'))
+)
+if profile_record is not None:
+    with st.expander(f"開発者向け: 処理時間（合計 {profile_record['total'] * 1000:,.1f}ms）"):
+        sections_df = pd.DataFrame(profile_record['sections']).rename(columns={'name': '区間', 'duration': '処理時間(ms)'})
+        sections_df['処理時間(ms)'] *= 1000
+        st.dataframe(sections_df.style.format({'処理時間(ms)': "{:,.1f}"}), use_container_width=True, hide_index=True)
+
+        if profile_record['spans']:
+            st.markdown("**処理段階**")
+            spans_df = pd.DataFrame.from_dict(profile_record['spans'], orient='index')
+            spans_df[['total', 'max']] *= 1000
+            spans_df = spans_df.rename(columns={'count': '回数', 'total': '合計(ms)', 'max': '最大(ms)', 'rows': '件数'})
+            st.dataframe(spans_df.style.format({'合計(ms)': "{:,.1f}", '最大(ms)': "{:,.1f}"}), use_container_width=True)
+
+        if profile_record['cprofile']:
+            st.markdown("**cProfile（累積時間の長い順）**")
+            st.dataframe(pd.DataFrame(profile_record['cprofile']), use_container_width=True, hide_index=True)
+        if profiler.log_path:
+            st.caption(f"記録の追記先: {profiler.log_path}")
@@ -5,13 +5,21 @@ from dotenv import load_dotenv
 # .envファイルから環境変数を読み込む
 load_dotenv()
 
+def _env_flag(name):
+    """環境変数が true / 1 / yes のいずれかに設定されているかを返す"""
+    return os.getenv(name, "false").lower() in ("true", "1", "yes")
+
+def is_profiling_mode():
+    """再実行ごとの処理時間を計測し、開発者向けパネルに表示するかを返す（PROFILING_MODE）"""
+    return _env_flag("PROFILING_MODE")
+
 def check_password():
     """シンプルなパスワード保護機能を提供する"""
     # 環境変数からパスワードを取得、設定されていない場合はデフォルト値を使用
     correct_password = os.getenv("APP_PASSWORD", "default_password")
     
     # 開発環境かどうかを確認
-    is_dev_mode = os.getenv("DEVELOPMENT_MODE", "false").lower() in ("true", "1", "yes")
+    is_dev_mode = _env_flag("DEVELOPMENT_MODE")
     
     # 開発モードの場合は認証をスキップ
     if is_dev_mode:
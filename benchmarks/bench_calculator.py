@@ -0,0 +1,251 @@
+"""
+送料計算のベンチマーク
+
+calculate_regional_shipments / calculate_shipping_costs / calculate_summary / calculate_batch を
+データ規模ごとに計測し、所要時間とピークメモリを出力する。データはすべて乱数で生成するため
+ネットワークや実データは不要。
+
+使用例:
+    python benchmarks/bench_calculator.py                       # 全ケースを計測
+    python benchmarks/bench_calculator.py --quick               # 小さいケースのみ
+    python benchmarks/bench_calculator.py --save benchmarks/baseline.json
+    python benchmarks/bench_calculator.py --compare benchmarks/baseline.json --threshold 1.3
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.calculator import (  # noqa: E402
+    calculate_regional_shipments,
+    calculate_shipping_costs,
+    calculate_summary,
+    calculate_batch
+)
+from utils.rate_table import RateTable  # noqa: E402
+
+# 地域数の規模（現行の12地域 → 47都道府県 → 配送ゾーン）
+REGION_SCALES = {
+    'regions12': 12,
+    'prefectures47': 47,
+    'zones2000': 2000,
+    'zones20000': 20000
+}
+
+# サイズ構成（使用するサイズ数）
+SIZE_MIXES = {
+    'sizes1': 1,
+    'sizes5': 5,
+    'sizes9': 9
+}
+
+# 一括計算のシナリオ数
+BATCH_SCALES = {
+    'batch1k': 1000,
+    'batch10k': 10000,
+    'batch100k': 100000
+}
+
+QUICK_CASES = {'regions12', 'prefectures47', 'sizes1', 'sizes9', 'batch1k'}
+
+SIZE_CODES = ['60', '80', '100', '120', '140', '160', '180', 'compact', 'yupacket']
+
+
+def make_population(n_regions, seed=0):
+    """
+    乱数で地域別人口データを作成する
+    """
+    rng = np.random.default_rng(seed)
+    population = rng.integers(100_000, 10_000_000, n_regions)
+    df = pd.DataFrame({
+        'population': population,
+        'percentage': population / population.sum(),
+        'prefectures': [f'ゾーン{i}' for i in range(n_regions)]
+    }, index=[f'地域{i}' for i in range(n_regions)])
+    df.index.name = 'region'
+    return df
+
+
+def make_rate_table(regions, seed=0):
+    """
+    乱数で送料テーブルを作成する（サイズが大きいほど高くなるようにする）
+    """
+    rng = np.random.default_rng(seed)
+    base = np.linspace(700, 3000, len(SIZE_CODES)).round()
+    uplift = rng.integers(0, 1500, len(regions))
+    rates = base[:, np.newaxis] + uplift[np.newaxis, :]
+    return RateTable(
+        SIZE_CODES,
+        [f'{code}サイズ' for code in SIZE_CODES],
+        ['-'] * len(SIZE_CODES),
+        regions,
+        rates
+    )
+
+
+def make_size_distribution(n_sizes, seed=0):
+    rng = np.random.default_rng(seed)
+    proportions = rng.dirichlet(np.ones(n_sizes))
+    return dict(zip(SIZE_CODES[:n_sizes], proportions))
+
+
+def measure(func, repeat=5, min_time=0.05):
+    """
+    関数の所要時間（中央値・最小値、1回あたり秒）とピークメモリ（バイト）を計測する
+    """
+    # 1回の計測が短すぎる場合はループ回数を増やす
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or loops >= 10000:
+            break
+        loops *= 10
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        timings.append((time.perf_counter() - start) / loops)
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'median': statistics.median(timings),
+        'min': min(timings),
+        'loops': loops,
+        'peak_memory': peak
+    }
+
+
+def iter_cases(quick=False):
+    """
+    計測ケース（名前, 計測する関数）を順に返す
+    """
+    def enabled(*keys):
+        return not quick or all(key in QUICK_CASES for key in keys)
+
+    for scale_name, n_regions in REGION_SCALES.items():
+        if not enabled(scale_name):
+            continue
+        population = make_population(n_regions)
+        rate_table = make_rate_table(list(population.index))
+        shipments = calculate_regional_shipments(1_000_000, population)
+
+        yield f'regional/{scale_name}', lambda p=population: calculate_regional_shipments(1_000_000, p)
+
+        for mix_name, n_sizes in SIZE_MIXES.items():
+            if not enabled(scale_name, mix_name):
+                continue
+            size_distribution = make_size_distribution(n_sizes)
+            result, size_results = calculate_shipping_costs(shipments, rate_table, size_distribution)
+
+            yield (
+                f'costing/{scale_name}/{mix_name}',
+                lambda s=shipments, r=rate_table, d=size_distribution: calculate_shipping_costs(s, r, d)
+            )
+            yield (
+                f'summary/{scale_name}/{mix_name}',
+                lambda res=result, sr=size_results: calculate_summary(res, sr)
+            )
+
+        for batch_name, n_scenarios in BATCH_SCALES.items():
+            # 地域数 × シナリオ数が大きすぎる組み合わせは計測しない
+            if not enabled(scale_name, batch_name) or n_regions * n_scenarios > 20_000_000:
+                continue
+            rng = np.random.default_rng(1)
+            scenarios = {
+                'total_shipments': rng.integers(1, 1_000_000, n_scenarios),
+                'size_codes': SIZE_CODES,
+                'size_proportions': rng.dirichlet(np.ones(len(SIZE_CODES)), n_scenarios)
+            }
+            yield (
+                f'batch/{scale_name}/{batch_name}',
+                lambda sc=scenarios, r=rate_table, p=population: calculate_batch(sc, r, p)
+            )
+
+
+def run(quick=False, pattern=None, repeat=5):
+    results = {}
+    for name, func in iter_cases(quick):
+        if pattern and pattern not in name:
+            continue
+        results[name] = measure(func, repeat=repeat)
+        stats = results[name]
+        print(
+            f"{name:<40} {stats['median'] * 1000:10.3f} ms  "
+            f"(min {stats['min'] * 1000:.3f} ms)  peak {stats['peak_memory'] / 1024:10.1f} KiB",
+            flush=True
+        )
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    基準値と比較し、閾値（倍率）を超えて遅くなったケースを返す
+    """
+    regressions = []
+    for name, stats in results.items():
+        base = baseline.get('results', {}).get(name)
+        if base is None:
+            continue
+        ratio = stats['median'] / base['median'] if base['median'] > 0 else float('inf')
+        memory_ratio = stats['peak_memory'] / base['peak_memory'] if base['peak_memory'] > 0 else 1.0
+        if ratio > threshold or memory_ratio > threshold:
+            regressions.append((name, ratio, memory_ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='送料計算のベンチマーク')
+    parser.add_argument('--quick', action='store_true', help='小さいケースのみ計測する')
+    parser.add_argument('-k', dest='pattern', help='名前にこの文字列を含むケースのみ計測する')
+    parser.add_argument('--repeat', type=int, default=5, help='計測の繰り返し回数')
+    parser.add_argument('--save', help='計測結果を基準値として保存するJSONファイル')
+    parser.add_argument('--compare', help='比較する基準値のJSONファイル')
+    parser.add_argument('--threshold', type=float, default=1.3, help='退行とみなす倍率（時間・メモリ）')
+    args = parser.parse_args(argv)
+
+    results = run(quick=args.quick, pattern=args.pattern, repeat=args.repeat)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'numpy': np.__version__,
+                'pandas': pd.__version__,
+                'machine': platform.platform(),
+                'results': results
+            }, f, ensure_ascii=False, indent=2)
+        print(f"基準値を保存しました: {args.save}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for name, ratio, memory_ratio in regressions:
+            print(f"退行: {name} 時間 x{ratio:.2f} メモリ x{memory_ratio:.2f}")
+        if regressions:
+            return 1
+        print("基準値からの退行はありません")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
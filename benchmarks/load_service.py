@@ -0,0 +1,187 @@
+"""
+見積もりサービスの負荷試験
+
+keep-alive の接続を並列に張って見積もりサービス（python -m utils serve）に要求を送り続け、
+応答時間の p50 / p99 とスループットを出力する。コンテナ1台あたりの処理能力の見積もりに使う。
+シナリオは /health で取得したサイズコードと地域から乱数で生成するため、実データは不要。
+
+使用例:
+    python benchmarks/load_service.py --spawn                         # サービスを起動して計測
+    python benchmarks/load_service.py --url http://localhost:8080 --concurrency 64 --duration 30
+    python benchmarks/load_service.py --spawn --batch-size 500 --batch-ratio 0.1
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+
+
+async def _request(reader, writer, host, method, path, payload=None):
+    """
+    1件の要求を送り、(ステータス, 応答の辞書) を返す
+    """
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8') if payload is not None else b''
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: {host}\r\n"
+        f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode('latin-1') + body
+    )
+    await writer.drain()
+
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+
+def _make_scenario(rng, size_codes, regions, max_shipments):
+    """
+    乱数でシナリオを1件作成する（半数は地域別比率も指定する）
+    """
+    sizes = rng.choice(size_codes, size=rng.integers(1, min(4, len(size_codes)) + 1), replace=False)
+    scenario = {
+        'total_shipments': int(rng.integers(1, max_shipments)),
+        'size_distribution': {str(code): float(p) for code, p in zip(sizes, rng.dirichlet(np.ones(len(sizes))))}
+    }
+    if rng.random() < 0.5:
+        scenario['region_distribution'] = {
+            region: float(p) for region, p in zip(regions, rng.dirichlet(np.ones(len(regions))))
+        }
+    return scenario
+
+
+async def _client(host, port, deadline, options, size_codes, regions, seed, results):
+    """
+    1つの接続で、終了時刻まで要求を送り続ける
+    """
+    rng = np.random.default_rng(seed)
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while time.perf_counter() < deadline:
+            if options.batch_size > 1 and rng.random() < options.batch_ratio:
+                path = '/quotes'
+                payload = {'scenarios': [
+                    _make_scenario(rng, size_codes, regions, options.max_shipments)
+                    for _ in range(options.batch_size)
+                ]}
+                quotes = options.batch_size
+            else:
+                path = '/quote'
+                payload = _make_scenario(rng, size_codes, regions, options.max_shipments)
+                quotes = 1
+
+            start = time.perf_counter()
+            status, _ = await _request(reader, writer, host, 'POST', path, payload)
+            results.append((path, time.perf_counter() - start, status, quotes))
+    finally:
+        writer.close()
+
+
+async def run_load(host, port, options):
+    """
+    負荷をかけて、要求の種類ごとの応答時間とスループットを集計する
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    _, health = await _request(reader, writer, host, 'GET', '/health')
+    writer.close()
+
+    results = []
+    start = time.perf_counter()
+    deadline = start + options.duration
+    await asyncio.gather(*[
+        _client(host, port, deadline, options, health['size_codes'], health['regions'], options.seed + i, results)
+        for i in range(options.concurrency)
+    ])
+    elapsed = time.perf_counter() - start
+
+    report = {
+        'concurrency': options.concurrency,
+        'duration_s': round(elapsed, 2),
+        'requests': len(results),
+        'errors': sum(1 for _, _, status, _ in results if status != 200),
+        'requests_per_s': round(len(results) / elapsed, 1),
+        'quotes_per_s': round(sum(quotes for _, _, _, quotes in results) / elapsed, 1),
+        'latency_ms': {}
+    }
+    for path in ('/quote', '/quotes'):
+        latencies = np.array([latency for p, latency, _, _ in results if p == path]) * 1000
+        if len(latencies):
+            report['latency_ms'][path] = {
+                'count': len(latencies),
+                'p50': round(float(np.percentile(latencies, 50)), 2),
+                'p99': round(float(np.percentile(latencies, 99)), 2),
+                'max': round(float(latencies.max()), 2)
+            }
+    return report
+
+
+def _spawn_server(port, workers):
+    """
+    見積もりサービスを子プロセスで起動し、/health に応答するまで待つ
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    command = [sys.executable, '-m', 'utils', 'serve', '--port', str(port)]
+    if workers is not None:
+        command += ['--workers', str(workers)]
+    process = subprocess.Popen(command, cwd=root)
+
+    async def wait_ready():
+        for _ in range(300):
+            try:
+                _, writer = await asyncio.open_connection('127.0.0.1', port)
+                writer.close()
+                return
+            except OSError:
+                if process.poll() is not None:
+                    raise RuntimeError("見積もりサービスの起動に失敗しました")
+                await asyncio.sleep(0.1)
+        raise RuntimeError("見積もりサービスが起動しませんでした")
+
+    try:
+        asyncio.run(wait_ready())
+    except BaseException:
+        process.terminate()
+        raise
+    return process
+
+
+def main():
+    parser = argparse.ArgumentParser(description='見積もりサービスの負荷試験')
+    parser.add_argument('--url', default='http://127.0.0.1:8080', help='見積もりサービスのURL')
+    parser.add_argument('--spawn', action='store_true', help='見積もりサービスを子プロセスで起動して計測する')
+    parser.add_argument('--server-workers', type=int, help='--spawn で起動するサービスのプロセス数')
+    parser.add_argument('--concurrency', type=int, default=32, help='同時接続数')
+    parser.add_argument('--duration', type=float, default=10.0, help='計測時間（秒）')
+    parser.add_argument('--batch-size', type=int, default=0, help='一括見積もり（/quotes）1回あたりのシナリオ数（0 で1件ずつのみ）')
+    parser.add_argument('--batch-ratio', type=float, default=0.1, help='要求のうち一括見積もりの割合')
+    parser.add_argument('--max-shipments', type=int, default=100_000, help='シナリオの総出荷個数の上限')
+    parser.add_argument('--seed', type=int, default=0, help='乱数のシード')
+    options = parser.parse_args()
+
+    url = urlsplit(options.url)
+    host, port = url.hostname or '127.0.0.1', url.port or 80
+
+    process = _spawn_server(port, options.server_workers) if options.spawn else None
+    try:
+        report = asyncio.run(run_load(host, port, options))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,24 @@
+from pathlib import Path
+
+import pytest
+
+from utils.data_loader import read_population_data
+from utils.forecast import monthly_volumes, region_shares
+
+DATA_DIR = Path(__file__).resolve().parent.parent / 'data'
+
+
+def test_monthly_volumes_rejects_nan_seasonality():
+    with pytest.raises(ValueError):
+        monthly_volumes(1000, 12, seasonality=[1.0] * 11 + [float('nan')])
+
+
+def test_monthly_volumes_rejects_volumes_beyond_int64():
+    with pytest.raises(ValueError):
+        monthly_volumes(10000, 120, growth_rate=1.0)
+
+
+def test_region_shares_rejects_nan_drift():
+    population_data = read_population_data(str(DATA_DIR / 'population_data.csv'))
+    with pytest.raises(ValueError, match='関東'):
+        region_shares(population_data, 12, {'関東': float('nan')})
@@ -0,0 +1,31 @@
+from pathlib import Path
+
+import pandas as pd
+
+from utils.orders import price_order_file
+from utils.rate_table import RateTable
+
+DATA_DIR = Path(__file__).resolve().parent.parent / 'data'
+
+
+def _rate_table():
+    return RateTable.from_dataframe(pd.read_csv(DATA_DIR / 'shipping_rates_sample.csv'))
+
+
+def test_price_order_file_excludes_invalid_quantities(tmp_path):
+    orders = tmp_path / 'orders.csv'
+    orders.write_text(
+        "region,size_code,quantity\n"
+        "関東,60,2\n"
+        "関東,60,-5\n"
+        "関東,80,\n"
+        "関東,80,abc\n"
+        "北海道,60,1.5\n"
+        "九州,80,3\n",
+        encoding='utf-8'
+    )
+    result = price_order_file(str(orders), _rate_table(), workers=1)
+    assert result['rows'] == 6
+    assert result['unmatched_rows'] == 4
+    assert result['total_shipments'] == 5
+    assert (result['shipments'] >= 0).all()
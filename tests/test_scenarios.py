@@ -0,0 +1,42 @@
+from pathlib import Path
+
+import pytest
+
+from utils.data_loader import read_population_data, read_rate_table
+from utils.scenarios import ScenarioError, build_scenarios
+
+DATA_DIR = Path(__file__).resolve().parent.parent / 'data'
+
+
+@pytest.fixture(scope='module')
+def tables():
+    return (
+        read_rate_table(str(DATA_DIR / 'shipping_rates_sample.csv')),
+        read_population_data(str(DATA_DIR / 'population_data.csv'))
+    )
+
+
+def _build(record, tables):
+    return build_scenarios([(1, record)], *tables)
+
+
+def test_build_scenarios_accepts_csv_strings(tables):
+    scenarios = _build({'total_shipments': '12', 'size_distribution': {'60': '0.5', '80': 0.5}}, tables)
+    assert scenarios['total_shipments'].tolist() == [12]
+    assert scenarios['size_proportions'].sum() == 1.0
+
+
+@pytest.mark.parametrize('record', [
+    {'total_shipments': 10, 'size_distribution': {'60': -1, '80': 2}},
+    {'total_shipments': 10, 'size_distribution': {'60': float('nan')}},
+    {'total_shipments': 10, 'size_distribution': {'60': float('inf')}},
+    {'total_shipments': 10, 'size_distribution': {'60': 0}},
+    {'total_shipments': 10, 'size_distribution': {'60': 1}, 'region_distribution': {'関東': -1, '北海道': 2}},
+    {'total_shipments': 10, 'size_distribution': {'60': 1}, 'region_distribution': {'関東': 0}},
+    {'total_shipments': True, 'size_distribution': {'60': 1}},
+    {'total_shipments': 12.7, 'size_distribution': {'60': 1}},
+    {'total_shipments': -1, 'size_distribution': {'60': 1}},
+])
+def test_build_scenarios_rejects_invalid_values(record, tables):
+    with pytest.raises(ScenarioError, match='1行目'):
+        _build(record, tables)
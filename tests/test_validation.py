@@ -0,0 +1,36 @@
+from pathlib import Path
+
+import pytest
+
+from utils.validation import RateCsvError, read_rate_csv
+
+SAMPLE_PATH = Path(__file__).resolve().parent.parent / 'data' / 'shipping_rates_sample.csv'
+
+
+def _sample():
+    data = SAMPLE_PATH.read_bytes()
+    header = data.split(b'\n', 1)[0].decode('utf-8-sig').strip()
+    return data, header.split(',')[3:]
+
+
+def test_read_rate_csv_accepts_sample():
+    data, regions = _sample()
+    table = read_rate_csv(data, regions)
+    assert table.rates.shape[1] == len(regions)
+
+
+@pytest.mark.parametrize('line_number', [2, 4])
+def test_read_rate_csv_rejects_extra_fields(line_number):
+    data, regions = _sample()
+    lines = data.split(b'\n')
+    lines[line_number - 1] = lines[line_number - 1].rstrip(b'\r') + b',5,5'
+    with pytest.raises(RateCsvError, match=f'{line_number}行目'):
+        read_rate_csv(b'\n'.join(lines), regions)
+
+
+def test_read_rate_csv_rejects_missing_fields():
+    data, regions = _sample()
+    lines = data.split(b'\n')
+    lines[2] = lines[2].rstrip(b'\r').rsplit(b',', 1)[0]
+    with pytest.raises(RateCsvError, match=regions[-1]):
+        read_rate_csv(b'\n'.join(lines), regions)
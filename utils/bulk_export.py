@@ -0,0 +1,226 @@
+"""
+クライアントごとの Excel ワークブックの一括作成
+
+シナリオ（python -m utils quote の JSONL / CSV と同じ形式）1件を1クライアントとし、
+画面の「Excelとしてダウンロード」と同じ内容（サマリー・サイズ別情報・サイズ別の詳細）の
+ワークブックをクライアントごとに作成する。計算と書き込みはワーカープロセスで並列に行う。
+
+ワークブックは write_workbook（xlsxwriter の constant_memory モード）でファイルに直接書き込み、
+処理中のタスクは プロセス数 × MAX_PENDING_PER_WORKER 件までに制限するため、
+クライアント数が増えてもメモリ使用量は一定になる。zip にまとめる場合は、書き込みの終わった
+ワークブックから順に zip に追加して一時ファイルを削除する。
+
+使用例:
+    python -m utils workbooks clients.jsonl --output-dir workbooks/
+    python -m utils workbooks clients.csv --zip workbooks.zip --workers 8
+"""
+import logging
+import os
+import re
+import shutil
+import tempfile
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from utils.calculator import calculate_quote
+from utils.export import write_workbook
+from utils.instrumentation import span
+from utils.scenarios import build_scenarios, summary_record
+
+logger = logging.getLogger(__name__)
+
+# 1プロセスあたりの処理中のタスク数の上限（メモリ使用量の上限）
+MAX_PENDING_PER_WORKER = 2
+
+# ファイル名に使えない文字
+_UNSAFE_CHARACTERS = re.compile(r'[\\/:*?"<>|\x00-\x1f]')
+
+# ワーカープロセスごとの送料データ・人口データ・出力先（initializer で設定する）
+_worker_config = None
+
+
+def _init_worker(rate_table, population_data, output_dir):
+    global _worker_config
+    _worker_config = (rate_table, population_data, output_dir)
+
+
+def workbook_file_name(client_id, used_names):
+    """
+    クライアントのIDからワークブックのファイル名を作成する（重複する場合は連番を付ける）
+
+    Args:
+        client_id: シナリオの id
+        used_names (set): 作成済みのファイル名（作成したファイル名を追加する）
+
+    Returns:
+        str: ファイル名
+    """
+    stem = _UNSAFE_CHARACTERS.sub('_', str(client_id)).strip(' .') or 'client'
+    file_name = f"{stem}.xlsx"
+    number = 2
+    while file_name.lower() in used_names:
+        file_name = f"{stem}_{number}.xlsx"
+        number += 1
+    used_names.add(file_name.lower())
+    return file_name
+
+
+def _write_client_workbooks(task):
+    """
+    クライアントごとに送料を計算し、ワークブックを出力先に書き込む
+
+    Args:
+        task (tuple): (ファイル名のリスト, シナリオの id のリスト, build_scenarios の戻り値)
+
+    Returns:
+        list: クライアントごとの集計結果（summary_record の形式に file を加えたもの）
+    """
+    file_names, scenario_ids, scenarios = task
+    rate_table, population_data, output_dir = _worker_config
+
+    entries = []
+    for i, (file_name, scenario_id) in enumerate(zip(file_names, scenario_ids)):
+        client_population = population_data.copy()
+        client_population['percentage'] = scenarios['region_percentages'][i]
+        size_distribution = {
+            size_code: float(proportion)
+            for size_code, proportion in zip(scenarios['size_codes'], scenarios['size_proportions'][i])
+            if proportion > 0
+        }
+
+        _, size_results, summary = calculate_quote(
+            int(scenarios['total_shipments'][i]), client_population, rate_table, size_distribution
+        )
+        write_workbook(os.path.join(output_dir, file_name), size_results, summary)
+        entries.append({**summary_record(scenario_id, summary), 'file': file_name})
+    return entries
+
+
+def _tasks(records, rate_table, population_data, chunk_size, on_error):
+    """
+    シナリオを chunk_size 件ずつ検証し、ワーカープロセスに渡すタスクにする（形式が正しくないシナリオは除外する）
+    """
+    used_names = set()
+    chunk = []
+    for item in records:
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            task = _make_task(chunk, rate_table, population_data, used_names, on_error)
+            if task is not None:
+                yield task
+            chunk = []
+    if chunk:
+        task = _make_task(chunk, rate_table, population_data, used_names, on_error)
+        if task is not None:
+            yield task
+
+
+def _make_task(chunk, rate_table, population_data, used_names, on_error):
+    skipped = set()
+
+    def skip(line_number, record, error):
+        skipped.add(line_number)
+        on_error(line_number, record, error)
+
+    scenarios = build_scenarios(chunk, rate_table, population_data, on_error=skip)
+    chunk = [(line_number, record) for line_number, record in chunk if line_number not in skipped]
+    if not chunk:
+        return None
+    scenario_ids = [record.get('id', line_number) for line_number, record in chunk]
+    file_names = [workbook_file_name(scenario_id, used_names) for scenario_id in scenario_ids]
+    return file_names, scenario_ids, scenarios
+
+
+def _bounded_results(executor, tasks, max_pending):
+    """
+    処理中のタスクを max_pending 件までに制限してワーカープロセスに渡し、終わったタスクの結果を順に返す
+    """
+    tasks = iter(tasks)
+    pending = set()
+    exhausted = False
+    while pending or not exhausted:
+        while not exhausted and len(pending) < max_pending:
+            task = next(tasks, None)
+            if task is None:
+                exhausted = True
+            else:
+                pending.add(executor.submit(_write_client_workbooks, task))
+        if pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+
+def export_client_workbooks(records, rate_table, population_data, output_dir=None, zip_path=None,
+                            workers=None, chunk_size=4, on_error=None):
+    """
+    クライアントごとのワークブックを作成し、作成したクライアントの集計結果を順に返す
+
+    形式に誤りがあるシナリオ（build_scenarios と同じ検証）はワークブックを作成せずに除外し、
+    on_error に渡す（省略時は警告をログに出力する）。他のクライアントの作成は続ける。
+    集計結果は作成の終わった順に返すため、入力の順序とは異なる場合がある。
+
+    Args:
+        records (iterable): (行番号, シナリオの辞書) を順に返すイテラブル（id をファイル名に使う）
+        rate_table (RateTable): 送料テーブル
+        population_data (DataFrame): 地域別人口データ
+        output_dir (str, optional): ワークブックの出力先ディレクトリ（zip_path と同時には指定しない）
+        zip_path (str, optional): ワークブックをまとめる zip ファイル
+        workers (int, optional): 並列処理のプロセス数（1の場合は現在のプロセスで処理、省略時はCPU数）
+        chunk_size (int): 1タスクで作成するワークブックの数
+        on_error (callable, optional): 除外したシナリオの (行番号, シナリオの辞書, ScenarioError) を受け取る関数
+
+    Yields:
+        dict: クライアントごとの集計結果（summary_record の形式に file を加えたもの）
+    """
+    if (output_dir is None) == (zip_path is None):
+        raise ValueError("output_dir と zip_path のどちらか一方を指定してください")
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, workers)
+    if on_error is None:
+        def on_error(line_number, record, error):
+            logger.warning("ワークブックを作成しませんでした: %s", error)
+
+    if zip_path is not None:
+        # zip にまとめるワークブックは一時ディレクトリに書き込み、zip に追加したら削除する
+        output_dir = tempfile.mkdtemp(prefix='workbooks_', dir=os.path.dirname(os.path.abspath(zip_path)))
+        archive = zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_STORED)
+    else:
+        os.makedirs(output_dir, exist_ok=True)
+        archive = None
+
+    def store(entries):
+        if archive is not None:
+            for entry in entries:
+                path = os.path.join(output_dir, entry['file'])
+                archive.write(path, entry['file'])
+                os.remove(path)
+        return entries
+
+    executor = None
+    count = 0
+    try:
+        with span('bulk_export', workers=workers) as current:
+            tasks = _tasks(records, rate_table, population_data, chunk_size, on_error)
+            if workers == 1:
+                _init_worker(rate_table, population_data, output_dir)
+                results = map(_write_client_workbooks, tasks)
+            else:
+                executor = ProcessPoolExecutor(
+                    max_workers=workers, initializer=_init_worker,
+                    initargs=(rate_table, population_data, output_dir)
+                )
+                results = _bounded_results(executor, tasks, workers * MAX_PENDING_PER_WORKER)
+
+            for entries in results:
+                for entry in store(entries):
+                    count += 1
+                    yield entry
+            current.rows = count
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        if archive is not None:
+            archive.close()
+            shutil.rmtree(output_dir, ignore_errors=True)
@@ -0,0 +1,97 @@
+import threading
+from collections import OrderedDict
+
+
+class ResultCache:
+    """
+    計算結果を保持する LRU キャッシュ
+
+    エントリ数とおおよそのメモリ使用量の上限を持ち、どちらかを超えた場合は
+    最も長く使われていないエントリから削除する。複数セッションから同時に
+    使用されるため、操作はロックで保護する。
+
+    キャッシュされた値は呼び出し元の間で共有されるため、変更してはならない。
+    """
+
+    def __init__(self, max_entries=256, max_bytes=64 * 1024 * 1024):
+        """
+        Args:
+            max_entries (int): 保持するエントリ数の上限
+            max_bytes (int): 保持する値の合計サイズ（バイト）の上限
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        """
+        キーに対応する値を返す（見つからない場合は default）
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, nbytes=0):
+        """
+        値をキャッシュに追加する
+
+        Args:
+            key: ハッシュ可能なキー
+            value: 保存する値
+            nbytes (int): 値のおおよそのサイズ（バイト）
+        """
+        # 単体で上限を超える値は保存しない
+        if nbytes > self.max_bytes or self.max_entries <= 0:
+            return
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._total_bytes -= previous[1]
+            self._entries[key] = (value, nbytes)
+            self._total_bytes += nbytes
+
+            while len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes:
+                _, (_, evicted_bytes) = self._entries.popitem(last=False)
+                self._total_bytes -= evicted_bytes
+                self.evictions += 1
+
+    def clear(self):
+        """
+        すべてのエントリを削除する（ヒット数などの統計は維持する）
+        """
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def stats(self):
+        """
+        キャッシュの利用状況を返す
+
+        Returns:
+            dict: ヒット数、ミス数、削除数、エントリ数、合計サイズ
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._total_bytes
+            }
@@ -1,6 +1,56 @@
-import pandas as pd
+import hashlib
+import logging
+
 import numpy as np
 
+from utils.instrumentation import traced
+from utils.rate_table import as_rate_table
+from utils.shipping_result import ShippingResult
+from utils.surcharges import surcharge_items, surcharge_summary
+
+logger = logging.getLogger(__name__)
+
+def apportion(totals, weights):
+    """
+    整数の総数を重みに比例して配分する（最大剰余方式）
+    
+    各配分先に重み比率 × 総数の整数部分を割り当て、残りを小数部分の大きい順に1つずつ配る。
+    配分結果の合計は常に総数と一致する。最後の軸に沿って配分し、それ以外の軸はまとめて計算する。
+    
+    Args:
+        totals (int or ndarray): 配分する総数 (...)
+        weights (ndarray): 配分先の重み (..., 配分先の数)。合計が1でなくてもよい（合計が0の場合は均等に配分）
+    
+    Returns:
+        ndarray: 配分結果 (..., 配分先の数) の int64 配列
+    """
+    totals = np.asarray(totals, dtype=np.int64)
+    weights = np.asarray(weights, dtype=float)
+    weights = np.broadcast_to(weights, totals.shape + weights.shape[-1:])
+    n_targets = weights.shape[-1]
+    
+    weight_sums = weights.sum(axis=-1, keepdims=True)
+    shares = np.divide(
+        weights, weight_sums,
+        out=np.full(weights.shape, 1.0 / n_targets), where=weight_sums > 0
+    )
+    
+    quotas = shares * totals[..., np.newaxis]
+    counts = np.floor(quotas).astype(np.int64)
+    remainders = quotas - counts
+    shortfall = totals - counts.sum(axis=-1)
+    
+    # 小数部分の大きい順（同じ場合は前の列を優先）に順位を付け、不足分を配る
+    # 重みが0の配分先には配らないよう、小数部分を -1 として最後に回す
+    remainders[shares == 0] = -1.0
+    order = np.argsort(-remainders, axis=-1, kind='stable')
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, np.broadcast_to(np.arange(n_targets), order.shape), axis=-1)
+    counts += ranks < shortfall[..., np.newaxis]
+    
+    return counts
+
+@traced('apportionment', rows=len)
 def calculate_regional_shipments(total_shipments, population_data):
     """
     地域別の出荷数を人口分布に基づいて計算する
@@ -15,100 +65,179 @@ def calculate_regional_shipments(total_shipments, population_data):
     # 人口分布データをコピー
     result = population_data.copy()
     
-    # 人口分布率に基づいて出荷数を計算
-    result['shipments'] = (result['percentage'] * total_shipments).round().astype(int)
-    
-    # 丸め誤差による総数のずれを補正
-    shipment_diff = total_shipments - result['shipments'].sum()
-    if shipment_diff != 0:
-        # 最も人口の多い地域に差分を追加（一般的には関東）
-        max_pop_idx = result['population'].idxmax()
-        result.loc[max_pop_idx, 'shipments'] += shipment_diff
+    # 人口分布率に基づいて出荷数を配分（合計は総出荷個数と一致する）
+    result['shipments'] = apportion(total_shipments, result['percentage'].to_numpy())
     
     # インデックス名を明示的に設定
     result.index.name = 'region'
     
     return result
 
+def calculate_zone_shipments(total_shipments, zone_table, zone_weights=None):
+    """
+    ゾーン（都道府県・郵便番号ゾーンなど）単位の需要から地域別の出荷数を計算する
+    
+    ゾーン別の需要は np.bincount で地域別に集約してから配分するため、
+    ゾーン数が増えても以降の送料計算の計算量は変わらない。
+    
+    Args:
+        total_shipments (int): 全国総出荷個数
+        zone_table (ZoneTable): ゾーンと地域の対応表
+        zone_weights (ndarray, optional): ゾーンごとの需要の重み（省略時は人口比）
+    
+    Returns:
+        DataFrame: 地域別の出荷数を含むデータフレーム（calculate_regional_shipments と同じ形式）
+    """
+    return calculate_regional_shipments(total_shipments, zone_table.to_population_data(zone_weights))
+
+def build_rate_matrix(rate_table, size_codes, regions):
+    """
+    送料テーブルから (サイズ × 地域) の送料単価行列を作成する
+    
+    Args:
+        rate_table (RateTable): 送料テーブル
+        size_codes (list): 行の並びとなるサイズコードのリスト
+        regions (list): 列の並びとなる地域名のリスト
+    
+    Returns:
+        tuple: (送料単価行列 (サイズ数 × 地域数の整数配列), 各サイズの送料テーブル上の行番号の配列)
+    """
+    row_numbers = []
+    for size_code in size_codes:
+        row_number = rate_table.index_of(size_code)
+        
+        # 対応するサイズが見つからない場合のエラーハンドリング
+        if row_number is None:
+            logger.warning(
+                "サイズコード '%s' に対応する送料データが見つかりません。使用可能なサイズコード: %s",
+                size_code, list(rate_table.size_codes)
+            )
+            # デフォルトの送料データを使用（最初の行）
+            row_number = 0
+        row_numbers.append(row_number)
+    
+    row_numbers = np.array(row_numbers, dtype=np.intp)
+    rate_matrix = rate_table.rates[np.ix_(row_numbers, rate_table.region_positions(regions))]
+    
+    return rate_matrix, row_numbers
+
+def compute_size_matrix(region_shipments, proportions, rate_matrix):
+    """
+    全サイズ・全地域の出荷数と送料を一括で計算する
+    
+    Args:
+        region_shipments (ndarray): 地域別出荷数 (地域数)
+        proportions (ndarray): サイズ別の割合 (サイズ数)
+        rate_matrix (ndarray): 送料単価行列 (サイズ数 × 地域数)
+    
+    Returns:
+        tuple: (サイズ別出荷数行列, サイズ別送料行列) いずれもサイズ数 × 地域数
+    """
+    # 地域ごとに出荷数をサイズへ配分する（各地域のサイズ別出荷数の合計は地域別出荷数と一致する）
+    size_shipments = apportion(region_shipments, proportions).T
+    size_costs = size_shipments * rate_matrix
+    
+    return size_shipments, size_costs
+
+@traced('costing', rows=lambda value: value[1].shipments.size)
 def calculate_shipping_costs(shipments_data, shipping_rates, size_distribution):
     """
     地域別の送料を計算する (複数サイズ対応)
     
     Args:
         shipments_data (DataFrame): 地域別出荷数データ
-        shipping_rates (DataFrame): 送料データ
+        shipping_rates (RateTable or DataFrame): 送料テーブル（DataFrameの場合は RateTable に変換する）
         size_distribution (dict): サイズコードと割合の辞書 (例: {'60': 0.5, '80': 0.3, '100': 0.2})
     
     Returns:
-        tuple: (全体結果データフレーム, サイズ別結果データフレームのリスト)
+        tuple: (全体結果データフレーム, サイズ別の計算結果 ShippingResult)
     """
+    rate_table = as_rate_table(shipping_rates)
+    size_codes = list(size_distribution.keys())
+    proportions = np.array(list(size_distribution.values()), dtype=float)
+    
+    # 送料単価行列を作成し、全サイズ分を一括で計算
+    rate_matrix, row_numbers = build_rate_matrix(rate_table, size_codes, shipments_data.index)
+    region_shipments = shipments_data['shipments'].to_numpy()
+    size_shipments, size_costs = compute_size_matrix(region_shipments, proportions, rate_matrix)
+    
     # 結果データフレームを準備
     result = shipments_data.copy()
-    result['rate'] = 0
-    result['total_cost'] = 0
+    result['rate'] = proportions @ rate_matrix
+    result['total_cost'] = size_costs.sum(axis=0)
     
-    # サイズごとの結果を格納するリスト
-    size_results = []
-    
-    # 各サイズごとに計算
-    for size_code, proportion in size_distribution.items():
-        # 該当サイズの送料データを取得（データ型の問題を避けるため文字列として比較）
-        size_code_str = str(size_code)
-        size_rates_df = shipping_rates[shipping_rates['size_code'].astype(str) == size_code_str]
-        
-        # 対応するサイズが見つからない場合のエラーハンドリング
-        if size_rates_df.empty:
-            print(f"サイズコード '{size_code}' に対応する送料データが見つかりません。")
-            print(f"使用可能なサイズコード: {shipping_rates['size_code'].tolist()}")
-            # デフォルトの送料データを使用（最初の行）
-            size_rates = shipping_rates.iloc[0]
-        else:
-            size_rates = size_rates_df.iloc[0]
-            
-        # デバッグ情報
-        print(f"サイズ '{size_code}' の送料データ: {dict(size_rates)}")
-        
-        # このサイズの結果データフレーム
-        size_result = shipments_data.copy()
-        
-        # このサイズの出荷数を計算
-        size_result['size_shipments'] = (size_result['shipments'] * proportion).round().astype(int)
-        
-        # 地域別の送料単価を追加
-        for region in size_result.index:
-            size_result.loc[region, 'rate'] = size_rates[region]
-        
-        # 地域別の送料合計を計算
-        size_result['size_cost'] = size_result['size_shipments'] * size_result['rate']
-        
-        # サイズ名と重量を追加
-        size_result['size_name'] = size_rates['size_name']
-        size_result['weight'] = size_rates['weight']
-        size_result['size_code'] = size_code
-        size_result['proportion'] = proportion
-        
-        # インデックス名を明示的に設定
-        size_result.index.name = 'region'
-        
-        # 全体の結果に加算
-        result['rate'] += size_result['rate'] * proportion
-        result['total_cost'] += size_result['size_cost']
-        
-        # サイズごとの結果を保存
-        size_results.append(size_result)
+    # サイズ別の結果は配列のまま保持する（地域名・都道府県は全体結果、サイズ名・重量は送料テーブルを参照）
+    size_results = ShippingResult(
+        rate_table,
+        result.index,
+        result['prefectures'].to_numpy() if 'prefectures' in result.columns else None,
+        size_codes,
+        row_numbers,
+        proportions,
+        rate_matrix,
+        size_shipments,
+        size_costs
+    )
     
     return result, size_results
 
-def calculate_summary(result_data, size_results=None):
+@traced('carriers', rows=lambda value: len(value['carriers']))
+def calculate_carrier_costs(shipments_data, carrier_rates, size_distribution):
+    """
+    複数の運送会社の送料を比較する
+    
+    地域 × サイズの出荷数を1回だけ配分し、(運送会社 × サイズ × 地域) の送料単価と掛け合わせて
+    運送会社別の総送料を求める。地域 × サイズごとの最安の運送会社も同時に求める。
+    
+    Args:
+        shipments_data (DataFrame): 地域別出荷数データ
+        carrier_rates (CarrierRates): 運送会社ごとの送料テーブル
+        size_distribution (dict): サイズコードと割合の辞書
+    
+    Returns:
+        dict: 運送会社別の計算結果
+            - 'carriers', 'size_codes', 'regions': 各軸に対応する運送会社名・サイズコード・地域名
+            - 'carrier_cost': 運送会社別の総送料 (運送会社数)
+            - 'complete': 出荷のあるサイズをすべて扱っているか (運送会社数)
+            - 'size_shipments': サイズ × 地域の出荷数
+            - 'cheapest_carrier': サイズ × 地域ごとの最安の運送会社の番号（扱う運送会社がない場合は -1）
+            - 'cheapest_cost': サイズ × 地域ごとの最安の運送会社での送料
+    """
+    size_codes = [str(code) for code in size_distribution.keys()]
+    proportions = np.array(list(size_distribution.values()), dtype=float)
+    regions = list(shipments_data.index)
+    
+    rates, available = carrier_rates.select(size_codes, regions)
+    min_rates, cheapest_carrier = carrier_rates.cheapest(size_codes, regions)
+    
+    size_shipments = apportion(shipments_data['shipments'].to_numpy(), proportions).T
+    carrier_cost = np.einsum('csr,sr->c', rates, size_shipments)
+    shipped_sizes = size_shipments.sum(axis=1) > 0
+    complete = ~(shipped_sizes & ~available).any(axis=1)
+    
+    return {
+        'carriers': list(carrier_rates.carriers),
+        'size_codes': size_codes,
+        'regions': regions,
+        'carrier_cost': carrier_cost,
+        'complete': complete,
+        'size_shipments': size_shipments,
+        'cheapest_carrier': np.where(size_shipments > 0, cheapest_carrier, -1),
+        'cheapest_cost': size_shipments * min_rates
+    }
+
+@traced('summary', rows=lambda summary: len(summary.get('size_info', [])))
+def calculate_summary(result_data, size_results=None, carrier_result=None):
     """
     送料計算の集計結果を生成する
     
     Args:
         result_data (DataFrame): 送料計算結果
-        size_results (list, optional): サイズ別結果データフレームのリスト
+        size_results (ShippingResult, optional): サイズ別の計算結果
+        carrier_result (dict, optional): calculate_carrier_costs の計算結果
     
     Returns:
-        dict: 集計結果（総出荷数、総送料、平均送料、サイズ別情報）
+        dict: 集計結果（総出荷数、総送料、平均送料、サイズ別情報、運送会社別情報、割増・手数料、送料データのバージョン）
     """
     total_shipments = result_data['shipments'].sum()
     total_cost = result_data['total_cost'].sum()
@@ -122,21 +251,19 @@ def calculate_summary(result_data, size_results=None):
     
     # サイズ別の情報を追加
     if size_results:
+        size_shipment_totals, size_cost_totals = size_results.totals()
         size_info = []
-        for size_df in size_results:
-            size_code = size_df['size_code'].iloc[0]
-            size_name = size_df['size_name'].iloc[0]
-            weight = size_df['weight'].iloc[0]
-            proportion = size_df['proportion'].iloc[0]
-            size_shipments = size_df['size_shipments'].sum()
-            size_cost = size_df['size_cost'].sum()
+        for i, (size_code, size_name, weight) in enumerate(
+                zip(size_results.size_codes, size_results.size_names, size_results.weights)):
+            size_shipments = size_shipment_totals[i]
+            size_cost = size_cost_totals[i]
             size_average_cost = size_cost / size_shipments if size_shipments > 0 else 0
             
             size_info.append({
                 'size_code': size_code,
                 'size_name': size_name,
                 'weight': weight,
-                'proportion': proportion,
+                'proportion': size_results.proportions[i],
                 'shipments': size_shipments,
                 'cost': size_cost,
                 'average_cost': size_average_cost
@@ -144,4 +271,298 @@ def calculate_summary(result_data, size_results=None):
         
         summary['size_info'] = size_info
     
-    return summary
\ No newline at end of file
+    # 運送会社別の情報を追加
+    if carrier_result is not None:
+        carrier_info = []
+        for i, carrier in enumerate(carrier_result['carriers']):
+            carrier_cost = carrier_result['carrier_cost'][i]
+            carrier_info.append({
+                'carrier': carrier,
+                'cost': carrier_cost,
+                'average_cost': carrier_cost / total_shipments if total_shipments > 0 else 0,
+                'complete': bool(carrier_result['complete'][i]),
+                'cheapest_shipments': carrier_result['size_shipments'][carrier_result['cheapest_carrier'] == i].sum()
+            })
+        
+        summary['carrier_info'] = carrier_info
+        summary['cheapest_cost'] = carrier_result['cheapest_cost'].sum()
+    
+    # 割増・手数料の規則ごとの金額と、計算に使った送料データのバージョンを記録する
+    if size_results is not None:
+        summary.update(surcharge_summary(size_results, total_cost))
+        summary['rate_table_version'] = size_results.rate_table.version
+    
+    return summary
+
+@traced('batch', rows=lambda batch_result: len(batch_result['total_shipments']))
+def calculate_batch(scenarios, shipping_rates, population_data, block_size=8192, max_block_cells=2_000_000,
+                    carrier_rates=None):
+    """
+    複数の見積もりシナリオをまとめて計算する
+    
+    シナリオごとの計算結果は calculate_regional_shipments → calculate_shipping_costs →
+    calculate_summary を1件ずつ実行した場合と一致する。出荷数は apportion で配分するため、
+    地域別出荷数の合計は総出荷個数と、各地域のサイズ別出荷数の合計は地域別出荷数と常に一致する。
+    
+    Args:
+        scenarios (dict): シナリオの配列をまとめた辞書
+            - 'total_shipments': 全国総出荷個数 (シナリオ数)
+            - 'size_codes': サイズコードのリスト (サイズ数)
+            - 'size_proportions': サイズ別の割合 (シナリオ数 × サイズ数)
+            - 'region_percentages' (任意): 地域別出荷比率 (シナリオ数 × 地域数)。
+              省略時は population_data の percentage を全シナリオに使用
+        shipping_rates (RateTable or DataFrame): 送料テーブル
+        population_data (DataFrame): 地域別人口データ
+        block_size (int, optional): 一度に計算するシナリオ数の上限
+        max_block_cells (int, optional): 一度に計算するシナリオ × 地域 × サイズのセル数の上限（メモリ使用量の上限）
+        carrier_rates (CarrierRates, optional): 比較する運送会社ごとの送料テーブル
+    
+    Returns:
+        dict: シナリオごとの集計結果
+            - 'total_shipments', 'total_cost', 'average_cost': (シナリオ数)
+            - 'region_shipments', 'region_cost': (シナリオ数 × 地域数)
+            - 'size_shipments', 'size_cost': (シナリオ数 × サイズ数)
+            - 'size_proportions': (シナリオ数 × サイズ数)
+            - 'regions', 'size_codes': 各列に対応する地域名・サイズコード
+            carrier_rates を指定した場合は以下も含む
+            - 'carrier_cost', 'carrier_complete': 運送会社別の総送料・全サイズを扱っているか (シナリオ数 × 運送会社数)
+            - 'cheapest_cost': 地域 × サイズごとに最安の運送会社を選んだ場合の総送料 (シナリオ数)
+            - 'carriers': 運送会社名
+            送料テーブルに割増・手数料の規則がある場合は以下も含む
+            - 'surcharge_cost': 規則ごとの金額 (シナリオ数 × 規則数)
+    """
+    rate_table = as_rate_table(shipping_rates)
+    regions = list(population_data.index)
+    size_codes = [str(code) for code in scenarios['size_codes']]
+    
+    total_shipments = np.asarray(scenarios['total_shipments'], dtype=np.int64).reshape(-1)
+    n_scenarios = len(total_shipments)
+    
+    size_proportions = np.asarray(scenarios['size_proportions'], dtype=float)
+    size_proportions = np.broadcast_to(size_proportions, (n_scenarios, len(size_codes)))
+    
+    region_percentages = scenarios.get('region_percentages')
+    if region_percentages is None:
+        region_percentages = population_data['percentage'].to_numpy(dtype=float)
+    region_percentages = np.broadcast_to(
+        np.asarray(region_percentages, dtype=float), (n_scenarios, len(regions))
+    )
+    
+    rate_matrix, row_numbers = build_rate_matrix(rate_table, size_codes, regions)
+    region_size_rates = rate_matrix.T
+    
+    surcharges = rate_table.surcharges
+    if surcharges is not None:
+        # 規則ごとの割合を適用するセル・1個あたりの料金（規則 × サイズ × 地域）
+        surcharge_masks, surcharge_fees = surcharges.select(row_numbers, rate_table.region_positions(regions))
+        surcharge_cost = np.empty((n_scenarios, len(surcharges)), dtype=np.int64)
+    
+    if carrier_rates is not None:
+        # 運送会社 × 地域 × サイズ、および地域 × サイズごとの最安の送料単価
+        carrier_tensor, carrier_available = carrier_rates.select(size_codes, regions)
+        carrier_tensor = np.ascontiguousarray(carrier_tensor.transpose(0, 2, 1))
+        cheapest_rates = carrier_rates.cheapest(size_codes, regions)[0].T
+        carrier_cost = np.empty((n_scenarios, len(carrier_rates)), dtype=np.int64)
+        cheapest_cost = np.empty(n_scenarios, dtype=np.int64)
+    
+    # 地域数 × サイズ数が大きい場合は、1ブロックのセル数が上限を超えないようにシナリオ数を減らす
+    block_size = max(1, min(block_size, max_block_cells // max(1, len(regions) * len(size_codes))))
+    
+    region_shipments = np.empty((n_scenarios, len(regions)), dtype=np.int64)
+    region_cost = np.empty((n_scenarios, len(regions)), dtype=np.int64)
+    size_shipments = np.empty((n_scenarios, len(size_codes)), dtype=np.int64)
+    size_cost = np.empty((n_scenarios, len(size_codes)), dtype=np.int64)
+    
+    for start in range(0, n_scenarios, block_size):
+        stop = min(start + block_size, n_scenarios)
+        totals = total_shipments[start:stop]
+        
+        # 地域別出荷数を配分し、さらに地域ごとにサイズへ配分する（シナリオ × 地域 × サイズ）
+        shipments = apportion(totals, region_percentages[start:stop])
+        cell_shipments = apportion(shipments, size_proportions[start:stop, np.newaxis, :])
+        cell_cost = cell_shipments * region_size_rates
+        
+        region_shipments[start:stop] = shipments
+        region_cost[start:stop] = cell_cost.sum(axis=2)
+        size_shipments[start:stop] = cell_shipments.sum(axis=1)
+        size_cost[start:stop] = cell_cost.sum(axis=1)
+        
+        if carrier_rates is not None:
+            carrier_cost[start:stop] = np.einsum('brs,crs->bc', cell_shipments, carrier_tensor)
+            cheapest_cost[start:stop] = np.einsum('brs,rs->b', cell_shipments, cheapest_rates)
+        
+        if surcharges is not None:
+            surcharge_cost[start:stop] = surcharges.rule_costs(
+                np.einsum('brs,ksr->bk', cell_cost, surcharge_masks),
+                np.einsum('brs,ksr->bk', cell_shipments, surcharge_fees)
+            )
+    
+    total_cost = region_cost.sum(axis=1)
+    average_cost = np.divide(
+        total_cost, total_shipments,
+        out=np.zeros(n_scenarios, dtype=float), where=total_shipments > 0
+    )
+    
+    batch_result = {
+        'total_shipments': total_shipments,
+        'total_cost': total_cost,
+        'average_cost': average_cost,
+        'region_shipments': region_shipments,
+        'region_cost': region_cost,
+        'size_shipments': size_shipments,
+        'size_cost': size_cost,
+        'size_proportions': np.array(size_proportions),
+        'regions': regions,
+        'size_codes': size_codes
+    }
+    
+    if carrier_rates is not None:
+        # 出荷のある（割合が0でない）サイズをすべて扱っている運送会社のみ完全な見積もりとする
+        missing = (size_shipments > 0)[:, np.newaxis, :] & ~carrier_available[np.newaxis]
+        batch_result['carrier_cost'] = carrier_cost
+        batch_result['carrier_complete'] = ~missing.any(axis=2)
+        batch_result['cheapest_cost'] = cheapest_cost
+        batch_result['carriers'] = list(carrier_rates.carriers)
+    
+    if surcharges is not None:
+        batch_result['surcharge_cost'] = surcharge_cost
+    
+    return batch_result
+
+def iter_batch_summaries(batch_result, shipping_rates):
+    """
+    calculate_batch の結果をシナリオごとの集計結果に展開する
+    
+    Args:
+        batch_result (dict): calculate_batch の戻り値
+        shipping_rates (RateTable or DataFrame): 送料テーブル（サイズ名・重量の取得に使用）
+    
+    Yields:
+        dict: calculate_summary と同じ形式の集計結果（割合が0のサイズは含めない。
+            運送会社別情報には最安となる出荷数 cheapest_shipments を含めない）
+    """
+    rate_table = as_rate_table(shipping_rates)
+    size_meta = []
+    for size_code in batch_result['size_codes']:
+        row_number = rate_table.index_of(size_code)
+        if row_number is None:
+            row_number = 0
+        size_meta.append((size_code, rate_table.size_names[row_number], rate_table.weights[row_number]))
+    
+    for i in range(len(batch_result['total_shipments'])):
+        size_info = []
+        for j, (size_code, size_name, weight) in enumerate(size_meta):
+            proportion = batch_result['size_proportions'][i, j]
+            if proportion == 0:
+                continue
+            size_shipments = batch_result['size_shipments'][i, j]
+            size_cost = batch_result['size_cost'][i, j]
+            size_info.append({
+                'size_code': size_code,
+                'size_name': size_name,
+                'weight': weight,
+                'proportion': proportion,
+                'shipments': size_shipments,
+                'cost': size_cost,
+                'average_cost': size_cost / size_shipments if size_shipments > 0 else 0
+            })
+        
+        summary = {
+            'total_shipments': batch_result['total_shipments'][i],
+            'total_cost': batch_result['total_cost'][i],
+            'average_cost': batch_result['average_cost'][i],
+            'size_info': size_info
+        }
+        
+        if 'carriers' in batch_result:
+            total_shipments = batch_result['total_shipments'][i]
+            summary['carrier_info'] = [
+                {
+                    'carrier': carrier,
+                    'cost': batch_result['carrier_cost'][i, c],
+                    'average_cost': batch_result['carrier_cost'][i, c] / total_shipments if total_shipments > 0 else 0,
+                    'complete': bool(batch_result['carrier_complete'][i, c])
+                }
+                for c, carrier in enumerate(batch_result['carriers'])
+            ]
+            summary['cheapest_cost'] = batch_result['cheapest_cost'][i]
+        
+        if 'surcharge_cost' in batch_result:
+            summary.update(surcharge_items(
+                rate_table.surcharges, batch_result['surcharge_cost'][i], batch_result['total_cost'][i]
+            ))
+        
+        summary['rate_table_version'] = rate_table.version
+        
+        yield summary
+
+
+def make_quote_key(total_shipments, population_data, shipping_rates, size_distribution, carrier_rates=None):
+    """
+    見積もりの入力からキャッシュ用の正規化されたキーを作成する
+    
+    Args:
+        total_shipments (int): 全国総出荷個数
+        population_data (DataFrame): 地域別人口データ（カスタム比率適用後）
+        shipping_rates (RateTable or DataFrame): 送料テーブル
+        size_distribution (dict): サイズコードと割合の辞書
+        carrier_rates (CarrierRates, optional): 比較する運送会社ごとの送料テーブル
+    
+    Returns:
+        tuple: ハッシュ可能なキー
+    """
+    rate_table = as_rate_table(shipping_rates)
+    
+    population_digest = hashlib.sha1()
+    population_digest.update('\x1f'.join(map(str, population_data.index)).encode('utf-8'))
+    population_digest.update(population_data['percentage'].to_numpy(dtype=float).tobytes())
+    population_digest.update(population_data['population'].to_numpy(dtype=float).tobytes())
+    
+    # サイズの並び順は結果の並び順に影響するため、入力順のまま保持する
+    sizes = tuple((str(size_code), float(proportion)) for size_code, proportion in size_distribution.items())
+    
+    carrier_fingerprint = carrier_rates.fingerprint if carrier_rates is not None else None
+    
+    return (int(total_shipments), sizes, population_digest.hexdigest(), rate_table.fingerprint, carrier_fingerprint)
+
+def calculate_quote(total_shipments, population_data, shipping_rates, size_distribution, cache=None,
+                    carrier_rates=None):
+    """
+    地域別出荷数・送料・集計結果をまとめて計算する
+    
+    cache を指定した場合は同じ入力の計算結果を再利用する。キャッシュされた結果は
+    呼び出し元の間で共有されるため、変更してはならない。
+    
+    Args:
+        total_shipments (int): 全国総出荷個数
+        population_data (DataFrame): 地域別人口データ（カスタム比率適用後）
+        shipping_rates (RateTable or DataFrame): 送料テーブル
+        size_distribution (dict): サイズコードと割合の辞書
+        cache (ResultCache, optional): 計算結果のキャッシュ
+        carrier_rates (CarrierRates, optional): 比較する運送会社ごとの送料テーブル。
+            指定した場合は集計結果に運送会社別情報（carrier_info, cheapest_cost）を含める
+    
+    Returns:
+        tuple: (全体結果データフレーム, サイズ別の計算結果 ShippingResult, 集計結果)
+    """
+    rate_table = as_rate_table(shipping_rates)
+    
+    if cache is not None:
+        key = make_quote_key(total_shipments, population_data, rate_table, size_distribution, carrier_rates)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+    
+    shipments_result = calculate_regional_shipments(total_shipments, population_data)
+    result, size_results = calculate_shipping_costs(shipments_result, rate_table, size_distribution)
+    carrier_result = None
+    if carrier_rates is not None:
+        carrier_result = calculate_carrier_costs(shipments_result, carrier_rates, size_distribution)
+    summary = calculate_summary(result, size_results, carrier_result)
+    quote = (result, size_results, summary)
+    
+    if cache is not None:
+        nbytes = int(result.memory_usage(deep=True).sum()) + size_results.nbytes
+        cache.put(key, quote, nbytes)
+    
+    return quote
@@ -0,0 +1,145 @@
+"""
+複数の運送会社の送料テーブルをまとめて扱う
+
+運送会社ごとの RateTable を (運送会社 × サイズ × 地域) の3次元配列にそろえておき、
+運送会社別の総送料と、地域 × サイズごとの最安の運送会社を1回の配列演算で求める。
+運送会社ごとに計算をやり直さないため、運送会社数やシナリオ数が増えても計算量は線形に収まる。
+"""
+import hashlib
+
+import numpy as np
+
+from utils.rate_table import as_rate_table
+
+
+class CarrierRates:
+    """
+    運送会社ごとの送料テーブルを1つの3次元配列にまとめたもの
+
+    サイズは全運送会社のサイズコードの和集合（最初に現れた順）とし、
+    取り扱いのないサイズは available を False、送料単価を 0 とする。
+    地域はすべての運送会社の送料テーブルにそろっている必要がある。
+
+    Args:
+        rate_tables (dict): 運送会社名 → 送料テーブル（RateTable or DataFrame）
+        regions (list, optional): 地域名の並び（省略時は最初の送料テーブルの地域）
+
+    Attributes:
+        carriers (tuple): 運送会社名
+        size_codes (tuple): サイズコード
+        size_names (tuple), weights (tuple): サイズ名・重量の表記（最初に現れた送料テーブルのもの）
+        regions (tuple): 地域名
+        rates (ndarray): 送料単価 (運送会社数 × サイズ数 × 地域数の int64 配列)
+        available (ndarray): 取り扱いの有無 (運送会社数 × サイズ数の bool 配列)
+        fingerprint (str): 内容から計算したハッシュ値
+
+    Raises:
+        ValueError: 運送会社がない、または送料テーブルに地域が不足している場合
+    """
+
+    def __init__(self, rate_tables, regions=None):
+        if not rate_tables:
+            raise ValueError("運送会社の送料テーブルがありません")
+
+        tables = {str(name): as_rate_table(table) for name, table in rate_tables.items()}
+        self.carriers = tuple(tables)
+        first_table = next(iter(tables.values()))
+        self.regions = tuple(regions) if regions is not None else first_table.regions
+
+        size_codes, size_names, weights = [], [], []
+        size_index = {}
+        for table in tables.values():
+            for i, code in enumerate(table.size_codes):
+                if code not in size_index:
+                    size_index[code] = len(size_codes)
+                    size_codes.append(code)
+                    size_names.append(table.size_names[i])
+                    weights.append(table.weights[i])
+        self.size_codes = tuple(size_codes)
+        self.size_names = tuple(size_names)
+        self.weights = tuple(weights)
+        self.size_index = size_index
+
+        rates = np.zeros((len(self.carriers), len(self.size_codes), len(self.regions)), dtype=np.int64)
+        available = np.zeros((len(self.carriers), len(self.size_codes)), dtype=bool)
+        for c, (name, table) in enumerate(tables.items()):
+            try:
+                columns = table.region_positions(self.regions)
+            except ValueError as e:
+                raise ValueError(f"{name}: {e}") from None
+            rows = np.array([size_index[code] for code in table.size_codes], dtype=np.intp)
+            # 同じサイズコードが重複している場合は最初の行を使用する（RateTable.index_of と同じ）
+            rows, first = np.unique(rows, return_index=True)
+            rates[c, rows] = table.rates[np.ix_(first, columns)]
+            available[c, rows] = True
+
+        rates.flags.writeable = False
+        available.flags.writeable = False
+        self.rates = rates
+        self.available = available
+
+        digest = hashlib.sha1()
+        for values in (self.carriers, self.size_codes, self.regions):
+            digest.update('\x1f'.join(map(str, values)).encode('utf-8'))
+            digest.update(b'\x1e')
+        digest.update(self.rates.tobytes())
+        digest.update(self.available.tobytes())
+        self.fingerprint = digest.hexdigest()
+
+    def __len__(self):
+        return len(self.carriers)
+
+    def __repr__(self):
+        return f"CarrierRates(carriers={len(self.carriers)}, sizes={len(self.size_codes)}, regions={len(self.regions)})"
+
+    def index_of(self, size_code):
+        """
+        サイズコードに対応する行番号を返す（見つからない場合は None）
+        """
+        return self.size_index.get(str(size_code))
+
+    def select(self, size_codes, regions):
+        """
+        指定したサイズ・地域の並びに送料単価をそろえる
+
+        Args:
+            size_codes (list): サイズコードのリスト
+            regions (list): 地域名のリスト
+
+        Returns:
+            tuple: (送料単価 (運送会社数 × サイズ数 × 地域数), 取り扱いの有無 (運送会社数 × サイズ数))
+                いずれの運送会社も扱っていないサイズは、すべて取り扱いなしとする
+        """
+        missing_regions = [region for region in regions if region not in self.regions]
+        if missing_regions:
+            raise ValueError(f"以下の地域の送料データがありません: {', '.join(map(str, missing_regions))}")
+        columns = np.array([self.regions.index(region) for region in regions], dtype=np.intp)
+
+        rows = np.array([self.size_index.get(str(code), -1) for code in size_codes], dtype=np.intp)
+        known = rows >= 0
+        rows = np.where(known, rows, 0)
+
+        rates = self.rates[:, rows][:, :, columns]
+        available = self.available[:, rows] & known
+        return np.where(available[:, :, np.newaxis], rates, 0), available
+
+    def cheapest(self, size_codes, regions):
+        """
+        地域 × サイズごとに最安の運送会社を求める
+
+        Args:
+            size_codes (list): サイズコードのリスト
+            regions (list): 地域名のリスト
+
+        Returns:
+            tuple: (最安の送料単価 (サイズ数 × 地域数), 最安の運送会社の番号 (サイズ数 × 地域数))
+                どの運送会社も扱っていないサイズは、送料単価 0・運送会社の番号 -1 とする
+        """
+        rates, available = self.select(size_codes, regions)
+        mask = np.broadcast_to(available[:, :, np.newaxis], rates.shape)
+        masked = np.where(mask, rates, np.iinfo(np.int64).max)
+        # 同じ送料の場合は先に登録した運送会社を優先する
+        carrier_numbers = masked.argmin(axis=0)
+        min_rates = np.take_along_axis(rates, carrier_numbers[np.newaxis], axis=0)[0]
+        served = mask.any(axis=0)
+        return np.where(served, min_rates, 0), np.where(served, carrier_numbers, -1)
@@ -0,0 +1,535 @@
+"""
+送料シミュレーターのコマンドラインインターフェース
+
+Streamlit を使わずに、CSV / JSONL で与えたシナリオをまとめて見積もる。
+入力は一定件数ずつ読み込んで calculate_batch で計算し、結果を1行ずつ出力するため、
+シナリオ数が増えてもメモリ使用量は一定に保たれる。
+
+使用例:
+    python -m utils quote scenarios.jsonl > quotes.jsonl
+    cat scenarios.csv | python -m utils quote --input-format csv --output-format csv
+    python -m utils orders orders.csv --workers 8 > order_costs.json
+    python -m utils simulate 10000 --size 60=0.7 --size 80=0.3 --draws 1000000
+    python -m utils forecast 10000 --size 60=1 --periods 36 --growth 0.02 --start 2027-01 --excel forecast.xlsx
+    python -m utils workbooks clients.jsonl --zip workbooks.zip --workers 8
+    python -m utils serve --host 0.0.0.0 --port 8080
+"""
+import argparse
+import contextlib
+import csv
+import json
+import logging
+import os
+import sys
+
+from utils import instrumentation
+from utils.calculator import calculate_batch, iter_batch_summaries
+from utils.data_loader import (
+    load_population_data,
+    load_rate_table,
+    load_zone_table,
+    read_population_data,
+    read_rate_table
+)
+from utils.forecast import calculate_forecast, forecast_total_summary, iter_period_summaries
+from utils.orders import price_order_file, order_summary
+from utils.registry import TableRegistry
+from utils.scenarios import ScenarioError, build_scenarios, summary_record, surcharge_record, to_builtin
+from utils.server import serve
+from utils.simulation import simulate_costs
+
+# CSV入力でサイズ別割合・地域別比率を表すカラムの接頭辞
+SIZE_COLUMN_PREFIX = 'size_'
+REGION_COLUMN_PREFIX = 'region_'
+
+
+def _read_jsonl(stream):
+    """
+    JSONL形式のシナリオを1件ずつ読み込む
+
+    各行の形式:
+        {"id": "A", "total_shipments": 1000, "size_distribution": {"60": 0.7, "80": 0.3},
+         "region_distribution": {"関東": 0.5, ...}}   # region_distribution は任意
+    """
+    for line_number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ScenarioError(f"{line_number}行目: JSONとして解析できません ({e})")
+        if not isinstance(record, dict):
+            raise ScenarioError(f"{line_number}行目: シナリオはJSONオブジェクトで指定してください")
+        record.setdefault('id', line_number)
+        yield line_number, record
+
+
+def _read_csv(stream):
+    """
+    CSV形式のシナリオを1件ずつ読み込む
+
+    カラムの形式:
+        id（任意）, total_shipments, size_<サイズコード>..., region_<地域名>...（任意）
+    """
+    reader = csv.DictReader(stream)
+    for line_number, row in enumerate(reader, start=2):
+        size_distribution = {}
+        region_distribution = {}
+        for column, value in row.items():
+            if column is None or value in (None, ''):
+                continue
+            if column.startswith(SIZE_COLUMN_PREFIX):
+                size_distribution[column[len(SIZE_COLUMN_PREFIX):]] = value
+            elif column.startswith(REGION_COLUMN_PREFIX):
+                region_distribution[column[len(REGION_COLUMN_PREFIX):]] = value
+
+        record = {
+            'id': row.get('id') or line_number - 1,
+            'total_shipments': row.get('total_shipments'),
+            'size_distribution': size_distribution
+        }
+        if region_distribution:
+            record['region_distribution'] = region_distribution
+        yield line_number, record
+
+
+def _chunks(records, chunk_size):
+    """
+    シナリオを chunk_size 件ずつのリストにまとめる
+    """
+    chunk = []
+    for item in records:
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _write_jsonl(stream, scenario_id, summary):
+    stream.write(json.dumps(summary_record(scenario_id, summary), ensure_ascii=False) + '\n')
+
+
+def _csv_header(size_codes, surcharges=None):
+    header = ['id', 'total_shipments', 'total_cost', 'average_cost']
+    for size_code in size_codes:
+        header.extend([f'shipments_{size_code}', f'cost_{size_code}'])
+    if surcharges is not None:
+        header.extend(f'surcharge_{name}' for name in surcharges.names)
+        header.extend(['surcharge_total', 'invoice_total'])
+    return header
+
+
+def _csv_row(scenario_id, summary, size_codes):
+    by_code = {info['size_code']: info for info in summary['size_info']}
+    row = [
+        scenario_id,
+        to_builtin(summary['total_shipments']),
+        to_builtin(summary['total_cost']),
+        f"{summary['average_cost']:.4f}"
+    ]
+    for size_code in size_codes:
+        info = by_code.get(size_code)
+        row.extend([to_builtin(info['shipments']), to_builtin(info['cost'])] if info else [0, 0])
+    if 'surcharge_info' in summary:
+        row.extend(to_builtin(info['cost']) for info in summary['surcharge_info'])
+        row.extend([to_builtin(summary['surcharge_total']), to_builtin(summary['invoice_total'])])
+    return row
+
+
+def run_quotes(input_stream, output_stream, rate_table, population_data,
+               input_format='jsonl', output_format='jsonl', chunk_size=1000):
+    """
+    シナリオを読み込んで見積もり結果を書き出す
+
+    Args:
+        input_stream: シナリオの入力ストリーム（テキスト）
+        output_stream: 結果の出力ストリーム（テキスト）
+        rate_table (RateTable): 送料テーブル
+        population_data (DataFrame): 地域別人口データ
+        input_format (str): 'jsonl' または 'csv'
+        output_format (str): 'jsonl' または 'csv'
+        chunk_size (int): 一度に計算するシナリオ数
+
+    Returns:
+        int: 処理したシナリオ数
+    """
+    records = _read_csv(input_stream) if input_format == 'csv' else _read_jsonl(input_stream)
+
+    csv_writer = None
+    if output_format == 'csv':
+        csv_writer = csv.writer(output_stream)
+        csv_writer.writerow(_csv_header(rate_table.size_codes, rate_table.surcharges))
+
+    count = 0
+    for chunk in _chunks(records, chunk_size):
+        batch_result = calculate_batch(build_scenarios(chunk, rate_table, population_data), rate_table, population_data)
+        for (_, record), summary in zip(chunk, iter_batch_summaries(batch_result, rate_table)):
+            if csv_writer is not None:
+                csv_writer.writerow(_csv_row(record['id'], summary, rate_table.size_codes))
+            else:
+                _write_jsonl(output_stream, record['id'], summary)
+        output_stream.flush()
+        count += len(chunk)
+
+    return count
+
+
+def _guess_format(path, default='jsonl'):
+    if path and path.lower().endswith('.csv'):
+        return 'csv'
+    return default
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m utils', description='送料シミュレーター（コマンドライン版）')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    quote = subparsers.add_parser('quote', help='シナリオをまとめて見積もる')
+    quote.add_argument('input', nargs='?', default='-', help='シナリオファイル（省略時または - で標準入力）')
+    quote.add_argument('-o', '--output', default='-', help='出力ファイル（省略時は標準出力）')
+    quote.add_argument('--input-format', choices=['jsonl', 'csv'], help='入力形式（省略時は拡張子から判定、標準入力は jsonl）')
+    quote.add_argument('--output-format', choices=['jsonl', 'csv'], help='出力形式（省略時は拡張子から判定、標準出力は jsonl）')
+    quote.add_argument('--rates', help='送料データのCSVファイル（省略時はアプリと同じ探索順）')
+    quote.add_argument('--population', help='人口データのCSVファイル（省略時はアプリと同じ探索順）')
+    quote.add_argument('--chunk-size', type=int, default=1000, help='一度に計算するシナリオ数')
+    quote.set_defaults(handler=_command_quote)
+
+    orders = subparsers.add_parser('orders', help='出荷実績（注文）ファイルの送料を集計する')
+    orders.add_argument('input', help='注文ファイル（CSV）')
+    orders.add_argument('-o', '--output', default='-', help='出力ファイル（JSON、省略時は標準出力）')
+    orders.add_argument('--rates', help='送料データのCSVファイル（省略時はアプリと同じ探索順）')
+    orders.add_argument('--zones', help='ゾーンデータのCSVファイル（省略時は都道府県データ）')
+    orders.add_argument('--workers', type=int, help='並列処理のプロセス数（省略時はCPU数）')
+    orders.add_argument('--block-mb', type=int, default=32, help='1ブロックのサイズ（MB）')
+    orders.add_argument('--encoding', default='utf-8', help='注文ファイルの文字コード（例: cp932）')
+    orders.set_defaults(handler=_command_orders)
+
+    simulate = subparsers.add_parser('simulate', help='需要のばらつきを考慮した送料の範囲を求める')
+    simulate.add_argument('total_shipments', type=int, help='全国総出荷個数')
+    simulate.add_argument('--size', action='append', required=True, metavar='CODE=RATIO',
+                          help='サイズコードと割合（例: --size 60=0.7 --size 80=0.3）')
+    simulate.add_argument('-o', '--output', default='-', help='出力ファイル（JSON、省略時は標準出力）')
+    simulate.add_argument('--rates', help='送料データのCSVファイル（省略時はアプリと同じ探索順）')
+    simulate.add_argument('--population', help='人口データのCSVファイル（省略時はアプリと同じ探索順）')
+    simulate.add_argument('--draws', type=int, default=100_000, help='試行回数')
+    simulate.add_argument('--region-concentration', type=float, help='地域別比率のディリクレ分布の集中度（省略時は比率を固定）')
+    simulate.add_argument('--size-concentration', type=float, help='サイズ構成のディリクレ分布の集中度（省略時は比率を固定）')
+    simulate.add_argument('--seed', type=int, default=0, help='乱数のシード')
+    simulate.add_argument('--workers', type=int, help='並列処理のプロセス数（省略時はCPU数）')
+    simulate.set_defaults(handler=_command_simulate)
+
+    forecast = subparsers.add_parser('forecast', help='成長率と季節変動を考慮して月ごとの送料を予測する')
+    forecast.add_argument('base_shipments', type=int, help='1か月目の（季節係数を掛ける前の）出荷個数')
+    forecast.add_argument('--size', action='append', required=True, metavar='CODE=RATIO',
+                          help='サイズコードと割合（例: --size 60=0.7 --size 80=0.3）')
+    forecast.add_argument('--periods', type=int, default=12, help='期間の月数')
+    forecast.add_argument('--growth', type=float, default=0.0, help='月次の成長率（例: 0.02 で毎月2%%増加）')
+    forecast.add_argument('--seasonality', metavar='JAN,...,DEC', help='1月〜12月の季節係数をカンマ区切りで指定（1.0 が平常月）')
+    forecast.add_argument('--start', metavar='YYYY-MM', help='1か月目の年月（省略時は1か月目を1月とする）')
+    forecast.add_argument('--drift', action='append', default=[], metavar='REGION=RATE',
+                          help='地域別出荷比率の月次の変化率（例: --drift 関東=0.01）')
+    forecast.add_argument('-o', '--output', default='-', help='期間ごとの集計結果の出力ファイル（JSONL、省略時は標準出力）')
+    forecast.add_argument('--excel', help='Excel ファイルの出力先')
+    forecast.add_argument('--rates', help='送料データのCSVファイル（省略時はアプリと同じ探索順）')
+    forecast.add_argument('--population', help='人口データのCSVファイル（省略時はアプリと同じ探索順）')
+    forecast.set_defaults(handler=_command_forecast)
+
+    workbooks = subparsers.add_parser('workbooks', help='シナリオ（クライアント）ごとの Excel ファイルを一括で作成する')
+    workbooks.add_argument('input', nargs='?', default='-', help='シナリオファイル（省略時または - で標準入力、id をファイル名に使う）')
+    destination = workbooks.add_mutually_exclusive_group(required=True)
+    destination.add_argument('--output-dir', help='Excel ファイルの出力先ディレクトリ')
+    destination.add_argument('--zip', help='Excel ファイルをまとめる zip ファイル')
+    workbooks.add_argument('-o', '--output', default='-', help='クライアントごとの集計結果の出力ファイル（JSONL、省略時は標準出力）')
+    workbooks.add_argument('--input-format', choices=['jsonl', 'csv'], help='入力形式（省略時は拡張子から判定、標準入力は jsonl）')
+    workbooks.add_argument('--rates', help='送料データのCSVファイル（省略時はアプリと同じ探索順）')
+    workbooks.add_argument('--population', help='人口データのCSVファイル（省略時はアプリと同じ探索順）')
+    workbooks.add_argument('--workers', type=int, help='並列処理のプロセス数（省略時はCPU数）')
+    workbooks.add_argument('--chunk-size', type=int, default=4, help='1プロセスに一度に渡すクライアント数')
+    workbooks.set_defaults(handler=_command_workbooks)
+
+    service = subparsers.add_parser('serve', help='見積もりサービス（HTTP / JSON）を起動する')
+    service.add_argument('--host', default='127.0.0.1', help='待ち受けるアドレス（コンテナでは 0.0.0.0）')
+    service.add_argument('--port', type=int, default=8080, help='待ち受けるポート')
+    service.add_argument('--rates', help='送料データのCSVファイル（省略時はアプリと同じ探索順）')
+    service.add_argument('--population', help='人口データのCSVファイル（省略時はアプリと同じ探索順）')
+    service.add_argument('--workers', type=int, help='一括見積もり用のプロセス数（0 でプロセスを使わない、省略時はCPU数）')
+    service.add_argument('--process-threshold', type=int, default=2000, help='この件数以上の一括見積もりをプロセスで計算する')
+    service.add_argument('--reload-interval', type=float, help='送料データの変更を確認する間隔（秒、0 で確認しない、省略時は環境変数 TABLE_RELOAD_INTERVAL または5秒）')
+    service.add_argument('--batch-window-ms', type=float, default=2.0, help='1件ずつの見積もりをまとめる待ち時間（ミリ秒）')
+    service.set_defaults(handler=_command_serve)
+
+    for subparser in subparsers.choices.values():
+        subparser.add_argument('-v', '--verbose', action='store_true', help='読み込みメッセージと処理段階ごとの所要時間を標準エラーに出力する')
+
+    return parser
+
+
+def _load_rate_table(file_path):
+    # 指定されたファイルを読み込めない場合はエラーにする（ダミーデータに切り替えない）
+    return read_rate_table(file_path) if file_path is not None else load_rate_table()
+
+
+def _load_tables(args):
+    rate_table = _load_rate_table(args.rates)
+    if args.population is not None:
+        population_data = read_population_data(args.population)
+    else:
+        population_data = load_population_data()
+    return rate_table, population_data
+
+
+def _command_quote(args):
+    rate_table, population_data = _load_tables(args)
+
+    input_format = args.input_format or _guess_format(args.input if args.input != '-' else None)
+    output_format = args.output_format or _guess_format(args.output if args.output != '-' else None)
+
+    with contextlib.ExitStack() as stack:
+        if args.input == '-':
+            input_stream = sys.stdin
+        else:
+            input_stream = stack.enter_context(open(args.input, encoding='utf-8-sig', newline=''))
+        if args.output == '-':
+            output_stream = sys.stdout
+        else:
+            output_stream = stack.enter_context(open(args.output, 'w', encoding='utf-8', newline=''))
+
+        count = run_quotes(
+            input_stream, output_stream, rate_table, population_data,
+            input_format=input_format, output_format=output_format, chunk_size=args.chunk_size
+        )
+
+    print(f"{count}件のシナリオを見積もりました", file=sys.stderr)
+    return 0
+
+
+def _command_orders(args):
+    rate_table = _load_rate_table(args.rates)
+    if args.zones is not None and not os.path.exists(args.zones):
+        raise FileNotFoundError(f"ゾーンデータのファイルが見つかりません: {args.zones}")
+    zone_table = load_zone_table(args.zones)
+
+    order_result = price_order_file(
+        args.input, rate_table, zone_table,
+        workers=args.workers, block_bytes=args.block_mb * 1024 * 1024, encoding=args.encoding
+    )
+    summary = order_summary(order_result, rate_table)
+
+    record = {
+        'rows': order_result['rows'],
+        'unmatched_rows': order_result['unmatched_rows'],
+        'total_shipments': order_result['total_shipments'],
+        'total_cost': order_result['total_cost'],
+        'average_cost': order_result['average_cost'],
+        'size_info': [{key: to_builtin(value) for key, value in info.items()} for info in summary['size_info']],
+        **surcharge_record(summary),
+        'rate_table_version': summary['rate_table_version'],
+        'region_info': [
+            {
+                'region': region,
+                'shipments': int(order_result['shipments'][i].sum()),
+                'cost': int(order_result['cost'][i].sum())
+            }
+            for i, region in enumerate(order_result['regions'])
+        ]
+    }
+
+    with contextlib.ExitStack() as stack:
+        if args.output == '-':
+            output_stream = sys.stdout
+        else:
+            output_stream = stack.enter_context(open(args.output, 'w', encoding='utf-8'))
+        json.dump(record, output_stream, ensure_ascii=False, indent=2)
+        output_stream.write('\n')
+
+    if order_result['unmatched_rows']:
+        print(f"地域・サイズ・数量が不明な{order_result['unmatched_rows']}行を除外しました", file=sys.stderr)
+    return 0
+
+
+def _parse_size_option(values, rate_table):
+    size_distribution = {}
+    for value in values:
+        size_code, sep, ratio = value.partition('=')
+        if not sep:
+            raise ScenarioError(f"--size は サイズコード=割合 の形式で指定してください: {value}")
+        if rate_table.index_of(size_code) is None:
+            raise ScenarioError(f"送料データにないサイズコードです: {size_code}")
+        try:
+            size_distribution[size_code] = float(ratio)
+        except ValueError:
+            raise ScenarioError(f"割合が数値ではありません: {value}") from None
+    return size_distribution
+
+
+def _command_simulate(args):
+    rate_table, population_data = _load_tables(args)
+    size_distribution = _parse_size_option(args.size, rate_table)
+
+    simulation = simulate_costs(
+        args.total_shipments, population_data, rate_table, size_distribution,
+        n_draws=args.draws,
+        region_concentration=args.region_concentration,
+        size_concentration=args.size_concentration,
+        seed=args.seed,
+        workers=args.workers
+    )
+
+    record = {
+        'n_draws': simulation['n_draws'],
+        'total_shipments': args.total_shipments,
+        'mean_total_cost': simulation['mean_total_cost'],
+        'mean_average_cost': simulation['mean_average_cost'],
+        'rate_table_version': simulation['rate_table_version'],
+        'total_cost': {f"p{p}": to_builtin(value) for p, value in simulation['total_cost'].items()},
+        'region_cost': [
+            {
+                'region': region,
+                **{f"p{p}": to_builtin(values[i]) for p, values in simulation['region_cost'].items()}
+            }
+            for i, region in enumerate(simulation['regions'])
+        ]
+    }
+
+    with contextlib.ExitStack() as stack:
+        if args.output == '-':
+            output_stream = sys.stdout
+        else:
+            output_stream = stack.enter_context(open(args.output, 'w', encoding='utf-8'))
+        json.dump(record, output_stream, ensure_ascii=False, indent=2)
+        output_stream.write('\n')
+    return 0
+
+
+def _parse_drift_option(values):
+    region_drift = {}
+    for value in values:
+        region, sep, rate = value.partition('=')
+        if not sep:
+            raise ScenarioError(f"--drift は 地域名=変化率 の形式で指定してください: {value}")
+        try:
+            region_drift[region] = float(rate)
+        except ValueError:
+            raise ScenarioError(f"変化率が数値ではありません: {value}") from None
+    return region_drift
+
+
+def _command_forecast(args):
+    rate_table, population_data = _load_tables(args)
+    size_distribution = _parse_size_option(args.size, rate_table)
+    seasonality = None
+    if args.seasonality:
+        try:
+            seasonality = [float(value) for value in args.seasonality.split(',')]
+        except ValueError:
+            raise ScenarioError(f"季節係数が数値ではありません: {args.seasonality}") from None
+
+    forecast = calculate_forecast(
+        args.base_shipments, population_data, rate_table, size_distribution,
+        periods=args.periods,
+        growth_rate=args.growth,
+        seasonality=seasonality,
+        start=args.start,
+        region_drift=_parse_drift_option(args.drift)
+    )
+
+    with contextlib.ExitStack() as stack:
+        if args.output == '-':
+            output_stream = sys.stdout
+        else:
+            output_stream = stack.enter_context(open(args.output, 'w', encoding='utf-8'))
+        for period, summary in iter_period_summaries(forecast, rate_table):
+            _write_jsonl(output_stream, period, summary)
+
+    total_summary = forecast_total_summary(forecast, rate_table)
+    if args.excel:
+        # xlsxwriter は Excel を出力する場合のみ必要
+        from utils.export import write_forecast_workbook
+        write_forecast_workbook(args.excel, forecast, iter_period_summaries(forecast, rate_table), total_summary)
+
+    print(
+        f"{len(forecast['periods'])}か月の総送料: {total_summary['total_cost']:,}円"
+        f"（{total_summary['total_shipments']:,}個）",
+        file=sys.stderr
+    )
+    return 0
+
+
+def _command_workbooks(args):
+    # xlsxwriter は Excel を出力する場合のみ必要
+    from utils.bulk_export import export_client_workbooks
+
+    rate_table, population_data = _load_tables(args)
+    input_format = args.input_format or _guess_format(args.input if args.input != '-' else None)
+
+    count = 0
+    skipped = []
+
+    def report(line_number, record, error):
+        print(f"スキップ: {error}", file=sys.stderr)
+        skipped.append(line_number)
+
+    with contextlib.ExitStack() as stack:
+        if args.input == '-':
+            input_stream = sys.stdin
+        else:
+            input_stream = stack.enter_context(open(args.input, encoding='utf-8-sig', newline=''))
+        if args.output == '-':
+            output_stream = sys.stdout
+        else:
+            output_stream = stack.enter_context(open(args.output, 'w', encoding='utf-8'))
+
+        records = _read_csv(input_stream) if input_format == 'csv' else _read_jsonl(input_stream)
+        for entry in export_client_workbooks(
+            records, rate_table, population_data,
+            output_dir=args.output_dir, zip_path=args.zip, workers=args.workers, chunk_size=args.chunk_size,
+            on_error=report
+        ):
+            output_stream.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            count += 1
+
+    print(f"{count}件の Excel ファイルを作成しました（{args.zip or args.output_dir}）", file=sys.stderr)
+    if skipped:
+        print(f"形式が正しくない{len(skipped)}件のシナリオはスキップしました", file=sys.stderr)
+    return 0
+
+
+def _command_serve(args):
+    registry = TableRegistry(args.rates, args.population, interval=args.reload_interval).start()
+    print(
+        f"見積もりサービスを起動します: http://{args.host}:{args.port}"
+        f"（送料データのバージョン {registry.current().version}）",
+        file=sys.stderr
+    )
+    serve(
+        registry,
+        host=args.host, port=args.port, workers=args.workers,
+        process_threshold=args.process_threshold, batch_window=args.batch_window_ms / 1000
+    )
+    return 0
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    # ログは標準出力（結果の出力先）を汚さないよう標準エラーに出す
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        stream=sys.stderr,
+        format='%(levelname)s %(name)s: %(message)s'
+    )
+    if args.verbose:
+        instrumentation.add_sink(instrumentation.LoggingSink())
+
+    try:
+        return args.handler(args)
+    except (ScenarioError, ValueError) as e:
+        print(f"入力エラー: {e}", file=sys.stderr)
+        return 2
+    except OSError as e:
+        print(f"ファイルエラー: {e}", file=sys.stderr)
+        return 2
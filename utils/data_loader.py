@@ -1,14 +1,21 @@
 import os
+import logging
+import numpy as np
 import pandas as pd
 
-def load_shipping_rates():
+from utils import table_cache
+from utils.carriers import CarrierRates
+from utils.instrumentation import traced
+from utils.rate_table import RateTable
+from utils.surcharges import SurchargeRuleError, load_surcharge_rules, surcharge_rules_path
+from utils.zones import REGIONS, ZoneTable
+
+logger = logging.getLogger(__name__)
+
+def _shipping_rates_paths():
     """
-    送料データをCSVファイルから読み込む。実データが見つからない場合はサンプルデータを使用する。
-    
-    Returns:
-        DataFrame: 送料データ
+    送料データの候補パスを返す（実データ, サンプルデータ）
     """
-    # 実データとサンプルデータのパス
     real_paths = [
         os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'shipping_rates.csv'),
         os.path.join('data', 'shipping_rates.csv'),
@@ -21,69 +28,323 @@ def load_shipping_rates():
         'shipping_rates_sample.csv'
     ]
     
+    return real_paths, sample_paths
+
+def _population_data_paths():
+    """
+    人口データの候補パスを返す
+    """
+    return [
+        os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'population_data.csv'),
+        os.path.join('data', 'population_data.csv'),
+        'population_data.csv',
+        os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'population_data_sample.csv'),
+        os.path.join('data', 'population_data_sample.csv'),
+        'population_data_sample.csv'
+    ]
+
+def find_shipping_rates_path():
+    """
+    読み込み対象となる送料データのファイルパスを返す（実データを優先）
+    
+    Returns:
+        str: ファイルパス（見つからない場合は None）
+    """
+    real_paths, sample_paths = _shipping_rates_paths()
+    for file_path in real_paths + sample_paths:
+        if os.path.exists(file_path):
+            return file_path
+    return None
+
+def find_population_data_path():
+    """
+    読み込み対象となる人口データのファイルパスを返す
+    
+    Returns:
+        str: ファイルパス（見つからない場合は None）
+    """
+    for file_path in _population_data_paths():
+        if os.path.exists(file_path):
+            return file_path
+    return None
+
+@traced('load.shipping_rates', rows=len)
+def load_shipping_rates(file_path=None):
+    """
+    送料データをCSVファイルから読み込む。実データが見つからない場合はサンプルデータを使用する。
+    
+    Args:
+        file_path (str, optional): 読み込むファイルのパス。省略時は候補パスから探す
+    
+    Returns:
+        DataFrame: 送料データ
+    """
+    # 実データとサンプルデータのパス
+    if file_path is not None:
+        real_paths, sample_paths = [file_path], []
+    else:
+        real_paths, sample_paths = _shipping_rates_paths()
+    
     # 実データの読み込みを試行
     for file_path in real_paths:
         try:
             if os.path.exists(file_path):
                 shipping_rates = pd.read_csv(file_path)
-                print(f"送料データを読み込みました: {file_path}")
+                logger.info("送料データを読み込みました: %s", file_path)
                 return shipping_rates
         except Exception as e:
-            print(f"{file_path}からの読み込みに失敗: {e}")
+            logger.warning("%sからの読み込みに失敗: %s", file_path, e)
     
     # サンプルデータの読み込みを試行
     for file_path in sample_paths:
         try:
             if os.path.exists(file_path):
                 shipping_rates = pd.read_csv(file_path)
-                print(f"サンプル送料データを読み込みました: {file_path}")
+                logger.info("サンプル送料データを読み込みました: %s", file_path)
                 return shipping_rates
         except Exception as e:
-            print(f"{file_path}からの読み込みに失敗: {e}")
+            logger.warning("%sからの読み込みに失敗: %s", file_path, e)
     
-    print("送料データの読み込みに失敗しました。ダミーデータを使用します。")
+    logger.warning("送料データの読み込みに失敗しました。ダミーデータを使用します。")
     # すべてのパスが失敗した場合はダミーデータを返す
     return create_dummy_shipping_rates()
 
-def load_population_data():
+def _with_surcharge_rules(file_path, rate_table):
+    """
+    送料データのCSVと同じディレクトリに規則ファイルがあれば、規則を設定した RateTable を返す
+    """
+    rules_path = surcharge_rules_path(file_path)
+    if not os.path.exists(rules_path):
+        return rate_table
+    return rate_table.with_surcharges(load_surcharge_rules(rules_path, rate_table))
+
+@traced('load.shipping_rates', rows=len)
+def read_rate_table(file_path):
+    """
+    送料データのCSVファイルから RateTable を作成する（バイナリキャッシュがあれば CSV を解析しない）
+    
+    同じディレクトリに割増・手数料の規則ファイル（<CSVのファイル名>.surcharges.json）があれば、
+    読み込んで RateTable に設定する。
+    
+    Raises:
+        ValueError: 送料データまたは規則ファイルの形式が正しくない場合
+    """
+    cached = table_cache.load(file_path, 'rate_table')
+    if cached is not None:
+        fields, arrays = cached
+        return _with_surcharge_rules(file_path, RateTable(
+            fields['size_codes'], fields['size_names'], fields['weights'], fields['regions'], arrays['rates']
+        ))
+    
+    signature = table_cache.source_signature(file_path)
+    rate_table = RateTable.from_dataframe(pd.read_csv(file_path))
+    logger.info("送料データを読み込みました: %s", file_path)
+    table_cache.save(file_path, 'rate_table', signature, {
+        'size_codes': list(rate_table.size_codes),
+        'size_names': list(rate_table.size_names),
+        'weights': list(rate_table.weights),
+        'regions': list(rate_table.regions)
+    }, {'rates': rate_table.rates})
+    return _with_surcharge_rules(file_path, rate_table)
+
+def load_rate_table(file_path=None):
+    """
+    送料データを読み込み、計算用の RateTable に変換する
+    
+    2回目以降の読み込みでは、CSVと同じディレクトリの .table_cache/ に書き出したバイナリキャッシュを
+    メモリマップで読み込む（CSVが更新された場合は CSV から読み込み直す）。
+    
+    Args:
+        file_path (str, optional): 読み込むファイルのパス。省略時は候補パスから探す
+    
+    Returns:
+        RateTable: 前処理済みの送料テーブル
+    
+    Raises:
+        SurchargeRuleError: 規則ファイルがあり、その形式が正しくない場合
+            （割増・手数料を含まない送料で見積もらないよう、ダミーデータに切り替えない）
+    """
+    source_path = file_path if file_path is not None else find_shipping_rates_path()
+    if source_path is not None and os.path.exists(source_path):
+        try:
+            return read_rate_table(source_path)
+        except SurchargeRuleError:
+            raise
+        except Exception as e:
+            logger.warning("%sからの読み込みに失敗: %s", source_path, e)
+    
+    # 読み込めない場合は従来どおり候補パス・ダミーデータの順に試す
+    return RateTable.from_dataframe(load_shipping_rates(file_path))
+
+@traced('load.population_data', rows=len)
+def read_population_data(file_path):
+    """
+    人口データのCSVファイルを読み込む（バイナリキャッシュがあれば CSV を解析しない）
+    
+    Raises:
+        OSError, ValueError: ファイルを読み込めない場合や形式が正しくない場合
+    """
+    cached = table_cache.load(file_path, 'population_data')
+    if cached is not None:
+        return table_cache.arrays_to_frame(*cached)
+    
+    signature = table_cache.source_signature(file_path)
+    population_data = pd.read_csv(file_path)
+    missing_columns = [col for col in ('region', 'percentage') if col not in population_data.columns]
+    if missing_columns:
+        raise ValueError(f"以下の必須カラムが人口データに含まれていません: {', '.join(missing_columns)}")
+    # 地域名をインデックスに設定し、インデックス名も明示的に設定
+    population_data = population_data.set_index('region')
+    population_data.index.name = 'region'  # インデックス名を明示的に設定
+    logger.info("人口データを読み込みました: %s", file_path)
+    
+    cache_data = table_cache.frame_to_arrays(population_data)
+    if cache_data is not None:
+        table_cache.save(file_path, 'population_data', signature, *cache_data)
+    return population_data
+
+def load_population_data(file_path=None):
     """
     地域別人口データをCSVファイルから読み込む
     
+    Args:
+        file_path (str, optional): 読み込むファイルのパス。省略時は候補パスから探す
+    
     Returns:
         DataFrame: 地域別人口データ（indexを地域名に設定）
     """
     # 人口データのパス
-    potential_paths = [
-        os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'population_data.csv'),
-        os.path.join('data', 'population_data.csv'),
-        'population_data.csv',
-        os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'population_data_sample.csv'),
-        os.path.join('data', 'population_data_sample.csv'),
-        'population_data_sample.csv'
-    ]
+    if file_path is not None:
+        potential_paths = [file_path]
+    else:
+        potential_paths = _population_data_paths()
     
     # データの読み込みを試行
     for file_path in potential_paths:
         try:
             if os.path.exists(file_path):
-                population_data = pd.read_csv(file_path)
-                # 地域名をインデックスに設定し、インデックス名も明示的に設定
-                population_data = population_data.set_index('region')
-                population_data.index.name = 'region'  # インデックス名を明示的に設定
-                print(f"人口データを読み込みました: {file_path}")
-                return population_data
+                return read_population_data(file_path)
         except Exception as e:
-            print(f"{file_path}からの読み込みに失敗: {e}")
+            logger.warning("%sからの読み込みに失敗: %s", file_path, e)
     
-    print("人口データの読み込みに失敗しました。ダミーデータを使用します。")
+    logger.warning("人口データの読み込みに失敗しました。ダミーデータを使用します。")
     # すべてのパスが失敗した場合はダミーデータを返す
     return create_dummy_population_data()
 
+def _zone_data_paths():
+    """
+    ゾーン（都道府県）データの候補パスを返す
+    """
+    return [
+        os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'prefecture_data.csv'),
+        os.path.join('data', 'prefecture_data.csv'),
+        'prefecture_data.csv'
+    ]
+
+@traced('load.zone_table', rows=len)
+def load_zone_table(file_path=None, regions=REGIONS):
+    """
+    ゾーン（都道府県・郵便番号ゾーンなど）と地域の対応表をCSVファイルから読み込む
+    
+    CSVのカラム: zone（ゾーン名）, region（送料地域）, population（人口）
+    
+    Args:
+        file_path (str, optional): 読み込むファイルのパス。省略時は都道府県データを候補パスから探す
+        regions (list, optional): 地域名の並び
+    
+    Returns:
+        ZoneTable: ゾーンと地域の対応表（ファイルが見つからない場合は None）
+    """
+    potential_paths = [file_path] if file_path is not None else _zone_data_paths()
+    
+    for file_path in potential_paths:
+        if os.path.exists(file_path):
+            params = {'regions': list(regions)}
+            cached = table_cache.load(file_path, 'zone_table', params)
+            if cached is not None:
+                _, arrays = cached
+                return ZoneTable(arrays['zone_names'].tolist(), regions, arrays['zone_regions'], arrays['population'])
+            
+            signature = table_cache.source_signature(file_path)
+            zone_data = pd.read_csv(
+                file_path,
+                dtype={'zone': str, 'region': 'category', 'population': 'int64'}
+            )
+            logger.info("ゾーンデータを読み込みました: %s", file_path)
+            zone_table = ZoneTable.from_dataframe(zone_data, regions=regions)
+            table_cache.save(file_path, 'zone_table', signature, {}, {
+                'zone_names': np.array(zone_table.zone_names, dtype=str),
+                'zone_regions': zone_table.zone_regions,
+                'population': zone_table.population
+            }, params)
+            return zone_table
+    
+    logger.warning("ゾーンデータが見つかりません")
+    return None
+
+def _carrier_rates_dirs():
+    """
+    運送会社別の送料データを置くディレクトリの候補を返す
+    """
+    return [
+        os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'carriers'),
+        os.path.join('data', 'carriers')
+    ]
+
+def find_carrier_rates_paths(directory=None):
+    """
+    運送会社別の送料データのファイルパスを返す（ファイル名から拡張子を除いたものを運送会社名とする）
+    
+    Args:
+        directory (str, optional): 探すディレクトリ。省略時は候補ディレクトリから探す
+    
+    Returns:
+        dict: 運送会社名 → ファイルパス（運送会社名の順。見つからない場合は空）
+    """
+    potential_dirs = [directory] if directory is not None else _carrier_rates_dirs()
+    
+    for directory in potential_dirs:
+        if os.path.isdir(directory):
+            file_names = sorted(name for name in os.listdir(directory) if name.lower().endswith('.csv'))
+            return {os.path.splitext(name)[0]: os.path.join(directory, name) for name in file_names}
+    return {}
+
+@traced('load.carrier_rates', rows=len)
+def load_carrier_rates(file_paths=None, regions=None):
+    """
+    運送会社別の送料データを読み込み、1つの CarrierRates にまとめる
+    
+    各ファイルは送料データ（shipping_rates.csv）と同じ形式とする。
+    
+    Args:
+        file_paths (dict, optional): 運送会社名 → ファイルパス。省略時は data/carriers/*.csv を読み込む
+        regions (list, optional): 地域名の並び（省略時は最初の送料データの地域）
+    
+    Returns:
+        CarrierRates: 運送会社ごとの送料テーブル（ファイルがない場合は None）
+    
+    Raises:
+        ValueError: 送料データの形式が正しくない、または地域が不足している場合
+    """
+    if file_paths is None:
+        file_paths = find_carrier_rates_paths()
+    if not file_paths:
+        return None
+    
+    rate_tables = {}
+    for carrier, file_path in file_paths.items():
+        try:
+            rate_tables[carrier] = read_rate_table(file_path)
+        except ValueError as e:
+            raise ValueError(f"{carrier}（{file_path}）: {e}") from None
+    
+    return CarrierRates(rate_tables, regions=regions)
+
 def create_dummy_shipping_rates():
     """
     ダミーの送料データを作成（データ読み込みに失敗した場合のフォールバック）
     """
-    regions = ['北海道', '北東北', '南東北', '関東', '信越', '北陸', '中部', '関西', '中国', '四国', '九州', '沖縄']
+    regions = list(REGIONS)
     sizes = [
         {'size_code': '60', 'size_name': '60cm以内', 'weight': '2kg以内'},
         {'size_code': '80', 'size_name': '80cm以内', 'weight': '5kg以内'},
@@ -121,7 +382,7 @@ def create_dummy_population_data():
     """
     ダミーの人口分布データを作成（データ読み込みに失敗した場合のフォールバック）
     """
-    regions = ['北海道', '北東北', '南東北', '関東', '信越', '北陸', '中部', '関西', '中国', '四国', '九州', '沖縄']
+    regions = list(REGIONS)
     
     # 適当な人口と分布率を設定
     data = {
@@ -0,0 +1,263 @@
+import hashlib
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+import xlsxwriter
+
+from utils.instrumentation import span
+
+# サイズ別シートの列（ShippingResult.frame のカラム → 見出し）
+SIZE_SHEET_COLUMNS = [
+    ('prefectures', '都道府県'),
+    ('size_shipments', '出荷個数'),
+    ('rate', '送料単価(円)'),
+    ('size_cost', '送料合計(円)')
+]
+
+# pandas の to_excel と同じ見出しの書式
+HEADER_FORMAT = {'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'}
+
+
+def result_fingerprint(result, size_results, summary):
+    """
+    計算結果の内容からハッシュ値を作成する（エクスポートのキャッシュキーに使用）
+
+    Args:
+        result (DataFrame): 全体結果データフレーム
+        size_results (ShippingResult): サイズ別の計算結果
+        summary (dict): 集計結果
+
+    Returns:
+        str: ハッシュ値
+    """
+    digest = hashlib.sha1()
+    digest.update(pd.util.hash_pandas_object(result, index=True).to_numpy().tobytes())
+    digest.update(repr(size_results.size_codes).encode('utf-8'))
+    for array in (size_results.proportions, size_results.rates, size_results.shipments, size_results.costs):
+        digest.update(np.ascontiguousarray(array).tobytes())
+    digest.update(repr(sorted((k, v) for k, v in summary.items() if k != 'size_info')).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _write_rows(worksheet, header, rows, header_format):
+    """
+    見出しとデータ行を先頭から順に書き込む（constant_memory モードでは行順の書き込みが必要）
+
+    Returns:
+        int: 書き込んだデータ行数
+    """
+    worksheet.write_row(0, 0, header, header_format)
+    row_count = 0
+    for row_count, row in enumerate(rows, start=1):
+        worksheet.write_row(row_count, 0, row)
+    return row_count
+
+
+def _size_info_rows(summary):
+    """
+    サイズ別情報シートの行を作成する（画面の「サイズ別情報」と同じ表記）
+    """
+    for info in summary.get('size_info', []):
+        yield [
+            f"{info['size_name']} ({info['weight']})",
+            f"{info['proportion']*100:.1f}%",
+            f"{info['shipments']:,}個",
+            f"{info['cost']:,.0f}円",
+            f"{info['average_cost']:.1f}円"
+        ]
+
+
+def _carrier_info_rows(summary):
+    """
+    運送会社比較シートの行を作成する（画面の「運送会社別の比較」と同じ表記）
+    """
+    for info in summary.get('carrier_info', []):
+        yield [
+            info['carrier'],
+            f"{info['cost']:,.0f}円" if info['complete'] else "取り扱いのないサイズあり",
+            f"{info['average_cost']:.1f}円" if info['complete'] else "-",
+            f"{info.get('cheapest_shipments', 0):,}個"
+        ]
+    if 'cheapest_cost' in summary:
+        yield ['最安の運送会社を選んだ場合', f"{summary['cheapest_cost']:,.0f}円", "", ""]
+
+
+def _surcharge_rows(summary):
+    """
+    サマリーシートの割増・手数料の行を作成する（規則がない場合は作成しない）
+    """
+    for info in summary.get('surcharge_info', []):
+        yield [info['name'], f"{info['cost']:,.0f}円"]
+    if 'surcharge_info' in summary:
+        yield ['割増・手数料の合計', f"{summary['surcharge_total']:,.0f}円"]
+        yield ['請求額（送料＋割増・手数料）', f"{summary['invoice_total']:,.0f}円"]
+
+
+def _size_sheet_rows(size_results, i):
+    """
+    サイズ別シートの行を作成する（データフレームを作らずに配列から直接作成する）
+    """
+    values = [list(size_results.regions)]
+    if size_results.labels is not None:
+        values.append(size_results.labels.tolist())
+    values += [size_results.shipments[i].tolist(), size_results.rates[i].tolist(), size_results.costs[i].tolist()]
+    for row in zip(*values):
+        yield [value.item() if hasattr(value, 'item') else value for value in row]
+
+
+def write_workbook(output, size_results, summary):
+    """
+    シミュレーション結果を Excel ワークブックとして書き込む
+
+    xlsxwriter の constant_memory モードで1行ずつ書き込むため、
+    サイズ数や地域数が増えてもメモリ使用量はほぼ一定になる。
+
+    Args:
+        output (str or file): 出力先のファイルパスまたはファイルオブジェクト
+        size_results (ShippingResult): サイズ別の計算結果
+        summary (dict): 集計結果
+    """
+    with span('export', sheets=len(size_results) + 2 + ('carrier_info' in summary)) as current:
+        workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
+        header_format = workbook.add_format(HEADER_FORMAT)
+
+        # サマリー
+        worksheet = workbook.add_worksheet('サマリー')
+        row_count = _write_rows(worksheet, ['項目', '値'], [
+            ['総出荷個数', f"{summary['total_shipments']:,}個"],
+            ['総送料', f"{summary['total_cost']:,.0f}円"],
+            ['1個あたりの平均送料', f"{summary['average_cost']:.1f}円"],
+            *_surcharge_rows(summary),
+            ['送料データのバージョン', summary.get('rate_table_version', '')]
+        ], header_format)
+
+        # サイズ別情報
+        worksheet = workbook.add_worksheet('サイズ別情報')
+        row_count += _write_rows(worksheet, ['サイズ', '割合', '出荷個数', '送料合計', '平均単価'], _size_info_rows(summary), header_format)
+
+        # 運送会社別の比較（運送会社を比較した場合のみ）
+        if 'carrier_info' in summary:
+            worksheet = workbook.add_worksheet('運送会社比較')
+            row_count += _write_rows(worksheet, ['運送会社', '総送料', '1個あたりの平均送料', '最安となる出荷個数'], _carrier_info_rows(summary), header_format)
+
+        # サイズ別の詳細
+        for i, size_name in enumerate(size_results.size_names):
+            header = ['地域'] + [
+                label for col, label in SIZE_SHEET_COLUMNS
+                if col != 'prefectures' or size_results.labels is not None
+            ]
+
+            sheet_name = f"{size_name[:10]}" if i < 30 else f"サイズ{i+1}"
+            worksheet = workbook.add_worksheet(sheet_name)
+            row_count += _write_rows(worksheet, header, _size_sheet_rows(size_results, i), header_format)
+
+        workbook.close()
+        current.rows = row_count
+
+
+def export_workbook(size_results, summary):
+    """
+    シミュレーション結果を Excel ファイル（xlsx）のバイト列として作成する
+
+    Args:
+        size_results (ShippingResult): サイズ別の計算結果
+        summary (dict): 集計結果
+
+    Returns:
+        bytes: xlsx ファイルの内容
+    """
+    buffer = BytesIO()
+    write_workbook(buffer, size_results, summary)
+    return buffer.getvalue()
+
+
+def _forecast_period_rows(period_summaries, with_carriers, with_surcharges):
+    """
+    期間別シートの行を作成する（期間ごとの集計結果を1件ずつ読みながら書き込む）
+    """
+    for period, summary in period_summaries:
+        row = [
+            period,
+            summary['total_shipments'].item(),
+            summary['total_cost'].item(),
+            round(float(summary['average_cost']), 1)
+        ]
+        # サイズの割合は全期間で同じため、サイズの並びは全期間の合計（見出し）と一致する
+        for info in summary['size_info']:
+            row.extend([info['shipments'].item(), info['cost'].item()])
+        if with_carriers:
+            row.extend(info['cost'].item() for info in summary['carrier_info'])
+            row.append(summary['cheapest_cost'].item())
+        if with_surcharges:
+            row.extend(info['cost'].item() for info in summary['surcharge_info'])
+            row.extend([summary['surcharge_total'].item(), summary['invoice_total'].item()])
+        yield row
+
+
+def write_forecast_workbook(output, forecast, period_summaries, total_summary):
+    """
+    期間別の送料予測を Excel ワークブックとして書き込む
+
+    Args:
+        output (str or file): 出力先のファイルパスまたはファイルオブジェクト
+        forecast (dict): calculate_forecast の戻り値
+        period_summaries (iterable): iter_period_summaries が返す (期間の表示名, 集計結果)
+        total_summary (dict): forecast_total_summary の戻り値
+    """
+    size_info = total_summary['size_info']
+    carriers = forecast.get('carriers', [])
+
+    with span('export', sheets=4) as current:
+        workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
+        header_format = workbook.add_format(HEADER_FORMAT)
+
+        # サマリー（全期間の合計）
+        worksheet = workbook.add_worksheet('サマリー')
+        row_count = _write_rows(worksheet, ['項目', '値'], [
+            ['期間', f"{forecast['periods'][0]}〜{forecast['periods'][-1]}（{len(forecast['periods'])}か月）"],
+            ['総出荷個数', f"{total_summary['total_shipments']:,}個"],
+            ['総送料', f"{total_summary['total_cost']:,.0f}円"],
+            ['1個あたりの平均送料', f"{total_summary['average_cost']:.1f}円"],
+            *_surcharge_rows(total_summary),
+            ['送料データのバージョン', total_summary.get('rate_table_version', '')]
+        ], header_format)
+
+        # サイズ別情報（全期間の合計）
+        worksheet = workbook.add_worksheet('サイズ別情報')
+        row_count += _write_rows(worksheet, ['サイズ', '割合', '出荷個数', '送料合計', '平均単価'], _size_info_rows(total_summary), header_format)
+
+        # 期間別（サイズ別の出荷個数・送料、運送会社を比較した場合は運送会社別の送料）
+        header = ['期間', '出荷個数', '送料合計(円)', '平均送料(円)']
+        for info in size_info:
+            header += [f"{info['size_name']} 出荷個数", f"{info['size_name']} 送料(円)"]
+        if carriers:
+            header += [f"{carrier} 送料(円)" for carrier in carriers] + ['最安の運送会社を選んだ場合(円)']
+        surcharge_info = total_summary.get('surcharge_info', [])
+        if surcharge_info:
+            header += [f"{info['name']}(円)" for info in surcharge_info] + ['割増・手数料の合計(円)', '請求額(円)']
+        worksheet = workbook.add_worksheet('期間別')
+        row_count += _write_rows(worksheet, header, _forecast_period_rows(
+            period_summaries, bool(carriers), bool(surcharge_info)
+        ), header_format)
+
+        # 地域別送料（期間 × 地域）
+        worksheet = workbook.add_worksheet('地域別送料')
+        row_count += _write_rows(worksheet, ['期間'] + list(forecast['regions']), (
+            [period] + forecast['region_cost'][t].tolist() for t, period in enumerate(forecast['periods'])
+        ), header_format)
+
+        workbook.close()
+        current.rows = row_count
+
+
+def export_forecast_workbook(forecast, period_summaries, total_summary):
+    """
+    期間別の送料予測を Excel ファイル（xlsx）のバイト列として作成する
+
+    Returns:
+        bytes: xlsx ファイルの内容
+    """
+    buffer = BytesIO()
+    write_forecast_workbook(buffer, forecast, period_summaries, total_summary)
+    return buffer.getvalue()
@@ -0,0 +1,187 @@
+"""
+複数期間（月次）の送料予測
+
+契約期間（12〜36か月など）の月ごとの出荷数を、基準の出荷数・月次の成長率・季節係数から求め、
+期間 × 地域 × サイズの出荷数と送料を calculate_batch で一括計算する。期間ごとの計算結果は
+calculate_quote を月ごとに実行した場合と一致する。
+
+    月ごとの出荷数 = 基準の出荷数 × (1 + 成長率) ^ 経過月数 × 季節係数[暦月]
+    地域別出荷比率 = 人口比 × (1 + 地域の変化率) ^ 経過月数 を合計1に正規化したもの
+"""
+import numpy as np
+import pandas as pd
+
+from utils.calculator import calculate_batch, iter_batch_summaries
+from utils.instrumentation import traced
+
+# 予測できる期間の上限（月数）
+MAX_PERIODS = 120
+# 1か月の出荷数の上限（送料の合計が int64 の範囲に収まるようにする）
+MAX_MONTHLY_SHIPMENTS = 10 ** 12
+
+
+def monthly_volumes(base_shipments, periods, growth_rate=0.0, seasonality=None, months=None):
+    """
+    月ごとの出荷数を求める
+
+    Args:
+        base_shipments (int): 1か月目の（季節係数を掛ける前の）出荷数
+        periods (int): 期間の月数
+        growth_rate (float): 月次の成長率（例: 0.02 で毎月2%増加）
+        seasonality (list, optional): 1月〜12月の季節係数（1.0 が平常月）。省略時はすべて1.0
+        months (ndarray, optional): 各期間の暦月 (1〜12)。省略時は1か月目を1月とする
+
+    Returns:
+        ndarray: 月ごとの出荷数 (期間数) の int64 配列
+    """
+    if not np.isfinite(growth_rate):
+        raise ValueError("成長率に数値を指定してください")
+    if growth_rate <= -1:
+        raise ValueError("成長率は -100% より大きい値を指定してください")
+    if months is None:
+        months = np.arange(periods) % 12 + 1
+    factors = np.ones(12) if seasonality is None else np.asarray(seasonality, dtype=float)
+    if factors.shape != (12,):
+        raise ValueError("季節係数は1月〜12月の12個を指定してください")
+    if not np.isfinite(factors).all():
+        raise ValueError("季節係数に空欄または数値以外の値があります")
+    if (factors < 0).any():
+        raise ValueError("季節係数に負の値があります")
+
+    growth = (1 + growth_rate) ** np.arange(periods)
+    volumes = np.rint(base_shipments * growth * factors[np.asarray(months) - 1])
+    # 成長率と期間によっては int64 の範囲を超えるため、変換する前に確認する
+    if not (np.isfinite(volumes).all() and (volumes <= MAX_MONTHLY_SHIPMENTS).all()):
+        raise ValueError(
+            f"月ごとの出荷数が上限（{MAX_MONTHLY_SHIPMENTS:,}個）を超えます。成長率または期間を小さくしてください"
+        )
+    return volumes.astype(np.int64)
+
+
+def region_shares(population_data, periods, region_drift=None):
+    """
+    月ごとの地域別出荷比率を求める
+
+    Args:
+        population_data (DataFrame): 地域別人口データ（percentage を1か月目の比率に使う）
+        periods (int): 期間の月数
+        region_drift (dict, optional): 地域名 → 月次の変化率（例: {'関東': 0.01} で関東の比重が毎月1%増加）
+
+    Returns:
+        ndarray: 地域別出荷比率 (期間数 × 地域数)
+    """
+    percentages = population_data['percentage'].to_numpy(dtype=float)
+    rates = np.zeros(len(percentages))
+    for region, rate in (region_drift or {}).items():
+        if region not in population_data.index:
+            raise ValueError(f"地域 '{region}' は人口データに存在しません")
+        if not np.isfinite(rate):
+            raise ValueError(f"地域 '{region}' の変化率に数値を指定してください")
+        if rate <= -1:
+            raise ValueError(f"地域 '{region}' の変化率は -100% より大きい値を指定してください")
+        rates[population_data.index.get_loc(region)] = rate
+
+    weights = percentages * (1 + rates) ** np.arange(periods)[:, np.newaxis]
+    if not np.isfinite(weights).all():
+        raise ValueError("地域の変化率が大きすぎます。変化率または期間を小さくしてください")
+    totals = weights.sum(axis=1, keepdims=True)
+    return np.divide(weights, totals, out=np.zeros_like(weights), where=totals > 0)
+
+
+def _period_calendar(periods, start):
+    """
+    期間の表示名と暦月を返す（start を省略した場合は「1か月目」… とし、1か月目を1月とする）
+    """
+    if start is None:
+        return [f"{t + 1}か月目" for t in range(periods)], np.arange(periods) % 12 + 1
+    try:
+        first = pd.Period(start, freq='M')
+    except ValueError:
+        raise ValueError(f"開始年月は YYYY-MM の形式で指定してください: {start}") from None
+    period_index = pd.period_range(start=first, periods=periods, freq='M')
+    return list(period_index.strftime('%Y-%m')), period_index.month.to_numpy()
+
+
+@traced('forecast', rows=lambda forecast: len(forecast['periods']))
+def calculate_forecast(base_shipments, population_data, shipping_rates, size_distribution, periods=12,
+                       growth_rate=0.0, seasonality=None, start=None, region_drift=None, carrier_rates=None):
+    """
+    月ごとの出荷数と送料を予測する
+
+    Args:
+        base_shipments (int): 1か月目の（季節係数を掛ける前の）出荷数
+        population_data (DataFrame): 地域別人口データ（カスタム比率適用後）
+        shipping_rates (RateTable or DataFrame): 送料テーブル
+        size_distribution (dict): サイズコードと割合の辞書
+        periods (int): 期間の月数
+        growth_rate (float): 月次の成長率
+        seasonality (list, optional): 1月〜12月の季節係数
+        start (str, optional): 1か月目の年月（例: '2026-04'）。季節係数の暦月の対応に使う
+        region_drift (dict, optional): 地域名 → 月次の変化率
+        carrier_rates (CarrierRates, optional): 比較する運送会社ごとの送料テーブル
+
+    Returns:
+        dict: calculate_batch の戻り値（期間を1シナリオとする）に以下を加えたもの
+            - 'periods': 期間の表示名
+            - 'months': 各期間の暦月 (期間数)
+            - 'region_percentages': 地域別出荷比率 (期間数 × 地域数)
+    """
+    if not 1 <= periods <= MAX_PERIODS:
+        raise ValueError(f"期間は1〜{MAX_PERIODS}か月で指定してください")
+
+    labels, months = _period_calendar(periods, start)
+    volumes = monthly_volumes(base_shipments, periods, growth_rate, seasonality, months)
+    percentages = region_shares(population_data, periods, region_drift)
+
+    forecast = calculate_batch(
+        {
+            'total_shipments': volumes,
+            'size_codes': list(size_distribution.keys()),
+            'size_proportions': np.array(list(size_distribution.values()), dtype=float),
+            'region_percentages': percentages
+        },
+        shipping_rates,
+        population_data,
+        carrier_rates=carrier_rates
+    )
+    forecast.update({
+        'periods': labels,
+        'months': months,
+        'region_percentages': percentages
+    })
+    return forecast
+
+
+def iter_period_summaries(forecast, shipping_rates):
+    """
+    期間ごとの集計結果（calculate_summary と同じ形式）を順に返す
+
+    Yields:
+        tuple: (期間の表示名, 集計結果)
+    """
+    yield from zip(forecast['periods'], iter_batch_summaries(forecast, shipping_rates))
+
+
+def forecast_total_summary(forecast, shipping_rates):
+    """
+    全期間の合計の集計結果（calculate_summary と同じ形式）を返す
+    """
+    total = {
+        key: forecast[key].sum(axis=0, keepdims=True)
+        for key in ('total_shipments', 'total_cost', 'region_shipments', 'region_cost', 'size_shipments', 'size_cost')
+    }
+    total_shipments = total['total_shipments'][0]
+    total['average_cost'] = np.array([total['total_cost'][0] / total_shipments if total_shipments > 0 else 0])
+    total['size_proportions'] = forecast['size_proportions'][:1]
+    total['regions'] = forecast['regions']
+    total['size_codes'] = forecast['size_codes']
+
+    if 'carriers' in forecast:
+        total['carriers'] = forecast['carriers']
+        total['carrier_cost'] = forecast['carrier_cost'].sum(axis=0, keepdims=True)
+        total['carrier_complete'] = forecast['carrier_complete'].all(axis=0, keepdims=True)
+        total['cheapest_cost'] = forecast['cheapest_cost'].sum(axis=0, keepdims=True)
+    if 'surcharge_cost' in forecast:
+        total['surcharge_cost'] = forecast['surcharge_cost'].sum(axis=0, keepdims=True)
+
+    return next(iter_batch_summaries(total, shipping_rates))
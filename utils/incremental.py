@@ -0,0 +1,296 @@
+"""
+入力の一部だけが変わったときの差分計算
+
+送料は地域 × サイズの出荷数に対して線形なので、前回の計算状態を保持しておき、
+出荷数が変わった地域の列だけを計算し直して、地域別・サイズ別・全体の合計に差分を加える。
+
+- 地域別出荷比率が変わった場合: 地域別出荷数の配分（最大剰余方式のため全地域で1回）をやり直し、
+  出荷数が変わった地域だけサイズへの配分と送料を計算し直す
+- サイズ別の割合が変わった場合: すべての地域でサイズへの配分をやり直す（合計は差分で更新）
+- 総出荷個数・サイズの種類・地域が変わった場合: すべて計算し直す
+
+計算結果は calculate_quote で毎回すべて計算した場合と常に一致する。check=True を指定すると、
+更新のたびにすべて計算し直した結果と比較し、一致しない場合は例外を送出する。
+"""
+import logging
+
+import numpy as np
+
+from utils.calculator import apportion, build_rate_matrix, calculate_quote
+from utils.instrumentation import span
+from utils.rate_table import as_rate_table
+from utils.shipping_result import ShippingResult
+from utils.surcharges import surcharge_summary
+
+logger = logging.getLogger(__name__)
+
+
+class IncrementalCalculator:
+    """
+    前回の計算状態を保持し、変更のあった部分だけを計算し直す見積もり計算
+
+    Args:
+        shipping_rates (RateTable or DataFrame): 送料テーブル
+        carrier_rates (CarrierRates, optional): 比較する運送会社ごとの送料テーブル
+        check (bool): 更新のたびにすべて計算し直した結果と比較する（検証用、遅くなる）
+
+    Attributes:
+        last_update (tuple): 直前の更新の種類（'full', 'incremental', 'unchanged'）と計算し直した地域数
+    """
+
+    def __init__(self, shipping_rates, carrier_rates=None, check=False):
+        self.rate_table = as_rate_table(shipping_rates)
+        self.carrier_rates = carrier_rates
+        self.check = check
+        self.last_update = None
+        self._state = None
+        self._quote = None
+
+    def matches(self, shipping_rates, carrier_rates=None):
+        """
+        同じ送料テーブル（と運送会社の送料テーブル）で作成した計算器かを返す
+        """
+        carrier_fingerprint = carrier_rates.fingerprint if carrier_rates is not None else None
+        own_carrier_fingerprint = self.carrier_rates.fingerprint if self.carrier_rates is not None else None
+        return (
+            as_rate_table(shipping_rates).fingerprint == self.rate_table.fingerprint
+            and carrier_fingerprint == own_carrier_fingerprint
+        )
+
+    def update(self, total_shipments, population_data, size_distribution):
+        """
+        入力を更新して見積もりを計算する
+
+        Args:
+            total_shipments (int): 全国総出荷個数
+            population_data (DataFrame): 地域別人口データ（カスタム比率適用後）
+            size_distribution (dict): サイズコードと割合の辞書
+
+        Returns:
+            tuple: (全体結果データフレーム, サイズ別の計算結果 ShippingResult, 集計結果)
+                calculate_quote と同じ形式。返した結果は次の更新で置き換わるため、変更してはならない
+        """
+        total_shipments = int(total_shipments)
+        regions = tuple(population_data.index)
+        percentages = population_data['percentage'].to_numpy(dtype=float)
+        size_codes = tuple(str(code) for code in size_distribution.keys())
+        proportions = np.array(list(size_distribution.values()), dtype=float)
+
+        state = self._state
+        if (state is None or state['total_shipments'] != total_shipments
+                or state['regions'] != regions or state['size_codes'] != size_codes
+                or not population_data.drop(columns='percentage').equals(state['population_data'].drop(columns='percentage'))):
+            with span('incremental', mode='full') as current:
+                self._full(total_shipments, population_data, size_codes, proportions)
+                current.rows = len(regions)
+            self.last_update = ('full', len(regions))
+        else:
+            region_shipments = state['region_shipments']
+            if not np.array_equal(percentages, state['percentages']):
+                region_shipments = apportion(total_shipments, percentages)
+            if np.array_equal(proportions, state['proportions']):
+                changed = np.flatnonzero(region_shipments != state['region_shipments'])
+            else:
+                changed = np.arange(len(regions))
+
+            if len(changed) == 0 and np.array_equal(percentages, state['percentages']):
+                self.last_update = ('unchanged', 0)
+                return self._quote
+
+            with span('incremental', mode='incremental') as current:
+                self._apply(population_data, percentages, proportions, region_shipments, changed)
+                current.rows = len(changed)
+            self.last_update = ('incremental', len(changed))
+
+        self._quote = self._build_quote()
+
+        if self.check:
+            self._verify(total_shipments, population_data, size_distribution)
+
+        return self._quote
+
+    def _full(self, total_shipments, population_data, size_codes, proportions):
+        """
+        すべての地域・サイズを計算し直し、計算状態を作り直す
+        """
+        regions = list(population_data.index)
+        rate_matrix, row_numbers = build_rate_matrix(self.rate_table, size_codes, regions)
+        percentages = population_data['percentage'].to_numpy(dtype=float)
+
+        region_shipments = apportion(total_shipments, percentages)
+        size_shipments = apportion(region_shipments, proportions).T
+        size_costs = size_shipments * rate_matrix
+
+        state = {
+            'total_shipments': total_shipments,
+            'regions': tuple(regions),
+            'size_codes': size_codes,
+            'population_data': population_data.copy(),
+            'percentages': percentages,
+            'proportions': proportions,
+            'rate_matrix': rate_matrix,
+            'row_numbers': row_numbers,
+            'region_shipments': region_shipments,
+            'size_shipments': size_shipments,
+            'size_costs': size_costs,
+            'region_cost': size_costs.sum(axis=0),
+            'size_shipment_totals': size_shipments.sum(axis=1),
+            'size_cost_totals': size_costs.sum(axis=1),
+            'total_cost': int(size_costs.sum())
+        }
+
+        if self.carrier_rates is not None:
+            carrier_tensor, carrier_available = self.carrier_rates.select(size_codes, regions)
+            cheapest_rates, cheapest_carrier = self.carrier_rates.cheapest(size_codes, regions)
+            state.update({
+                'carrier_tensor': carrier_tensor,
+                'carrier_available': carrier_available,
+                'cheapest_rates': cheapest_rates,
+                'cheapest_carrier': cheapest_carrier,
+                'carrier_cost': np.einsum('csr,sr->c', carrier_tensor, size_shipments),
+                'cheapest_cost': int((size_shipments * cheapest_rates).sum()),
+                'cheapest_shipments': self._cheapest_shipments(cheapest_carrier, size_shipments)
+            })
+
+        self._state = state
+
+    def _cheapest_shipments(self, cheapest_carrier, size_shipments):
+        """
+        運送会社ごとに、最安となる地域 × サイズの出荷数を合計する
+        """
+        served = cheapest_carrier >= 0
+        return np.bincount(
+            cheapest_carrier[served], weights=size_shipments[served], minlength=len(self.carrier_rates)
+        ).astype(np.int64)
+
+    def _apply(self, population_data, percentages, proportions, region_shipments, changed):
+        """
+        出荷数が変わった地域の列だけを計算し直し、合計に差分を加える
+        """
+        state = self._state
+        rate_matrix = state['rate_matrix'][:, changed]
+
+        old_shipments = state['size_shipments'][:, changed]
+        old_costs = state['size_costs'][:, changed]
+        new_shipments = apportion(region_shipments[changed], proportions).T
+        new_costs = new_shipments * rate_matrix
+
+        state['size_shipments'][:, changed] = new_shipments
+        state['size_costs'][:, changed] = new_costs
+        state['region_cost'][changed] = new_costs.sum(axis=0)
+        state['size_shipment_totals'] += (new_shipments - old_shipments).sum(axis=1)
+        state['size_cost_totals'] += (new_costs - old_costs).sum(axis=1)
+        state['total_cost'] += int((new_costs - old_costs).sum())
+
+        if self.carrier_rates is not None:
+            shipment_delta = new_shipments - old_shipments
+            state['carrier_cost'] += np.einsum('csr,sr->c', state['carrier_tensor'][:, :, changed], shipment_delta)
+            state['cheapest_cost'] += int((shipment_delta * state['cheapest_rates'][:, changed]).sum())
+            cheapest_carrier = state['cheapest_carrier'][:, changed]
+            state['cheapest_shipments'] += (
+                self._cheapest_shipments(cheapest_carrier, new_shipments)
+                - self._cheapest_shipments(cheapest_carrier, old_shipments)
+            )
+
+        state['population_data'] = population_data.copy()
+        state['percentages'] = percentages
+        state['proportions'] = proportions
+        state['region_shipments'] = region_shipments
+
+    def _build_quote(self):
+        """
+        計算状態から calculate_quote と同じ形式の結果を作成する
+        """
+        state = self._state
+        rate_table = self.rate_table
+        proportions = state['proportions']
+        rate_matrix = state['rate_matrix']
+
+        result = state['population_data'].copy()
+        result['shipments'] = state['region_shipments'].copy()
+        result.index.name = 'region'
+        result['rate'] = proportions @ rate_matrix
+        result['total_cost'] = state['region_cost'].copy()
+
+        # 計算状態の配列は次の更新で書き換えるため、サイズ別の出荷数・送料はコピーして渡す
+        size_results = ShippingResult(
+            rate_table,
+            result.index,
+            result['prefectures'].to_numpy() if 'prefectures' in result.columns else None,
+            state['size_codes'],
+            state['row_numbers'],
+            proportions,
+            rate_matrix,
+            state['size_shipments'].copy(),
+            state['size_costs'].copy()
+        )
+
+        total_shipments = result['shipments'].sum()
+        total_cost = result['total_cost'].sum()
+        summary = {
+            'total_shipments': total_shipments,
+            'total_cost': total_cost,
+            'average_cost': total_cost / total_shipments if total_shipments > 0 else 0
+        }
+
+        size_info = []
+        for i, (size_code, size_name, weight) in enumerate(
+                zip(size_results.size_codes, size_results.size_names, size_results.weights)):
+            size_shipments = state['size_shipment_totals'][i]
+            size_cost = state['size_cost_totals'][i]
+            size_info.append({
+                'size_code': size_code,
+                'size_name': size_name,
+                'weight': weight,
+                'proportion': proportions[i],
+                'shipments': size_shipments,
+                'cost': size_cost,
+                'average_cost': size_cost / size_shipments if size_shipments > 0 else 0
+            })
+        if size_info:
+            summary['size_info'] = size_info
+
+        if self.carrier_rates is not None:
+            shipped_sizes = state['size_shipment_totals'] > 0
+            complete = ~(shipped_sizes & ~state['carrier_available']).any(axis=1)
+            summary['carrier_info'] = [
+                {
+                    'carrier': carrier,
+                    'cost': state['carrier_cost'][c],
+                    'average_cost': state['carrier_cost'][c] / total_shipments if total_shipments > 0 else 0,
+                    'complete': bool(complete[c]),
+                    'cheapest_shipments': state['cheapest_shipments'][c]
+                }
+                for c, carrier in enumerate(self.carrier_rates.carriers)
+            ]
+            summary['cheapest_cost'] = np.int64(state['cheapest_cost'])
+
+        summary.update(surcharge_summary(size_results, total_cost))
+        summary['rate_table_version'] = rate_table.version
+
+        return result, size_results, summary
+
+    def _verify(self, total_shipments, population_data, size_distribution):
+        """
+        すべて計算し直した結果と比較する（check モード）
+
+        Raises:
+            RuntimeError: 差分計算の結果が一致しない場合
+        """
+        result, size_results, summary = self._quote
+        expected_result, expected_size_results, expected_summary = calculate_quote(
+            total_shipments, population_data, self.rate_table, size_distribution,
+            carrier_rates=self.carrier_rates
+        )
+
+        mismatches = []
+        if not result.equals(expected_result):
+            mismatches.append('result')
+        if not size_results.equals(expected_size_results):
+            mismatches.append('size_results')
+        if repr(summary) != repr(expected_summary):
+            mismatches.append('summary')
+
+        if mismatches:
+            logger.error("差分計算の結果が一致しません: %s (%s)", ', '.join(mismatches), self.last_update)
+            raise RuntimeError(f"差分計算の結果がすべて計算し直した結果と一致しません: {', '.join(mismatches)}")
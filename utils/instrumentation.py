@@ -0,0 +1,248 @@
+"""
+処理段階ごとの計測（読み込み・出荷数の配分・送料計算・集計・エクスポート）
+
+計測先（シンク）が登録されていない場合は何も記録せず、ほぼコストがかからない。
+
+使用例:
+    from utils import instrumentation
+
+    collector = instrumentation.SpanCollector()
+    instrumentation.add_sink(collector)           # プロセス全体で計測
+    with instrumentation.collect() as collector:  # 現在のスレッド（リクエスト）のみ計測
+        ...
+    print(collector.summary())
+"""
+import contextvars
+import functools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# プロセス全体の計測先
+_global_sinks = []
+# 現在のコンテキスト（スレッド）だけの計測先
+_context_sinks = contextvars.ContextVar('instrumentation_sinks', default=())
+
+
+class Span:
+    """
+    1つの処理段階の計測結果
+
+    Attributes:
+        name (str): 処理段階の名前（例: 'costing'）
+        start (float): 開始時刻（time.perf_counter の値）
+        duration (float): 所要時間（秒）
+        rows (int): 処理した行数・件数（不明な場合は None）
+        fields (dict): その他の付加情報
+    """
+
+    __slots__ = ('name', 'start', 'duration', 'rows', 'fields', '_sinks')
+
+    def __init__(self, name, sinks, fields):
+        self.name = name
+        self.start = None
+        self.duration = None
+        self.rows = None
+        self.fields = fields
+        self._sinks = sinks
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.start
+        if exc_type is not None:
+            self.fields['error'] = exc_type.__name__
+        for sink in self._sinks:
+            try:
+                sink(self)
+            except Exception:
+                logger.exception("計測結果の記録に失敗しました: %s", self.name)
+        return False
+
+    def to_dict(self):
+        return {'name': self.name, 'duration': self.duration, 'rows': self.rows, **self.fields}
+
+    def __repr__(self):
+        return f"Span({self.name!r}, duration={self.duration}, rows={self.rows})"
+
+
+class _NullSpan:
+    """計測が無効なときに使う何もしない Span"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def _active_sinks():
+    context_sinks = _context_sinks.get()
+    if not _global_sinks:
+        return context_sinks
+    return tuple(_global_sinks) + context_sinks
+
+
+def is_enabled():
+    """
+    計測先が1つ以上登録されているかを返す
+    """
+    return bool(_global_sinks) or bool(_context_sinks.get())
+
+
+def span(name, **fields):
+    """
+    処理段階を計測するコンテキストマネージャーを返す
+
+    Args:
+        name (str): 処理段階の名前
+        **fields: 付加情報
+
+    Returns:
+        Span: with 文で使用する。rows 属性に処理件数を設定できる
+    """
+    sinks = _active_sinks()
+    if not sinks:
+        return _NULL_SPAN
+    return Span(name, sinks, fields)
+
+
+def traced(name, rows=None):
+    """
+    関数の実行を計測するデコレーター
+
+    Args:
+        name (str): 処理段階の名前
+        rows (callable, optional): 戻り値から処理件数を求める関数
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            sinks = _active_sinks()
+            if not sinks:
+                return func(*args, **kwargs)
+            with Span(name, sinks, {}) as current:
+                value = func(*args, **kwargs)
+                if rows is not None:
+                    current.rows = rows(value)
+            return value
+        return wrapper
+    return decorator
+
+
+def add_sink(sink):
+    """
+    プロセス全体の計測先を登録する
+
+    Args:
+        sink (callable): Span を受け取る関数（SpanCollector や LoggingSink など）
+    """
+    if sink not in _global_sinks:
+        _global_sinks.append(sink)
+
+
+def remove_sink(sink):
+    """
+    プロセス全体の計測先を登録解除する
+    """
+    if sink in _global_sinks:
+        _global_sinks.remove(sink)
+
+
+@contextmanager
+def collect(collector=None):
+    """
+    with ブロック内の計測結果を現在のコンテキスト（スレッド）だけで収集する
+
+    Args:
+        collector (SpanCollector, optional): 収集先。省略時は新しく作成する
+
+    Yields:
+        SpanCollector: 収集先
+    """
+    if collector is None:
+        collector = SpanCollector()
+    token = _context_sinks.set(_context_sinks.get() + (collector,))
+    try:
+        yield collector
+    finally:
+        _context_sinks.reset(token)
+
+
+class SpanCollector:
+    """
+    計測結果をメモリ上に保持する計測先
+
+    Args:
+        max_spans (int): 保持する件数の上限（超えた場合は古いものから破棄）
+    """
+
+    def __init__(self, max_spans=10000):
+        self.max_spans = max_spans
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def __call__(self, span):
+        with self._lock:
+            self.spans.append(span)
+            if len(self.spans) > self.max_spans:
+                del self.spans[:len(self.spans) - self.max_spans]
+
+    def clear(self):
+        with self._lock:
+            self.spans.clear()
+
+    def summary(self):
+        """
+        処理段階ごとに集計する
+
+        Returns:
+            dict: 名前 → {'count', 'total', 'max', 'rows'}
+        """
+        with self._lock:
+            spans = list(self.spans)
+
+        result = {}
+        for item in spans:
+            stats = result.setdefault(item.name, {'count': 0, 'total': 0.0, 'max': 0.0, 'rows': 0})
+            stats['count'] += 1
+            stats['total'] += item.duration
+            stats['max'] = max(stats['max'], item.duration)
+            stats['rows'] += item.rows or 0
+        return result
+
+
+class LoggingSink:
+    """
+    計測結果をログに出力する計測先
+
+    Args:
+        log (logging.Logger, optional): 出力先のロガー
+        level (int): ログレベル
+    """
+
+    def __init__(self, log=None, level=logging.INFO):
+        self.log = log or logger
+        self.level = level
+
+    def __call__(self, span):
+        if self.log.isEnabledFor(self.level):
+            message = "%s: %.3fms rows=%s"
+            args = [span.name, span.duration * 1000, span.rows]
+            if span.fields:
+                message += " %s"
+                args.append(span.fields)
+            self.log.log(self.level, message, *args)
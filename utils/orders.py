@@ -0,0 +1,325 @@
+"""
+出荷実績（注文履歴）ファイルによる送料計算
+
+数百万行・数GBの注文ファイルを一定サイズのブロックに分けて読み込み、
+地域 × サイズごとの出荷数を集計してから送料テーブルで計算する。
+ファイル全体を一度に読み込むことはなく、ブロックは複数プロセスで並列に処理できる。
+
+注文ファイルの形式（CSV, 1行目は見出し）:
+    prefecture（都道府県などのゾーン名）または region（送料地域）,
+    size_code または length, width, height（cm）, weight（kg）,
+    quantity（任意、省略時は1。空欄・0以上の整数以外の行は集計から除外する）
+
+size_code がない場合は、寸法と重量から SizeClassifier でサイズを判定する。
+
+注意: ブロックは改行位置で区切るため、値の中に改行を含むファイルには対応しない。
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+from utils.instrumentation import span
+from utils.rate_table import as_rate_table
+from utils.sizes import SizeClassifier
+from utils.surcharges import surcharge_items
+
+# 1ブロックのおおよそのサイズ（バイト）
+DEFAULT_BLOCK_BYTES = 32 * 1024 * 1024
+
+# 配送先を表すカラムの候補（先に見つかったものを使用）
+ZONE_COLUMNS = ('prefecture', 'zone')
+REGION_COLUMN = 'region'
+# 寸法と重量のカラム（size_code がない場合に使用）
+DIMENSION_COLUMNS = ('length', 'width', 'height', 'weight')
+
+# ワーカープロセスごとの計算設定（initializer で設定する）
+_worker_config = None
+
+
+def _read_header(file_path, encoding):
+    """
+    見出し行を読み込み、カラム名のリストとデータ部分の開始位置を返す
+    """
+    with open(file_path, 'rb') as f:
+        header_line = f.readline()
+        data_start = f.tell()
+    columns = pd.read_csv(BytesIO(header_line), encoding=encoding, nrows=0).columns.tolist()
+    return columns, data_start
+
+
+def split_blocks(file_path, data_start, block_bytes=DEFAULT_BLOCK_BYTES):
+    """
+    ファイルを改行位置で区切ったブロック（開始位置, 終了位置）に分割する
+
+    Args:
+        file_path (str): ファイルパス
+        data_start (int): データ部分の開始位置（見出し行の直後）
+        block_bytes (int): 1ブロックのおおよそのサイズ
+
+    Returns:
+        list: (開始位置, 終了位置) のリスト
+    """
+    file_size = os.path.getsize(file_path)
+    blocks = []
+    with open(file_path, 'rb') as f:
+        start = data_start
+        while start < file_size:
+            end = start + block_bytes
+            if end >= file_size:
+                end = file_size
+            else:
+                # 行の途中で区切らないよう、次の改行の直後まで延ばす
+                f.seek(end)
+                f.readline()
+                end = f.tell()
+            blocks.append((start, end))
+            start = end
+    return blocks
+
+
+def _build_config(columns, rate_table, zone_table, encoding):
+    """
+    ブロックの集計に必要な設定（ワーカープロセスに渡す）を作成する
+    """
+    zone_column = next((col for col in ZONE_COLUMNS if col in columns), None)
+    if zone_column is not None:
+        if zone_table is None:
+            raise ValueError(f"'{zone_column}' カラムを使用するにはゾーンデータが必要です")
+        region_column = zone_column
+        # ゾーンコード → 地域コード → 送料テーブルの列番号
+        lookup_names = list(zone_table.zone_names)
+        lookup_regions = rate_table.region_positions(zone_table.regions)[zone_table.zone_regions]
+    elif REGION_COLUMN in columns:
+        region_column = REGION_COLUMN
+        lookup_names = list(rate_table.regions)
+        lookup_regions = np.arange(len(rate_table.regions))
+    else:
+        raise ValueError(
+            f"配送先のカラム（{', '.join(ZONE_COLUMNS + (REGION_COLUMN,))} のいずれか）が注文ファイルにありません"
+        )
+
+    if 'size_code' in columns:
+        size_columns = ['size_code']
+        classifier = None
+    elif all(col in columns for col in DIMENSION_COLUMNS):
+        size_columns = list(DIMENSION_COLUMNS)
+        classifier = SizeClassifier(rate_table)
+    else:
+        raise ValueError(
+            f"size_code カラム、または寸法と重量のカラム（{', '.join(DIMENSION_COLUMNS)}）が注文ファイルにありません"
+        )
+
+    return {
+        'columns': columns,
+        'encoding': encoding,
+        'region_column': region_column,
+        'lookup_names': lookup_names,
+        'lookup_regions': np.asarray(lookup_regions, dtype=np.int64),
+        'size_codes': list(rate_table.size_codes),
+        'size_index': dict(rate_table.size_index),
+        'size_columns': size_columns,
+        'classifier': classifier,
+        'n_regions': len(rate_table.regions),
+        'has_quantity': 'quantity' in columns
+    }
+
+
+def _init_worker(config):
+    global _worker_config
+    _worker_config = config
+
+
+def _aggregate_frame(df, config):
+    """
+    注文データフレームを (地域 × サイズ) の出荷数に集計する
+
+    Returns:
+        tuple: (出荷数 (地域数 × サイズ数), 行数, 地域・サイズ・数量が不明な行数)
+    """
+    n_regions = config['n_regions']
+    n_sizes = len(config['size_codes'])
+
+    name_codes = pd.Index(config['lookup_names']).get_indexer(df[config['region_column']])
+    region_codes = np.where(name_codes >= 0, config['lookup_regions'][name_codes], -1)
+    if config['classifier'] is not None:
+        size_codes = config['classifier'].classify(*(df[col].to_numpy() for col in DIMENSION_COLUMNS))
+    else:
+        # 同じサイズコードが複数ある場合は最初の行を使う（RateTable.index_of と同じ）
+        size_codes = df['size_code'].map(config['size_index']).fillna(-1).to_numpy(dtype=np.int64)
+
+    valid = (region_codes >= 0) & (size_codes >= 0)
+    if config['has_quantity']:
+        # 空欄・数値以外・整数以外・負の数量は不明として除外する
+        quantity = pd.to_numeric(df['quantity'], errors='coerce').to_numpy(dtype=float)
+        valid &= np.isfinite(quantity) & (quantity % 1 == 0) & (quantity >= 0)
+        quantity = quantity[valid]
+    else:
+        quantity = None
+    cells = region_codes[valid] * n_sizes + size_codes[valid]
+
+    shipments = np.bincount(cells, weights=quantity, minlength=n_regions * n_sizes)
+    shipments = np.rint(shipments).astype(np.int64).reshape(n_regions, n_sizes)
+    return shipments, len(df), int((~valid).sum())
+
+
+def _read_block(file_path, start, end, config):
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+
+    usecols = [config['region_column']] + config['size_columns'] + (['quantity'] if config['has_quantity'] else [])
+    dtype = {config['region_column']: str, 'size_code': str}
+    dtype.update({col: 'float64' for col in DIMENSION_COLUMNS})
+    if config['has_quantity']:
+        # 数値以外の数量でブロック全体が失敗しないよう、文字列で読み込んでから変換する
+        dtype['quantity'] = str
+    dtype = {col: dtype[col] for col in usecols}
+
+    # 空行だけのブロック（ファイル末尾など）
+    if not data.strip():
+        return pd.DataFrame({col: pd.Series(dtype=dtype[col]) for col in usecols})
+
+    return pd.read_csv(
+        BytesIO(data),
+        header=None,
+        names=config['columns'],
+        usecols=usecols,
+        dtype=dtype,
+        encoding=config['encoding']
+    )
+
+
+def _price_block(task):
+    """
+    1ブロックを読み込んで集計する（ワーカープロセスで実行）
+    """
+    file_path, start, end = task
+    config = _worker_config
+    df = _read_block(file_path, start, end, config)
+    return _aggregate_frame(df, config)
+
+
+def price_order_file(file_path, shipping_rates, zone_table=None, workers=None,
+                     block_bytes=DEFAULT_BLOCK_BYTES, encoding='utf-8'):
+    """
+    注文ファイルの送料を地域 × サイズごとに集計する
+
+    Args:
+        file_path (str): 注文ファイル（CSV）のパス
+        shipping_rates (RateTable or DataFrame): 送料テーブル
+        zone_table (ZoneTable, optional): ゾーンと地域の対応表（prefecture / zone カラムを使う場合に必要）
+        workers (int, optional): 並列処理のプロセス数（1の場合は現在のプロセスで処理、省略時はCPU数）
+        block_bytes (int, optional): 1ブロックのおおよそのサイズ（メモリ使用量はおよそ ブロックサイズ × プロセス数）
+        encoding (str, optional): ファイルの文字コード（例: 'cp932'）
+
+    Returns:
+        dict: 集計結果
+            - 'regions', 'size_codes': 各軸に対応する地域名・サイズコード
+            - 'shipments', 'cost': 地域 × サイズの出荷数・送料
+            - 'total_shipments', 'total_cost', 'average_cost': 合計
+            - 'rows': 読み込んだ行数, 'unmatched_rows': 地域・サイズ・数量が不明で除外した行数
+    """
+    rate_table = as_rate_table(shipping_rates)
+    columns, data_start = _read_header(file_path, encoding)
+    config = _build_config(columns, rate_table, zone_table, encoding)
+    blocks = split_blocks(file_path, data_start, block_bytes)
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(blocks)))
+
+    shipments = np.zeros((len(rate_table.regions), len(rate_table.size_codes)), dtype=np.int64)
+    rows = 0
+    unmatched_rows = 0
+
+    with span('orders', blocks=len(blocks), workers=workers) as current:
+        tasks = [(file_path, start, end) for start, end in blocks]
+        if workers == 1:
+            _init_worker(config)
+            results = map(_price_block, tasks)
+            executor = None
+        else:
+            executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(config,))
+            results = executor.map(_price_block, tasks)
+
+        try:
+            for block_shipments, block_rows, block_unmatched in results:
+                shipments += block_shipments
+                rows += block_rows
+                unmatched_rows += block_unmatched
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        current.rows = rows
+
+    cost = shipments * rate_table.rates.T
+    total_shipments = int(shipments.sum())
+    total_cost = int(cost.sum())
+
+    return {
+        'regions': list(rate_table.regions),
+        'size_codes': list(rate_table.size_codes),
+        'shipments': shipments,
+        'cost': cost,
+        'total_shipments': total_shipments,
+        'total_cost': total_cost,
+        'average_cost': total_cost / total_shipments if total_shipments > 0 else 0,
+        'rows': rows,
+        'unmatched_rows': unmatched_rows
+    }
+
+
+def order_summary(order_result, shipping_rates):
+    """
+    price_order_file の結果を calculate_summary と同じ形式の集計結果に変換する
+
+    Args:
+        order_result (dict): price_order_file の戻り値
+        shipping_rates (RateTable or DataFrame): 送料テーブル
+
+    Returns:
+        dict: 集計結果（出荷実績のないサイズは含めない）
+    """
+    rate_table = as_rate_table(shipping_rates)
+    size_shipments = order_result['shipments'].sum(axis=0)
+    size_cost = order_result['cost'].sum(axis=0)
+    total_shipments = order_result['total_shipments']
+
+    size_info = []
+    for i, size_code in enumerate(order_result['size_codes']):
+        if size_shipments[i] == 0:
+            continue
+        row_number = rate_table.index_of(size_code)
+        size_info.append({
+            'size_code': size_code,
+            'size_name': rate_table.size_names[row_number],
+            'weight': rate_table.weights[row_number],
+            'proportion': size_shipments[i] / total_shipments if total_shipments > 0 else 0,
+            'shipments': int(size_shipments[i]),
+            'cost': int(size_cost[i]),
+            'average_cost': size_cost[i] / size_shipments[i]
+        })
+
+    summary = {
+        'total_shipments': total_shipments,
+        'total_cost': order_result['total_cost'],
+        'average_cost': order_result['average_cost'],
+        'size_info': size_info
+    }
+
+    # 割増・手数料は地域 × サイズの出荷数・送料の行列から規則ごとに求める
+    if rate_table.surcharges is not None:
+        rule_costs = rate_table.surcharges.costs(
+            np.arange(len(order_result['size_codes'])),
+            rate_table.region_positions(order_result['regions']),
+            order_result['shipments'].T,
+            order_result['cost'].T
+        )
+        summary.update(surcharge_items(rate_table.surcharges, rule_costs, order_result['total_cost']))
+
+    summary['rate_table_version'] = rate_table.version
+    return summary
@@ -0,0 +1,178 @@
+"""
+Streamlit の再実行ごとのプロファイリング（開発用）
+
+app.py の処理の区切りごとに checkpoint を呼び出し、前の区切りからの経過時間（壁時計時間）を
+区間ごとの処理時間として記録する。計算・エクスポートの処理段階（utils.instrumentation の計測）も
+同じ再実行の分だけ収集し、必要に応じて cProfile の関数ごとの集計も取得する。
+再実行の終わりに finish を呼び出すと、結果を JSONL ファイルに1行追記する（後から pandas などで分析する）。
+
+無効な場合（enabled=False）は何も計測せず、checkpoint・finish はすぐに戻る。
+
+環境変数:
+    PROFILING_CPROFILE: true の場合は cProfile の集計も記録する（処理が数倍遅くなる）
+    PROFILING_LOG_PATH: 追記する JSONL ファイル（省略時は logs/profiling.jsonl）
+    PROFILING_TOP: cProfile の集計を記録する関数の数（累積時間の長い順）
+"""
+import contextvars
+import cProfile
+import datetime
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+from contextlib import ExitStack
+
+from utils import instrumentation
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOG_PATH = os.path.join('logs', 'profiling.jsonl')
+DEFAULT_TOP = 30
+
+# JSONL ファイルへの追記（同じプロセスの複数セッションから書き込む）
+_write_lock = threading.Lock()
+# 現在のコンテキスト（スクリプトを実行するスレッド）で計測中のプロファイラー
+_active_profiler = contextvars.ContextVar('active_profiler', default=None)
+
+
+def _env_flag(name, default='false'):
+    return os.getenv(name, default).lower() in ("true", "1", "yes")
+
+
+def _cprofile_rows(profile, top):
+    """
+    cProfile の集計を累積時間の長い順に top 件の辞書のリストにする
+    """
+    stats = pstats.Stats(profile).stats
+    rows = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:top]
+    return [
+        {
+            'function': pstats.func_std_string(function),
+            'calls': calls,
+            'tottime': tottime,
+            'cumtime': cumtime
+        }
+        for function, (_, calls, tottime, cumtime, _) in rows
+    ]
+
+
+class RerunProfiler:
+    """
+    1回の再実行の区間ごとの処理時間を計測する
+
+    Args:
+        enabled (bool): 計測するかどうか
+        cprofile (bool, optional): cProfile の集計も取得するか。省略時は環境変数 PROFILING_CPROFILE
+        log_path (str, optional): 追記する JSONL ファイル。省略時は環境変数 PROFILING_LOG_PATH
+        top (int, optional): cProfile の集計を記録する関数の数。省略時は環境変数 PROFILING_TOP
+
+    Attributes:
+        sections (list): (区間の名前, 処理時間（秒）) のリスト
+        record (dict): finish で作成した記録（finish の前は None）
+    """
+
+    def __init__(self, enabled, cprofile=None, log_path=None, top=None):
+        self.enabled = enabled
+        self.cprofile = _env_flag('PROFILING_CPROFILE') if cprofile is None else cprofile
+        self.log_path = os.getenv('PROFILING_LOG_PATH', DEFAULT_LOG_PATH) if log_path is None else log_path
+        self.top = int(os.getenv('PROFILING_TOP', str(DEFAULT_TOP))) if top is None else top
+        self.sections = []
+        self.record = None
+        self._started_at = None
+        self._first = None
+        self._last = None
+        self._profile = None
+        self._collector = None
+        self._stack = None
+
+    def start(self):
+        """
+        計測を開始する
+
+        前回の再実行が st.stop や例外で途中終了し、finish が呼ばれていない場合は、その計測を破棄する。
+        """
+        if not self.enabled:
+            return self
+
+        previous = _active_profiler.get()
+        if previous is not None:
+            try:
+                previous._close()
+            except ValueError:
+                # 前回の再実行が別のコンテキストで実行されていた場合は、すでに元に戻っている
+                pass
+
+        self._stack = ExitStack()
+        self._collector = self._stack.enter_context(instrumentation.collect())
+        self._stack.callback(_active_profiler.reset, _active_profiler.set(self))
+        if self.cprofile:
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # 他のセッションで cProfile を実行中（同時に有効にできるのは1つだけ）
+                logger.warning("他のプロファイラーが実行中のため、cProfile の集計を省略します")
+            else:
+                self._profile = profile
+                self._stack.callback(profile.disable)
+
+        self._started_at = datetime.datetime.now().astimezone()
+        self._first = self._last = time.perf_counter()
+        return self
+
+    def checkpoint(self, name):
+        """
+        前の区切り（または開始）からここまでを name の区間として記録する
+        """
+        if self._last is None:
+            return
+        now = time.perf_counter()
+        self.sections.append((name, now - self._last))
+        self._last = now
+
+    def _close(self):
+        if self._stack is not None:
+            stack, self._stack = self._stack, None
+            stack.close()
+
+    def finish(self, **fields):
+        """
+        計測を終了し、記録を JSONL ファイルに追記する
+
+        Args:
+            **fields: 記録に加える付加情報（送料データのバージョンなど）
+
+        Returns:
+            dict: 記録（無効な場合は None）
+        """
+        if self._last is None:
+            return None
+        total = time.perf_counter() - self._first
+        self._last = None
+        self._close()
+
+        self.record = {
+            'timestamp': self._started_at.isoformat(timespec='milliseconds'),
+            **fields,
+            'total': total,
+            'sections': [{'name': name, 'duration': duration} for name, duration in self.sections],
+            'spans': self._collector.summary(),
+            'cprofile': _cprofile_rows(self._profile, self.top) if self._profile is not None else None
+        }
+        self._write(self.record)
+        return self.record
+
+    def _write(self, record):
+        if not self.log_path:
+            return
+        line = json.dumps(record, ensure_ascii=False, default=str) + '\n'
+        try:
+            directory = os.path.dirname(self.log_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with _write_lock, open(self.log_path, 'a', encoding='utf-8') as f:
+                f.write(line)
+        except OSError as e:
+            logger.warning("プロファイリングの記録を書き込めませんでした: %s", e)
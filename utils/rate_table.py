@@ -0,0 +1,212 @@
+import copy
+import hashlib
+import re
+
+import numpy as np
+import pandas as pd
+
+# 送料データのうち地域別送料以外のカラム
+META_COLUMNS = ('size_code', 'size_name', 'weight')
+
+# サイズ名・重量の表記から数値の上限を読み取るパターン（例: '60cm以内', '2kg以内', '500g以内'）
+_CM_PATTERN = re.compile(r'(\d+(?:\.\d+)?)\s*cm', re.IGNORECASE)
+_KG_PATTERN = re.compile(r'(\d+(?:\.\d+)?)\s*(kg|g)(?![a-z])', re.IGNORECASE)
+# 重量制限がないことを表す表記
+_NO_LIMIT_LABELS = ('なし', '無し', '-', '')
+
+
+def parse_size_limit(size_name):
+    """
+    サイズ名から3辺合計の上限（cm）を読み取る（読み取れない場合は NaN）
+    """
+    match = _CM_PATTERN.search(str(size_name))
+    return float(match.group(1)) if match else np.nan
+
+
+def parse_weight_limit(weight):
+    """
+    重量の表記から重量の上限（kg）を読み取る（制限なしは inf、読み取れない場合は NaN）
+    """
+    label = str(weight).strip()
+    if label in _NO_LIMIT_LABELS:
+        return np.inf
+    match = _KG_PATTERN.search(label)
+    if not match:
+        return np.nan
+    value = float(match.group(1))
+    return value / 1000 if match.group(2).lower() == 'g' else value
+
+
+class RateTable:
+    """
+    送料データを計算用に前処理したテーブル
+
+    読み込み時に1回だけ検証と変換を行い、サイズコードの文字列化・
+    送料単価の配列化・表示ラベルの作成を済ませておく。
+    生成後は読み取り専用として扱う。
+
+    Attributes:
+        size_codes (tuple): サイズコード（文字列）
+        size_names (tuple): サイズ名
+        weights (tuple): 重量の表記
+        regions (tuple): 地域名（送料単価の列の並び）
+        rates (ndarray): 送料単価 (サイズ数 × 地域数の int64 配列。int32 で作成した場合は int32)
+        labels (tuple): 画面表示用のサイズラベル（例: '60cm以内 (2kg以内)'）
+        size_index (dict): サイズコード → 行番号
+        region_index (dict): 地域名 → 列番号
+        fingerprint (str): 内容から計算したハッシュ値（同じ内容のテーブルは同じ値になる）
+        version (str): 計算結果に記録するバージョン（fingerprint の先頭12文字）
+        size_limits_cm (ndarray): サイズ名から読み取った3辺合計の上限（cm、読み取れない場合は NaN）
+        weight_limits_kg (ndarray): 重量の表記から読み取った重量の上限（kg、制限なしは inf）
+        surcharges (SurchargeTable): 割増・手数料の規則（ない場合は None、with_surcharges で設定する）
+    """
+
+    def __init__(self, size_codes, size_names, weights, regions, rates):
+        self.size_codes = tuple(str(code) for code in size_codes)
+        self.size_names = tuple(size_names)
+        self.weights = tuple(weights)
+        self.regions = tuple(regions)
+
+        # int32 で作成した送料単価（アップロードの検証済みデータなど）は変換せずにそのまま使う
+        rates = np.asarray(rates)
+        rates = np.ascontiguousarray(rates, dtype=np.int32 if rates.dtype == np.int32 else np.int64)
+        if rates.shape != (len(self.size_codes), len(self.regions)):
+            raise ValueError(
+                f"送料単価の形状 {rates.shape} がサイズ数・地域数と一致しません"
+            )
+        rates.flags.writeable = False
+        self.rates = rates
+
+        self.labels = tuple(f"{name} ({weight})" for name, weight in zip(self.size_names, self.weights))
+
+        # サイズ判定用の数値の上限（表記の解析は読み込み時の1回だけ）
+        self.size_limits_cm = np.array([parse_size_limit(name) for name in self.size_names], dtype=float)
+        self.weight_limits_kg = np.array([parse_weight_limit(weight) for weight in self.weights], dtype=float)
+        self.size_limits_cm.flags.writeable = False
+        self.weight_limits_kg.flags.writeable = False
+
+        # 同じサイズコードが重複している場合は最初の行を使用する
+        self.size_index = {}
+        for i, code in enumerate(self.size_codes):
+            self.size_index.setdefault(code, i)
+        self.region_index = {region: i for i, region in enumerate(self.regions)}
+
+        digest = hashlib.sha1()
+        for values in (self.size_codes, self.size_names, self.weights, self.regions):
+            digest.update('\x1f'.join(map(str, values)).encode('utf-8'))
+            digest.update(b'\x1e')
+        # 送料単価の型（int32 / int64）によらず、同じ内容なら同じ値にする
+        digest.update(self.rates.astype(np.int64, copy=False).tobytes())
+        self.fingerprint = digest.hexdigest()
+        self.surcharges = None
+
+    def with_surcharges(self, surcharges):
+        """
+        割増・手数料の規則を設定した RateTable を返す（送料単価などの配列は共有する）
+
+        規則の内容も fingerprint・version に含めるため、規則を変更すると計算結果のキャッシュは使われない。
+
+        Args:
+            surcharges (SurchargeTable): この送料テーブルに合わせてコンパイルした規則
+        """
+        table = copy.copy(self)
+        table.surcharges = surcharges
+        table.fingerprint = hashlib.sha1(f"{self.fingerprint}:{surcharges.fingerprint}".encode('utf-8')).hexdigest()
+        return table
+
+    @property
+    def version(self):
+        return self.fingerprint[:12]
+
+    @classmethod
+    def from_dataframe(cls, shipping_rates, regions=None):
+        """
+        送料データフレームから RateTable を作成する
+
+        Args:
+            shipping_rates (DataFrame): 送料データ
+            regions (list, optional): 必須とする地域名のリスト。省略時はサイズ情報以外の全カラムを地域とみなす
+
+        Returns:
+            RateTable: 前処理済みの送料テーブル
+
+        Raises:
+            ValueError: 必須カラムの不足や送料単価が数値でない場合
+        """
+        if regions is None:
+            regions = [col for col in shipping_rates.columns if col not in META_COLUMNS]
+        regions = list(regions)
+
+        missing_columns = [col for col in list(META_COLUMNS) + regions if col not in shipping_rates.columns]
+        if missing_columns:
+            raise ValueError(f"以下の必須カラムが送料データに含まれていません: {', '.join(missing_columns)}")
+        if not regions:
+            raise ValueError("送料データに地域のカラムがありません")
+
+        region_rates = shipping_rates[regions].apply(pd.to_numeric, errors='coerce')
+        invalid_columns = [col for col in regions if region_rates[col].isna().any()]
+        if invalid_columns:
+            raise ValueError(f"以下の地域の送料に数値以外の値が含まれています: {', '.join(invalid_columns)}")
+
+        return cls(
+            shipping_rates['size_code'].astype(str).tolist(),
+            shipping_rates['size_name'].astype(str).tolist(),
+            shipping_rates['weight'].astype(str).tolist(),
+            regions,
+            region_rates.to_numpy()
+        )
+
+    def to_dataframe(self):
+        """
+        元の送料データと同じ形式のデータフレームに戻す
+
+        Returns:
+            DataFrame: 送料データ
+        """
+        df = pd.DataFrame({
+            'size_code': self.size_codes,
+            'size_name': self.size_names,
+            'weight': self.weights
+        })
+        for i, region in enumerate(self.regions):
+            df[region] = self.rates[:, i]
+        return df
+
+    def __len__(self):
+        return len(self.size_codes)
+
+    def __repr__(self):
+        return f"RateTable(sizes={len(self.size_codes)}, regions={len(self.regions)})"
+
+    def index_of(self, size_code):
+        """
+        サイズコードに対応する行番号を返す（見つからない場合は None）
+        """
+        return self.size_index.get(str(size_code))
+
+    def region_positions(self, regions):
+        """
+        地域名のリストを送料単価の列番号の配列に変換する
+
+        Raises:
+            ValueError: 送料データに存在しない地域が含まれている場合
+        """
+        missing_regions = [region for region in regions if region not in self.region_index]
+        if missing_regions:
+            raise ValueError(f"以下の地域の送料データがありません: {', '.join(map(str, missing_regions))}")
+        return np.array([self.region_index[region] for region in regions], dtype=np.intp)
+
+
+def as_rate_table(shipping_rates):
+    """
+    送料データを RateTable に変換する（すでに RateTable の場合はそのまま返す）
+
+    Args:
+        shipping_rates (RateTable or DataFrame): 送料データ
+
+    Returns:
+        RateTable: 前処理済みの送料テーブル
+    """
+    if isinstance(shipping_rates, RateTable):
+        return shipping_rates
+    return RateTable.from_dataframe(shipping_rates)
@@ -0,0 +1,201 @@
+"""
+送料データ・人口データのホットリロード
+
+送料データ（割増・手数料の規則ファイルを含む）と人口データの組をスナップショット（TableSnapshot）として保持し、バックグラウンドの
+スレッドでCSVファイルの変更を監視する。変更を検出すると別スレッドで読み込み・検証を行い、
+完成したスナップショットへの参照を1回の代入で置き換える。
+
+計算の開始時に current() でスナップショットを1回だけ取得して使えば、途中で差し替えが起きても
+その計算は同じ版の送料データで完了する。読み込みに失敗した場合（書き込み途中のファイルや
+形式の誤りなど）は以前のスナップショットを使い続けるため、要求の処理が読み込みを待つことはない。
+
+環境変数:
+    TABLE_RELOAD_INTERVAL: 変更を確認する間隔（秒、0 で監視しない）
+"""
+import logging
+import os
+import threading
+import time
+
+from utils.data_loader import (
+    find_population_data_path,
+    find_shipping_rates_path,
+    load_population_data,
+    load_rate_table,
+    read_population_data,
+    read_rate_table
+)
+from utils.surcharges import surcharge_rules_path
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = 5.0
+
+
+def reload_interval():
+    return float(os.getenv('TABLE_RELOAD_INTERVAL', str(DEFAULT_INTERVAL)))
+
+
+def _signature(file_path):
+    """
+    ファイルのパス・サイズ・更新時刻（ファイルがない場合は None）
+    """
+    if file_path is None:
+        return None
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+
+
+def _signatures(rates_path, population_path):
+    """
+    送料データ・人口データ・割増・手数料の規則ファイルの状態（規則ファイルは任意）
+    """
+    rules_signature = _signature(surcharge_rules_path(rates_path)) if rates_path is not None else None
+    return (_signature(rates_path), _signature(population_path), rules_signature)
+
+
+class TableSnapshot:
+    """
+    同時に読み込んだ送料データと人口データの組（読み取り専用）
+
+    Attributes:
+        rate_table (RateTable): 送料テーブル
+        population_data (DataFrame): 地域別人口データ（変更せず、必要に応じてコピーして使う）
+        version (str): 送料データのバージョン（rate_table.version）
+        generation (int): 読み込んだ順の通し番号（起動時が1）
+        loaded_at (float): 読み込んだ時刻（UNIX時間）
+    """
+
+    __slots__ = ('rate_table', 'population_data', 'version', 'generation', 'loaded_at', '_signatures')
+
+    def __init__(self, rate_table, population_data, generation, signatures):
+        self.rate_table = rate_table
+        self.population_data = population_data
+        self.version = rate_table.version
+        self.generation = generation
+        self.loaded_at = time.time()
+        self._signatures = signatures
+
+
+class TableRegistry:
+    """
+    送料データ・人口データの最新のスナップショットを提供し、ファイルの変更を監視する
+
+    Args:
+        rates_path (str, optional): 送料データのCSVファイル（省略時は確認のたびに find_shipping_rates_path で探す）
+        population_path (str, optional): 人口データのCSVファイル（省略時は find_population_data_path で探す）
+        interval (float, optional): 変更を確認する間隔（秒）。省略時は環境変数 TABLE_RELOAD_INTERVAL
+    """
+
+    def __init__(self, rates_path=None, population_path=None, interval=None):
+        self.rates_path = rates_path
+        self.population_path = population_path
+        self.interval = reload_interval() if interval is None else interval
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._listeners = []
+        # 読み込みに失敗したファイルの状態（同じ状態のファイルは読み込み直さない）
+        self._failed_signatures = None
+
+        # 起動時はファイルがなくても動作するよう、従来どおり候補パス・ダミーデータの順に読み込む
+        # （パスを指定した場合は、読み込めなければエラーにする）
+        rates_path, population_path = self._paths()
+        signatures = _signatures(rates_path, population_path)
+        rate_table = read_rate_table(rates_path) if self.rates_path is not None else load_rate_table(rates_path)
+        if self.population_path is not None:
+            population_data = read_population_data(population_path)
+        else:
+            population_data = load_population_data(population_path)
+        self._snapshot = TableSnapshot(rate_table, population_data, 1, signatures)
+
+    def _paths(self):
+        rates_path = self.rates_path if self.rates_path is not None else find_shipping_rates_path()
+        population_path = self.population_path if self.population_path is not None else find_population_data_path()
+        return rates_path, population_path
+
+    def current(self):
+        """
+        最新のスナップショットを返す（1回の計算の間は同じスナップショットを使い続けること）
+        """
+        return self._snapshot
+
+    def add_listener(self, callback):
+        """
+        スナップショットを差し替えたときに呼び出す関数を登録する（監視スレッドから呼び出される）
+        """
+        self._listeners.append(callback)
+
+    def check(self):
+        """
+        ファイルの変更を確認し、変更されていれば読み込み直して差し替える
+
+        Returns:
+            bool: 差し替えた場合は True
+        """
+        with self._reload_lock:
+            current = self._snapshot
+            rates_path, population_path = self._paths()
+            signatures = _signatures(rates_path, population_path)
+            if signatures in (current._signatures, self._failed_signatures) or None in signatures[:2]:
+                return False
+
+            try:
+                # 規則ファイルは送料データと一緒に読み込む
+                if signatures[0::2] != current._signatures[0::2]:
+                    rate_table = read_rate_table(rates_path)
+                else:
+                    rate_table = current.rate_table
+                if signatures[1] != current._signatures[1]:
+                    population_data = read_population_data(population_path)
+                else:
+                    population_data = current.population_data
+                if 'percentage' not in population_data.columns:
+                    raise ValueError("人口データに percentage カラムがありません")
+                # 人口データのすべての地域の送料があることを確認する（計算時のエラーを防ぐ）
+                rate_table.region_positions(population_data.index)
+            except Exception as e:
+                logger.warning("送料データ・人口データを読み込み直せませんでした（現在のデータを使い続けます）: %s", e)
+                self._failed_signatures = signatures
+                return False
+
+            # 読み込み中にファイルが更新された場合は、次の確認で読み込み直す
+            if _signatures(rates_path, population_path) != signatures:
+                return False
+
+            snapshot = TableSnapshot(rate_table, population_data, current.generation + 1, signatures)
+            self._snapshot = snapshot
+
+        logger.info(
+            "送料データを差し替えました: バージョン %s → %s（第%d版）",
+            current.version, snapshot.version, snapshot.generation
+        )
+        for callback in self._listeners:
+            try:
+                callback(snapshot)
+            except Exception:
+                logger.exception("送料データの差し替えの通知でエラーが発生しました")
+        return True
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def start(self):
+        """
+        変更の監視を開始する（interval が 0 以下の場合は何もしない）
+        """
+        if self.interval <= 0 or self._thread is not None:
+            return self
+        self._thread = threading.Thread(target=self._watch, name='table-registry', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,183 @@
+"""
+見積もりシナリオの入力と結果の形式
+
+コマンドライン（python -m utils quote）と見積もりサービス（python -m utils serve）で共通の、
+シナリオの辞書から calculate_batch の入力配列への変換と、集計結果の JSON 形式を定義する。
+
+シナリオの形式:
+    {"id": "A", "total_shipments": 1000, "size_distribution": {"60": 0.7, "80": 0.3},
+     "region_distribution": {"関東": 0.5, ...}}   # region_distribution は任意
+"""
+import numpy as np
+
+
+class ScenarioError(ValueError):
+    """入力シナリオの形式が正しくない場合のエラー"""
+
+
+def _shipment_count(value):
+    """
+    total_shipments を0以上の整数に変換する（CSV から読み込んだ文字列の整数も受け付ける）
+    """
+    if value is None:
+        raise ValueError("total_shipments が指定されていません")
+    if isinstance(value, str):
+        try:
+            value = int(value.strip())
+        except ValueError:
+            raise ValueError(f"total_shipments は整数で指定してください: {value!r}") from None
+    elif isinstance(value, bool) or not isinstance(value, (int, np.integer)):
+        raise ValueError(f"total_shipments は整数で指定してください: {value!r}")
+    if value < 0:
+        raise ValueError("total_shipments が負の値です")
+    if value > np.iinfo(np.int64).max:
+        raise ValueError("total_shipments が大きすぎます")
+    return int(value)
+
+
+def _share(value, field, key):
+    """
+    比率・割合を0以上の有限の数値に変換する（CSV から読み込んだ文字列の数値も受け付ける）
+    """
+    if isinstance(value, bool):
+        number = None
+    else:
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            number = None
+    if number is None or not np.isfinite(number) or number < 0:
+        raise ValueError(f"{field} の '{key}' は0以上の数値で指定してください: {value!r}")
+    return number
+
+
+def _scenario_row(record, rate_table, region_positions, n_sizes, n_regions):
+    """
+    シナリオ1件を (総出荷数, サイズ別比率, 地域別比率または None) に変換する
+
+    Raises:
+        KeyError, TypeError, ValueError: シナリオの形式が正しくない場合
+    """
+    total_shipments = _shipment_count(record.get('total_shipments'))
+
+    size_distribution = record.get('size_distribution') or {}
+    if not isinstance(size_distribution, dict):
+        raise ValueError("size_distribution はサイズコードと比率の辞書で指定してください")
+    if not size_distribution:
+        raise ValueError("size_distribution が指定されていません")
+    size_proportions = np.zeros(n_sizes, dtype=float)
+    for size_code, proportion in size_distribution.items():
+        position = rate_table.index_of(size_code)
+        if position is None:
+            raise ValueError(f"サイズコード '{size_code}' に対応する送料データが見つかりません")
+        size_proportions[position] += _share(proportion, 'size_distribution', size_code)
+    if size_proportions.sum() <= 0:
+        raise ValueError("size_distribution の比率の合計が0です")
+
+    region_distribution = record.get('region_distribution')
+    if not region_distribution:
+        return total_shipments, size_proportions, None
+    if not isinstance(region_distribution, dict):
+        raise ValueError("region_distribution は地域名と比率の辞書で指定してください")
+    region_percentages = np.zeros(n_regions, dtype=float)
+    for region, percentage in region_distribution.items():
+        if region not in region_positions:
+            raise ValueError(f"地域 '{region}' は人口データに存在しません")
+        region_percentages[region_positions[region]] = _share(percentage, 'region_distribution', region)
+    if region_percentages.sum() <= 0:
+        raise ValueError("region_distribution の比率の合計が0です")
+    return total_shipments, size_proportions, region_percentages
+
+
+def build_scenarios(chunk, rate_table, population_data, on_error=None):
+    """
+    読み込んだシナリオを calculate_batch の入力配列に変換する
+
+    total_shipments は0以上の整数、比率は0以上の有限の数値で、比率の合計が正であること。
+
+    Args:
+        chunk (list): (行番号, シナリオの辞書) のリスト
+        rate_table (RateTable): 送料テーブル
+        population_data (DataFrame): 地域別人口データ
+        on_error (callable, optional): 形式が正しくないシナリオを除外して続ける場合に、
+            (行番号, シナリオの辞書, ScenarioError) を受け取る関数
+
+    Returns:
+        dict: calculate_batch の scenarios 引数（on_error を指定した場合は、除外したシナリオを含まない）
+
+    Raises:
+        ScenarioError: シナリオの形式が正しくない場合（on_error を指定しない場合のみ）
+    """
+    size_codes = list(rate_table.size_codes)
+    regions = list(population_data.index)
+    region_positions = {region: i for i, region in enumerate(regions)}
+    default_percentages = population_data['percentage'].to_numpy(dtype=float)
+
+    total_shipments = []
+    size_proportions = []
+    region_percentages = []
+
+    for line_number, record in chunk:
+        try:
+            shipments, proportions, percentages = _scenario_row(
+                record, rate_table, region_positions, len(size_codes), len(regions)
+            )
+        except (KeyError, TypeError, ValueError) as e:
+            error = ScenarioError(f"{line_number}行目 (id={record.get('id')}): {e}")
+            if on_error is None:
+                raise error
+            on_error(line_number, record, error)
+            continue
+        total_shipments.append(shipments)
+        size_proportions.append(proportions)
+        region_percentages.append(default_percentages if percentages is None else percentages)
+
+    return {
+        'total_shipments': np.array(total_shipments, dtype=np.int64),
+        'size_codes': size_codes,
+        'size_proportions': np.array(size_proportions, dtype=float).reshape(len(total_shipments), len(size_codes)),
+        'region_percentages': np.array(region_percentages, dtype=float).reshape(len(total_shipments), len(regions))
+    }
+
+
+def to_builtin(value):
+    """
+    numpy の数値型を JSON に書き出せる Python の型に変換する
+    """
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def surcharge_record(summary):
+    """
+    集計結果の割増・手数料を JSON に書き出せる辞書に変換する（規則がない場合は空の辞書）
+    """
+    if 'surcharge_info' not in summary:
+        return {}
+    return {
+        'surcharge_info': [
+            {key: to_builtin(value) for key, value in info.items()}
+            for info in summary['surcharge_info']
+        ],
+        'surcharge_total': to_builtin(summary['surcharge_total']),
+        'invoice_total': to_builtin(summary['invoice_total'])
+    }
+
+
+def summary_record(scenario_id, summary):
+    """
+    集計結果を JSON に書き出せる辞書に変換する（JSONL 出力・見積もりサービスの応答の形式）
+    """
+    return {
+        'id': scenario_id,
+        'total_shipments': to_builtin(summary['total_shipments']),
+        'total_cost': to_builtin(summary['total_cost']),
+        'average_cost': to_builtin(summary['average_cost']),
+        'size_info': [
+            {key: to_builtin(value) for key, value in info.items()}
+            for info in summary['size_info']
+        ],
+        **surcharge_record(summary),
+        'rate_table_version': summary.get('rate_table_version')
+    }
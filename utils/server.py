@@ -0,0 +1,384 @@
+"""
+見積もりサービス（HTTP / JSON）
+
+標準ライブラリの asyncio だけで動く小さな HTTP サーバー。送料データと人口データは TableRegistry から取得し、
+受注システムや CRM などからの見積もり要求に応答する。送料データのファイルが更新されると、
+バックグラウンドで読み込み直したデータに差し替える（計算中の見積もりは元のデータで完了する）。
+
+    GET  /health   稼働確認（送料データのバージョン・サイズコード・地域・処理件数）
+    POST /quote    1件の見積もり   リクエスト: シナリオ（python -m utils quote の JSONL 1行と同じ形式）
+    POST /quotes   複数件の見積もり リクエスト: {"scenarios": [シナリオ, ...]}
+
+1件ずつの見積もりは、短い時間（batch_window）に届いたものをまとめて calculate_batch で計算する。
+件数の多い一括見積もりはワーカープロセスで計算し、イベントループを止めない。
+
+使用例:
+    python -m utils serve --port 8080
+    curl -s localhost:8080/quote -d '{"total_shipments": 1000, "size_distribution": {"60": 1}}'
+"""
+import asyncio
+import json
+import logging
+import os
+import signal
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from http import HTTPStatus
+
+import numpy as np
+
+from utils.calculator import calculate_batch, iter_batch_summaries
+from utils.scenarios import ScenarioError, build_scenarios, summary_record
+
+logger = logging.getLogger(__name__)
+
+# リクエスト本文の上限（バイト）
+MAX_BODY_BYTES = 16 * 1024 * 1024
+# 見出し行の上限（行数）
+MAX_HEADER_LINES = 100
+
+# ワーカープロセスごとの送料データと人口データ（initializer で設定する）
+_worker_tables = None
+
+
+def _init_worker(rate_table, population_data):
+    global _worker_tables
+    _worker_tables = (rate_table, population_data)
+
+
+def _quote_scenarios(scenarios, scenario_ids, rate_table, population_data):
+    """
+    calculate_batch の入力配列をまとめて計算し、シナリオごとの応答を返す
+    """
+    batch_result = calculate_batch(scenarios, rate_table, population_data)
+    return [
+        summary_record(scenario_id, summary)
+        for scenario_id, summary in zip(scenario_ids, iter_batch_summaries(batch_result, rate_table))
+    ]
+
+
+def _quote_records(records, rate_table=None, population_data=None):
+    """
+    シナリオの辞書のリストを見積もる（ワーカープロセスではワーカーの送料データを使う）
+    """
+    if rate_table is None:
+        rate_table, population_data = _worker_tables
+    chunk = [(i, record) for i, record in enumerate(records, start=1)]
+    scenario_ids = [record.get('id', i) for i, record in chunk]
+    scenarios = build_scenarios(chunk, rate_table, population_data)
+    return _quote_scenarios(scenarios, scenario_ids, rate_table, population_data)
+
+
+def _worker_ready():
+    return True
+
+
+class QuoteService:
+    """
+    最新の送料データで見積もりを計算するサービス
+
+    Args:
+        registry (TableRegistry): 送料データ・人口データの提供元
+        workers (int, optional): 一括見積もり用のワーカープロセス数（0 の場合はプロセスを使わない、省略時はCPU数）
+        process_threshold (int): この件数以上の一括見積もりをワーカープロセスで計算する
+        batch_window (float): 1件ずつの見積もりをまとめる待ち時間（秒）
+        max_batch (int): まとめて計算する1件ずつの見積もりの上限
+    """
+
+    def __init__(self, registry, workers=None, process_threshold=2000, batch_window=0.002, max_batch=1024):
+        self.registry = registry
+        self.process_threshold = process_threshold
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+
+        # 小さな計算は1つのスレッドで順に行う（複数スレッドにしても GIL で速くならない）
+        self._thread_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='quote')
+        if workers is None:
+            workers = os.cpu_count() or 1
+        self.workers = workers
+        # ワーカープロセスは送料データの版ごとに作り直す（(スナップショット, プロセスプール) を1回の代入で差し替える）
+        self._process_pool = None
+        self._pool_lock = threading.Lock()
+        if self.workers > 0:
+            self._replace_process_pool(registry.current())
+            registry.add_listener(self._replace_process_pool)
+
+        self._pending = []
+        self._pending_snapshot = None
+        self._flush_handle = None
+        self.stats = {'requests': 0, 'quotes': 0, 'batches': 0, 'process_batches': 0, 'errors': 0}
+
+    def _replace_process_pool(self, snapshot):
+        """
+        新しい送料データを読み込んだワーカープロセスを起動して差し替える（監視スレッドから呼び出される）
+
+        プロセスの起動とデータの受け渡しが終わってから差し替えるため、差し替え後の要求は待たされない。
+        以前のプロセスは実行中の計算が終わってから終了する。
+        """
+        with self._pool_lock:
+            executor = ProcessPoolExecutor(
+                max_workers=self.workers, initializer=_init_worker,
+                initargs=(snapshot.rate_table, snapshot.population_data)
+            )
+            for future in [executor.submit(_worker_ready) for _ in range(self.workers)]:
+                future.result()
+            previous, self._process_pool = self._process_pool, (snapshot, executor)
+        if previous is not None:
+            previous[1].shutdown(wait=False)
+
+    def close(self):
+        self._thread_executor.shutdown(wait=False, cancel_futures=True)
+        if self._process_pool is not None:
+            self._process_pool[1].shutdown(wait=False, cancel_futures=True)
+
+    async def quote(self, record):
+        """
+        1件の見積もり（同時に届いた見積もりとまとめて計算する）
+
+        Raises:
+            ScenarioError: シナリオの形式が正しくない場合
+        """
+        if not isinstance(record, dict):
+            raise ScenarioError("シナリオはオブジェクトで指定してください")
+        # 形式の検証はここで行い、まとめて計算する他の見積もりに影響しないようにする
+        snapshot = self.registry.current()
+        scenarios = build_scenarios([(1, record)], snapshot.rate_table, snapshot.population_data)
+
+        # 送料データが差し替わった場合は、以前のデータで検証した見積もりを先に計算する
+        if self._pending and self._pending_snapshot is not snapshot:
+            self._flush()
+        self._pending_snapshot = snapshot
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((record.get('id', 1), scenarios, future))
+
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.batch_window, self._flush)
+
+        return await future
+
+    def _flush(self):
+        """
+        待機中の1件ずつの見積もりをまとめて計算する
+        """
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        pending, self._pending = self._pending, []
+        snapshot = self._pending_snapshot
+        if not pending:
+            return
+
+        scenario_ids = [scenario_id for scenario_id, _, _ in pending]
+        scenarios = {
+            'total_shipments': np.concatenate([item['total_shipments'] for _, item, _ in pending]),
+            'size_codes': pending[0][1]['size_codes'],
+            'size_proportions': np.concatenate([item['size_proportions'] for _, item, _ in pending]),
+            'region_percentages': np.concatenate([item['region_percentages'] for _, item, _ in pending])
+        }
+        self.stats['batches'] += 1
+
+        loop = asyncio.get_running_loop()
+        task = loop.run_in_executor(
+            self._thread_executor, _quote_scenarios,
+            scenarios, scenario_ids, snapshot.rate_table, snapshot.population_data
+        )
+
+        def deliver(task):
+            futures = [future for _, _, future in pending]
+            if task.exception() is not None:
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(task.exception())
+                return
+            for future, result in zip(futures, task.result()):
+                if not future.done():
+                    future.set_result(result)
+
+        task.add_done_callback(deliver)
+
+    async def quote_batch(self, records):
+        """
+        複数件の見積もり（件数が多い場合はワーカープロセスで計算する）
+
+        Raises:
+            ScenarioError: シナリオの形式が正しくない場合
+        """
+        if not isinstance(records, list) or not all(isinstance(record, dict) for record in records):
+            raise ScenarioError("scenarios はシナリオ（オブジェクト）の配列で指定してください")
+        if not records:
+            return []
+
+        loop = asyncio.get_running_loop()
+        process_pool = self._process_pool
+        if process_pool is not None and len(records) >= self.process_threshold:
+            self.stats['process_batches'] += 1
+            return await loop.run_in_executor(process_pool[1], _quote_records, records)
+        snapshot = self.registry.current()
+        return await loop.run_in_executor(
+            self._thread_executor, _quote_records, records, snapshot.rate_table, snapshot.population_data
+        )
+
+    def health(self):
+        snapshot = self.registry.current()
+        return {
+            'status': 'ok',
+            'rate_table_version': snapshot.version,
+            'generation': snapshot.generation,
+            'size_codes': list(snapshot.rate_table.size_codes),
+            'regions': list(snapshot.population_data.index),
+            'stats': dict(self.stats)
+        }
+
+
+async def _dispatch(service, method, path, body):
+    """
+    リクエストを処理し、(ステータス, 応答の辞書) を返す
+    """
+    path = path.split('?', 1)[0]
+    if path == '/health':
+        if method != 'GET':
+            return HTTPStatus.METHOD_NOT_ALLOWED, {'error': 'GET で要求してください'}
+        return HTTPStatus.OK, service.health()
+    if path not in ('/quote', '/quotes'):
+        return HTTPStatus.NOT_FOUND, {'error': f'{path} はありません'}
+    if method != 'POST':
+        return HTTPStatus.METHOD_NOT_ALLOWED, {'error': 'POST で要求してください'}
+
+    try:
+        payload = json.loads(body, parse_constant=_reject_constant)
+    except (UnicodeDecodeError, ValueError) as e:
+        return HTTPStatus.BAD_REQUEST, {'error': f'JSONとして解析できません ({e})'}
+
+    try:
+        if path == '/quote':
+            result = await service.quote(payload)
+            service.stats['quotes'] += 1
+            return HTTPStatus.OK, result
+        records = payload.get('scenarios') if isinstance(payload, dict) else None
+        results = await service.quote_batch(records)
+        service.stats['quotes'] += len(results)
+        return HTTPStatus.OK, {'results': results}
+    except ScenarioError as e:
+        return HTTPStatus.BAD_REQUEST, {'error': str(e)}
+
+
+def _reject_constant(name):
+    # NaN / Infinity は JSON の値ではないため受け付けない
+    raise ValueError(f"{name} は使用できません")
+
+
+def _response(status, payload, keep_alive):
+    try:
+        body = json.dumps(payload, ensure_ascii=False, allow_nan=False).encode('utf-8')
+    except ValueError:
+        logger.exception("応答を JSON に変換できません")
+        status = HTTPStatus.INTERNAL_SERVER_ERROR
+        body = json.dumps({'error': '応答を JSON に変換できません'}, ensure_ascii=False).encode('utf-8')
+    head = (
+        f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+        f"Content-Type: application/json; charset=utf-8\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    return head.encode('latin-1') + body
+
+
+async def handle_connection(service, reader, writer):
+    """
+    1つの接続のリクエストを順に処理する（HTTP/1.1 の keep-alive に対応）
+    """
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            try:
+                method, target, version = request_line.decode('latin-1').split()
+            except ValueError:
+                writer.write(_response(HTTPStatus.BAD_REQUEST, {'error': 'リクエスト行が正しくありません'}, False))
+                break
+
+            headers = {}
+            for _ in range(MAX_HEADER_LINES):
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+
+            keep_alive = (
+                version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                or headers.get('connection', '').lower() == 'keep-alive'
+            )
+
+            try:
+                length = int(headers.get('content-length', 0))
+            except ValueError:
+                length = -1
+            if length < 0 or length > MAX_BODY_BYTES:
+                writer.write(_response(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {'error': 'リクエストが大きすぎます'}, False))
+                break
+            body = await reader.readexactly(length)
+
+            service.stats['requests'] += 1
+            try:
+                status, payload = await _dispatch(service, method.upper(), target, body)
+            except Exception:
+                logger.exception("見積もりの計算中にエラーが発生しました")
+                status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {'error': '見積もりの計算中にエラーが発生しました'}
+            if status != HTTPStatus.OK:
+                service.stats['errors'] += 1
+
+            writer.write(_response(status, payload, keep_alive))
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def run_server(service, host='127.0.0.1', port=8080):
+    """
+    見積もりサービスを起動し、SIGINT / SIGTERM を受け取るまで処理を続ける
+    """
+    server = await asyncio.start_server(
+        lambda reader, writer: handle_connection(service, reader, writer), host, port
+    )
+    addresses = ', '.join(str(sock.getsockname()) for sock in server.sockets)
+    logger.info("見積もりサービスを起動しました: %s", addresses)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+    async with server:
+        await stop.wait()
+    logger.info("見積もりサービスを停止しました")
+
+
+def serve(registry, host='127.0.0.1', port=8080, workers=None, **options):
+    """
+    見積もりサービスを起動する（停止するまで戻らない）
+
+    Args:
+        registry (TableRegistry): 送料データ・人口データの提供元（監視は呼び出し元で開始する）
+        host (str): 待ち受けるアドレス（コンテナで公開する場合は 0.0.0.0）
+        port (int): 待ち受けるポート
+        workers (int, optional): 一括見積もり用のワーカープロセス数
+        **options: QuoteService のその他の引数
+    """
+    service = QuoteService(registry, workers=workers, **options)
+    try:
+        asyncio.run(run_server(service, host, port))
+    finally:
+        service.close()
@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+
+
+class ShippingResult:
+    """
+    サイズ別の送料計算結果（サイズ × 地域の数値配列）
+
+    サイズごとにデータフレームを作らず、出荷数・送料単価・送料をサイズ × 地域の配列で保持する。
+    サイズ名・重量は送料テーブル、地域名・都道府県は全体結果データフレームへの参照を共有するため、
+    セッションごとに増えるのは数値配列だけになる。データフレームは表示するときに frame で作成する。
+    生成後は読み取り専用として扱う。
+
+    Attributes:
+        rate_table (RateTable): 計算に使った送料テーブル（サイズ名・重量の参照元）
+        regions (Index): 地域名（列の並び）
+        labels (ndarray): 地域ごとの都道府県の表記（人口データにない場合は None）
+        size_codes (tuple): サイズコード（行の並び）
+        row_numbers (ndarray): 各サイズの送料テーブル上の行番号
+        proportions (ndarray): サイズ別の割合 (サイズ数)
+        rates (ndarray): 送料単価 (サイズ数 × 地域数)
+        shipments (ndarray): 出荷数 (サイズ数 × 地域数)
+        costs (ndarray): 送料 (サイズ数 × 地域数)
+    """
+
+    __slots__ = ('rate_table', 'regions', 'labels', 'size_codes', 'row_numbers',
+                 'proportions', 'rates', 'shipments', 'costs')
+
+    def __init__(self, rate_table, regions, labels, size_codes, row_numbers, proportions, rates, shipments, costs):
+        self.rate_table = rate_table
+        self.regions = regions
+        self.labels = labels
+        self.size_codes = tuple(str(code) for code in size_codes)
+        self.row_numbers = row_numbers
+        self.proportions = proportions
+        self.rates = rates
+        self.shipments = shipments
+        self.costs = costs
+
+    def __len__(self):
+        return len(self.size_codes)
+
+    @property
+    def size_names(self):
+        return tuple(self.rate_table.size_names[row_number] for row_number in self.row_numbers)
+
+    @property
+    def weights(self):
+        return tuple(self.rate_table.weights[row_number] for row_number in self.row_numbers)
+
+    @property
+    def nbytes(self):
+        """
+        この結果だけが保持する配列のバイト数（共有している送料テーブル・地域名は含まない）
+        """
+        return sum(array.nbytes for array in (self.row_numbers, self.proportions, self.rates, self.shipments, self.costs))
+
+    def totals(self):
+        """
+        サイズ別の出荷数と送料の合計を返す
+
+        Returns:
+            tuple: (サイズ別出荷数, サイズ別送料) いずれもサイズ数の配列
+        """
+        return self.shipments.sum(axis=1), self.costs.sum(axis=1)
+
+    def frame(self, i):
+        """
+        i 番目のサイズの結果を表示用のデータフレームとして作成する
+
+        Returns:
+            DataFrame: index を地域名とし、prefectures（ある場合）・size_shipments・rate・size_cost を持つ
+        """
+        columns = {}
+        if self.labels is not None:
+            columns['prefectures'] = self.labels
+        columns.update({
+            'size_shipments': self.shipments[i],
+            'rate': self.rates[i],
+            'size_cost': self.costs[i]
+        })
+        return pd.DataFrame(columns, index=pd.Index(self.regions, name='region'))
+
+    def equals(self, other):
+        """
+        計算結果（サイズ・地域・数値）が一致するかを返す
+        """
+        return (
+            isinstance(other, ShippingResult)
+            and self.size_codes == other.size_codes
+            and list(self.regions) == list(other.regions)
+            and self.size_names == other.size_names
+            and self.weights == other.weights
+            and all(
+                np.array_equal(getattr(self, name), getattr(other, name))
+                for name in ('proportions', 'rates', 'shipments', 'costs')
+            )
+        )
@@ -0,0 +1,147 @@
+"""
+需要の不確実性を考慮した送料のモンテカルロシミュレーション
+
+人口分布とサイズ構成のまわりで地域別・サイズ別の出荷数を多項分布（任意でディリクレ分布で
+比率自体もばらつかせる）から抽出し、送料の分布（P5 / P50 / P95 など）を求める。
+抽出は一定件数のシャードに分けて行い、シャードごとに SeedSequence から独立した乱数を
+割り当てるため、プロセス数を変えても同じシードからは同じ結果が得られる。
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from utils.calculator import build_rate_matrix
+from utils.instrumentation import span
+from utils.rate_table import as_rate_table
+
+# 1シャードで扱う抽出数 × 地域数 × サイズ数の上限（メモリ使用量の上限）
+MAX_SHARD_CELLS = 4_000_000
+
+
+def _simulate_shard(task):
+    """
+    1シャード分の抽出と送料計算を行う（ワーカープロセスで実行）
+
+    Returns:
+        tuple: (抽出ごとの総送料 (抽出数), 抽出ごとの地域別送料 (抽出数 × 地域数))
+    """
+    (seed_sequence, n_draws, total_shipments, region_shares, size_shares,
+     region_concentration, size_concentration, region_size_rates) = task
+    rng = np.random.default_rng(seed_sequence)
+
+    # 地域別の比率（集中度を指定した場合はディリクレ分布で比率自体をばらつかせる）
+    if region_concentration is not None:
+        region_pvals = rng.dirichlet(region_shares * region_concentration, size=n_draws)
+    else:
+        region_pvals = region_shares
+    region_counts = rng.multinomial(total_shipments, region_pvals, size=n_draws)
+
+    # 地域ごとのサイズ別出荷数（抽出 × 地域 × サイズ）
+    if size_concentration is not None:
+        size_pvals = rng.dirichlet(size_shares * size_concentration, size=n_draws)[:, np.newaxis, :]
+    else:
+        size_pvals = size_shares
+    cell_counts = rng.multinomial(region_counts, size_pvals)
+
+    region_costs = np.einsum('nrs,rs->nr', cell_counts, region_size_rates)
+    return region_costs.sum(axis=1), region_costs
+
+
+def _normalize(values):
+    values = np.asarray(values, dtype=float)
+    total = values.sum()
+    if total <= 0:
+        raise ValueError("比率の合計が0です")
+    return values / total
+
+
+def simulate_costs(total_shipments, population_data, shipping_rates, size_distribution,
+                   n_draws=100_000, region_concentration=None, size_concentration=None,
+                   percentiles=(5, 50, 95), seed=None, workers=None, shard_size=None):
+    """
+    地域別・サイズ別の出荷数をランダムに抽出し、送料の分布を求める
+
+    Args:
+        total_shipments (int): 全国総出荷個数
+        population_data (DataFrame): 地域別人口データ（percentage を地域別比率の中心に使う）
+        shipping_rates (RateTable or DataFrame): 送料テーブル
+        size_distribution (dict): サイズコードと割合の辞書（サイズ構成の中心）
+        n_draws (int): 抽出数
+        region_concentration (float, optional): 地域別比率のディリクレ分布の集中度。
+            小さいほど比率のばらつきが大きい。省略時は比率を固定して多項分布のみで抽出する
+        size_concentration (float, optional): サイズ構成のディリクレ分布の集中度（同上）
+        percentiles (tuple): 求めるパーセンタイル
+        seed (int, optional): 乱数のシード（同じシードとシャードサイズなら、プロセス数によらず同じ結果）
+        workers (int, optional): 並列処理のプロセス数（1の場合は現在のプロセスで処理、省略時はCPU数）
+        shard_size (int, optional): 1シャードの抽出数（省略時は地域数・サイズ数から決める）
+
+    Returns:
+        dict: シミュレーション結果
+            - 'n_draws', 'percentiles', 'regions'
+            - 'total_cost': パーセンタイル → 総送料
+            - 'region_cost': パーセンタイル → 地域別送料の配列 (地域数)
+            - 'mean_total_cost', 'mean_average_cost': 平均
+            - 'rate_table_version': 計算に使った送料データのバージョン
+    """
+    rate_table = as_rate_table(shipping_rates)
+    regions = list(population_data.index)
+    size_codes = list(size_distribution.keys())
+
+    region_shares = _normalize(population_data['percentage'].to_numpy())
+    size_shares = _normalize(list(size_distribution.values()))
+    rate_matrix, _ = build_rate_matrix(rate_table, size_codes, regions)
+    region_size_rates = np.ascontiguousarray(rate_matrix.T)
+
+    if shard_size is None:
+        shard_size = max(1, MAX_SHARD_CELLS // (len(regions) * len(size_codes)))
+    shard_counts = [min(shard_size, n_draws - start) for start in range(0, n_draws, shard_size)]
+    seed_sequences = np.random.SeedSequence(seed).spawn(len(shard_counts))
+
+    tasks = [
+        (seed_sequence, count, int(total_shipments), region_shares, size_shares,
+         region_concentration, size_concentration, region_size_rates)
+        for seed_sequence, count in zip(seed_sequences, shard_counts)
+    ]
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(tasks)))
+
+    total_costs = np.empty(n_draws, dtype=np.int64)
+    region_costs = np.empty((n_draws, len(regions)), dtype=np.int64)
+
+    with span('simulation', shards=len(tasks), workers=workers) as current:
+        if workers == 1:
+            results = map(_simulate_shard, tasks)
+            executor = None
+        else:
+            executor = ProcessPoolExecutor(max_workers=workers)
+            results = executor.map(_simulate_shard, tasks)
+
+        try:
+            position = 0
+            for shard_total, shard_regions in results:
+                total_costs[position:position + len(shard_total)] = shard_total
+                region_costs[position:position + len(shard_total)] = shard_regions
+                position += len(shard_total)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        current.rows = n_draws
+
+    total_percentiles = np.percentile(total_costs, percentiles)
+    region_percentiles = np.percentile(region_costs, percentiles, axis=0)
+    mean_total_cost = float(total_costs.mean())
+
+    return {
+        'n_draws': n_draws,
+        'percentiles': tuple(percentiles),
+        'regions': regions,
+        'total_cost': dict(zip(percentiles, total_percentiles)),
+        'region_cost': dict(zip(percentiles, region_percentiles)),
+        'mean_total_cost': mean_total_cost,
+        'mean_average_cost': mean_total_cost / total_shipments if total_shipments > 0 else 0,
+        'rate_table_version': rate_table.version
+    }
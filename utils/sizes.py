@@ -0,0 +1,119 @@
+"""
+荷物の寸法と重量からサイズコードを判定する
+
+通常サイズ（60〜180など）は、送料テーブルのサイズ名・重量の表記から読み取った
+3辺合計と重量の上限を昇順に並べ、np.searchsorted で一括判定する。
+コンパクト・ゆうパケットなどの特殊サイズは、それぞれ専用の規則で判定する。
+"""
+import numpy as np
+
+from utils.rate_table import as_rate_table
+
+# 特殊サイズの判定規則
+#   max_sides: 辺の長さの上限（長い順）、max_sum: 3辺合計の上限（None の項目は判定しない）
+#   max_weight: 重量の上限（送料テーブルの重量表記から読み取れない場合に使う）
+SPECIAL_SIZE_RULES = {
+    # ゆうパケット: 長辺34cm以内・厚さ3cm以内・3辺合計60cm以内・1kg以内
+    'yupacket': {'max_sides': (34.0, None, 3.0), 'max_sum': 60.0, 'max_weight': 1.0},
+    # 宅急便コンパクト: 専用BOX（25 × 20 × 5cm）に収まるもの・重量制限なし
+    'compact': {'max_sides': (25.0, 20.0, 5.0), 'max_sum': None, 'max_weight': np.inf},
+}
+
+# 特殊サイズを判定する順序（先に当てはまったものを採用）
+DEFAULT_SPECIAL_SIZES = ('yupacket', 'compact')
+
+
+class SizeClassifier:
+    """
+    寸法・重量の配列をサイズ（送料テーブルの行番号）の配列に変換する
+
+    Args:
+        shipping_rates (RateTable or DataFrame): 送料テーブル
+        special_sizes (tuple, optional): 判定に使う特殊サイズのコード（判定順）。
+            送料テーブルにないコードは無視する。空にすると通常サイズのみで判定する
+
+    Raises:
+        ValueError: 通常サイズの上限が読み取れない、または昇順になっていない場合
+    """
+
+    def __init__(self, shipping_rates, special_sizes=DEFAULT_SPECIAL_SIZES):
+        rate_table = as_rate_table(shipping_rates)
+        self.size_codes = np.array(rate_table.size_codes + ('',), dtype=object)
+
+        # 通常サイズ: 3辺合計の上限が読み取れる行（特殊サイズを除く）
+        special_codes = set(SPECIAL_SIZE_RULES)
+        standard_rows = [
+            i for i, code in enumerate(rate_table.size_codes)
+            if code not in special_codes and not np.isnan(rate_table.size_limits_cm[i])
+        ]
+        if not standard_rows:
+            raise ValueError("サイズ名から3辺合計の上限を読み取れるサイズがありません")
+
+        standard_rows = sorted(standard_rows, key=lambda i: rate_table.size_limits_cm[i])
+        self.standard_rows = np.array(standard_rows, dtype=np.int64)
+        self.size_limits = rate_table.size_limits_cm[self.standard_rows]
+        # 重量表記が読み取れない通常サイズは重量制限なしとみなす
+        self.weight_limits = np.nan_to_num(rate_table.weight_limits_kg[self.standard_rows], nan=np.inf)
+        if np.any(np.diff(self.weight_limits) < 0):
+            raise ValueError("通常サイズの重量の上限がサイズの昇順になっていません")
+
+        # 特殊サイズの判定規則（送料テーブルにあるものだけ）
+        self.special_rules = []
+        for code in special_sizes:
+            row_number = rate_table.index_of(code)
+            if row_number is None or code not in SPECIAL_SIZE_RULES:
+                continue
+            rule = dict(SPECIAL_SIZE_RULES[code])
+            if not np.isnan(rate_table.weight_limits_kg[row_number]):
+                rule['max_weight'] = rate_table.weight_limits_kg[row_number]
+            self.special_rules.append((row_number, rule))
+
+    def classify(self, length, width, height, weight):
+        """
+        寸法（cm）と重量（kg）の配列からサイズを判定する
+
+        Args:
+            length, width, height (ndarray): 3辺の長さ（cm、順不同）
+            weight (ndarray): 重量（kg）
+
+        Returns:
+            ndarray: 送料テーブルの行番号の int64 配列（どのサイズにも収まらない場合は -1）
+        """
+        length = np.asarray(length, dtype=float)
+        width = np.asarray(width, dtype=float)
+        height = np.asarray(height, dtype=float)
+        weight = np.asarray(weight, dtype=float)
+
+        side_sum = length + width + height
+        longest = np.maximum(np.maximum(length, width), height)
+        shortest = np.minimum(np.minimum(length, width), height)
+        middle = side_sum - longest - shortest
+
+        # 通常サイズ: 3辺合計と重量それぞれで収まる最小のサイズを求め、大きい方を採用する
+        by_size = np.searchsorted(self.size_limits, side_sum, side='left')
+        by_weight = np.searchsorted(self.weight_limits, weight, side='left')
+        position = np.maximum(by_size, by_weight)
+        oversize = position >= len(self.standard_rows)
+        rows = self.standard_rows[np.minimum(position, len(self.standard_rows) - 1)]
+        rows = np.where(oversize, -1, rows)
+
+        # 特殊サイズ: 判定順の逆から上書きし、先の規則を優先する
+        for row_number, rule in reversed(self.special_rules):
+            fits = weight <= rule['max_weight']
+            for side, limit in zip((longest, middle, shortest), rule['max_sides']):
+                if limit is not None:
+                    fits &= side <= limit
+            if rule['max_sum'] is not None:
+                fits &= side_sum <= rule['max_sum']
+            rows = np.where(fits, row_number, rows)
+
+        return rows
+
+    def classify_codes(self, length, width, height, weight):
+        """
+        寸法（cm）と重量（kg）の配列からサイズコードを判定する
+
+        Returns:
+            ndarray: サイズコードの配列（どのサイズにも収まらない場合は空文字）
+        """
+        return self.size_codes[self.classify(length, width, height, weight)]
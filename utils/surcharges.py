@@ -0,0 +1,275 @@
+"""
+送料の割増・手数料の規則（燃料サーチャージ・クール便料金・離島割増・荷役料など）
+
+送料データのCSVと同じディレクトリの「<CSVのファイル名>.surcharges.json」（例: shipping_rates.surcharges.json）に
+規則を記述すると、送料データの読み込み時に1回だけ送料テーブルのサイズ × 地域の配列にコンパイルし、
+計算のたびにサイズ × 地域の送料・出荷数の行列との積和（np.einsum）で規則ごとの金額を求める。
+規則の数・地域数・シナリオ数が増えても、行や規則ごとの Python のループにはならない。
+
+ファイルの形式:
+    {
+      "rules": [
+        {"name": "燃料サーチャージ", "percentage": 12},
+        {"name": "離島・遠隔地割増", "percentage": 20, "regions": ["北海道", "沖縄"]},
+        {"name": "クール便", "per_parcel": {"60": 275, "80": 275, "100": 385, "120": 660}},
+        {"name": "荷役料", "per_parcel": 80}
+      ]
+    }
+
+    percentage: 対象のサイズ・地域の基本送料の合計に対する割合（%）。規則ごとに合計してから1円未満を四捨五入する
+    per_parcel: 対象のサイズ・地域の1個あたりの料金（円）。サイズコードごとの金額も指定できる
+    regions, sizes（任意）: 規則を適用する地域名・サイズコード（省略時はすべて）
+
+割合は基本送料（送料単価 × 出荷数）に対してのみ計算し、他の規則の金額には掛けない。
+規則の金額は基本送料（total_cost）とは別に集計結果の surcharge_info に記録し、
+合計を surcharge_total、基本送料との合計を invoice_total とする。
+"""
+import hashlib
+import json
+import logging
+import os
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 規則の種類
+RULE_TYPES = ('percentage', 'per_parcel')
+
+
+class SurchargeRuleError(ValueError):
+    """割増・手数料の規則の形式が正しくない場合のエラー"""
+
+
+def surcharge_rules_path(rates_path):
+    """
+    送料データのCSVファイルに対応する規則ファイルのパスを返す
+    """
+    return os.path.splitext(rates_path)[0] + '.surcharges.json'
+
+
+def _number(rule_name, value, field):
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not np.isfinite(value):
+        raise SurchargeRuleError(f"規則 '{rule_name}' の {field} は数値で指定してください: {value!r}")
+    return value
+
+
+class SurchargeTable:
+    """
+    送料テーブルのサイズ × 地域の配列にコンパイルした割増・手数料の規則（読み取り専用）
+
+    Attributes:
+        names (tuple): 規則の名前
+        types (tuple): 規則の種類（'percentage' または 'per_parcel'）
+        percentages (ndarray): 割合（percentage の規則は小数、per_parcel の規則は0） (規則数)
+        masks (ndarray): 割合を適用するサイズ・地域を1とした配列 (規則数 × サイズ数 × 地域数)
+        fees (ndarray): 1個あたりの料金 (規則数 × サイズ数 × 地域数)
+        fingerprint (str): 規則の内容から計算したハッシュ値
+    """
+
+    __slots__ = ('names', 'types', 'percentages', 'masks', 'fees', 'fingerprint')
+
+    def __init__(self, names, types, percentages, masks, fees, fingerprint):
+        self.names = tuple(names)
+        self.types = tuple(types)
+        self.percentages = percentages
+        self.masks = masks
+        self.fees = fees
+        self.fingerprint = fingerprint
+        for array in (self.percentages, self.masks, self.fees):
+            array.flags.writeable = False
+
+    def __len__(self):
+        return len(self.names)
+
+    def __repr__(self):
+        return f"SurchargeTable({list(self.names)!r})"
+
+    @classmethod
+    def compile(cls, rules, rate_table):
+        """
+        規則の辞書のリストを送料テーブルのサイズ × 地域の配列にコンパイルする
+
+        Args:
+            rules (list): 規則の辞書のリスト（ファイルの "rules"）
+            rate_table (RateTable): 送料テーブル
+
+        Returns:
+            SurchargeTable: コンパイルした規則
+
+        Raises:
+            SurchargeRuleError: 規則の形式が正しくない、または送料データにない地域・サイズを指定した場合
+        """
+        if not isinstance(rules, list):
+            raise SurchargeRuleError("rules は規則の配列で指定してください")
+
+        shape = (len(rules), len(rate_table.size_codes), len(rate_table.regions))
+        percentages = np.zeros(len(rules), dtype=float)
+        masks = np.zeros(shape, dtype=np.int64)
+        fees = np.zeros(shape, dtype=np.int64)
+        names = []
+        types = []
+
+        for k, rule in enumerate(rules):
+            if not isinstance(rule, dict) or not rule.get('name'):
+                raise SurchargeRuleError(f"{k + 1}番目の規則に name がありません")
+            name = str(rule['name'])
+            if name in names:
+                raise SurchargeRuleError(f"規則の名前 '{name}' が重複しています")
+            rule_types = [rule_type for rule_type in RULE_TYPES if rule_type in rule]
+            if len(rule_types) != 1:
+                raise SurchargeRuleError(f"規則 '{name}' には percentage か per_parcel のどちらか一方を指定してください")
+            rule_type = rule_types[0]
+
+            # 適用するサイズ・地域（省略時はすべて）
+            size_mask = np.ones(shape[1], dtype=bool)
+            if rule.get('sizes') is not None:
+                size_mask[:] = False
+                size_mask[cls._size_rows(name, rule['sizes'], rate_table)] = True
+            region_mask = np.ones(shape[2], dtype=bool)
+            if rule.get('regions') is not None:
+                try:
+                    positions = rate_table.region_positions([str(region) for region in rule['regions']])
+                except ValueError as e:
+                    raise SurchargeRuleError(f"規則 '{name}': {e}") from None
+                region_mask[:] = False
+                region_mask[positions] = True
+            cell_mask = size_mask[:, np.newaxis] & region_mask[np.newaxis, :]
+
+            if rule_type == 'percentage':
+                percentages[k] = _number(name, rule['percentage'], 'percentage') / 100
+                masks[k] = cell_mask
+            else:
+                amounts = rule['per_parcel']
+                if isinstance(amounts, dict):
+                    size_amounts = np.zeros(shape[1], dtype=np.int64)
+                    for size_code, amount in amounts.items():
+                        rows = cls._size_rows(name, [size_code], rate_table)
+                        size_amounts[rows] = int(round(_number(name, amount, 'per_parcel')))
+                    fees[k] = np.where(cell_mask, size_amounts[:, np.newaxis], 0)
+                else:
+                    fees[k] = np.where(cell_mask, int(round(_number(name, amounts, 'per_parcel'))), 0)
+
+            names.append(name)
+            types.append(rule_type)
+
+        digest = hashlib.sha1(json.dumps(rules, ensure_ascii=False, sort_keys=True).encode('utf-8'))
+        return cls(names, types, percentages, masks, fees, digest.hexdigest())
+
+    @staticmethod
+    def _size_rows(rule_name, size_codes, rate_table):
+        rows = []
+        for size_code in size_codes:
+            row_number = rate_table.index_of(size_code)
+            if row_number is None:
+                raise SurchargeRuleError(f"規則 '{rule_name}': 送料データにないサイズコードです: {size_code}")
+            rows.append(row_number)
+        return rows
+
+    def select(self, row_numbers, region_positions):
+        """
+        計算に使うサイズ・地域の並びの配列を取り出す
+
+        Returns:
+            tuple: (割合を適用するセル, 1個あたりの料金) いずれも規則数 × サイズ数 × 地域数
+        """
+        index = np.ix_(np.arange(len(self.names)), np.asarray(row_numbers), np.asarray(region_positions))
+        return self.masks[index], self.fees[index]
+
+    def rule_costs(self, masked_costs, parcel_fees):
+        """
+        規則ごとの金額を求める
+
+        Args:
+            masked_costs (ndarray): 規則ごとの対象の基本送料の合計 (..., 規則数)
+            parcel_fees (ndarray): 規則ごとの1個あたりの料金 × 出荷数の合計 (..., 規則数)
+
+        Returns:
+            ndarray: 規則ごとの金額 (..., 規則数) の int64 配列（割合の金額は1円未満を四捨五入）
+        """
+        return np.floor(masked_costs * self.percentages + 0.5).astype(np.int64) + parcel_fees
+
+    def costs(self, row_numbers, region_positions, shipments, base_costs):
+        """
+        サイズ × 地域の出荷数と基本送料から、規則ごとの金額を求める
+
+        Args:
+            row_numbers (ndarray): 各サイズの送料テーブル上の行番号
+            region_positions (ndarray): 各地域の送料テーブル上の列番号
+            shipments (ndarray): 出荷数 (サイズ数 × 地域数)
+            base_costs (ndarray): 基本送料 (サイズ数 × 地域数)
+
+        Returns:
+            ndarray: 規則ごとの金額 (規則数)
+        """
+        masks, fees = self.select(row_numbers, region_positions)
+        return self.rule_costs(
+            np.einsum('ksr,sr->k', masks, base_costs),
+            np.einsum('ksr,sr->k', fees, shipments)
+        )
+
+
+def load_surcharge_rules(file_path, rate_table):
+    """
+    規則ファイル（JSON）を読み込み、送料テーブルに合わせてコンパイルする
+
+    Raises:
+        SurchargeRuleError: 規則ファイルの形式が正しくない場合
+    """
+    try:
+        with open(file_path, encoding='utf-8') as f:
+            document = json.load(f)
+    except json.JSONDecodeError as e:
+        raise SurchargeRuleError(f"規則ファイルをJSONとして解析できません: {file_path} ({e})") from None
+    if not isinstance(document, dict) or 'rules' not in document:
+        raise SurchargeRuleError(f"規則ファイルに rules がありません: {file_path}")
+
+    surcharges = SurchargeTable.compile(document['rules'], rate_table)
+    logger.info("割増・手数料の規則を読み込みました: %s（%d件）", file_path, len(surcharges))
+    return surcharges
+
+
+def surcharge_items(surcharges, rule_costs, total_cost):
+    """
+    規則ごとの金額を集計結果の項目（surcharge_info, surcharge_total, invoice_total）にする
+
+    Args:
+        surcharges (SurchargeTable): 規則
+        rule_costs (ndarray): 規則ごとの金額 (規則数)
+        total_cost: 基本送料の合計
+
+    Returns:
+        dict: 集計結果に加える項目
+    """
+    surcharge_total = rule_costs.sum()
+    return {
+        'surcharge_info': [
+            {'name': name, 'type': rule_type, 'cost': rule_costs[k]}
+            for k, (name, rule_type) in enumerate(zip(surcharges.names, surcharges.types))
+        ],
+        'surcharge_total': surcharge_total,
+        'invoice_total': total_cost + surcharge_total
+    }
+
+
+def surcharge_summary(size_results, total_cost):
+    """
+    サイズ別の計算結果から規則ごとの金額を求め、集計結果に加える項目を返す
+
+    Args:
+        size_results (ShippingResult): サイズ別の計算結果
+        total_cost: 基本送料の合計
+
+    Returns:
+        dict: 集計結果に加える項目（送料テーブルに規則がない場合は空の辞書）
+    """
+    surcharges = size_results.rate_table.surcharges
+    if surcharges is None:
+        return {}
+    rule_costs = surcharges.costs(
+        size_results.row_numbers,
+        size_results.rate_table.region_positions(size_results.regions),
+        size_results.shipments,
+        size_results.costs
+    )
+    return surcharge_items(surcharges, rule_costs, total_cost)
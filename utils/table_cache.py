@@ -0,0 +1,221 @@
+"""
+CSVから読み込んだテーブルのバイナリキャッシュ（サイドカー）
+
+CSVを初めて読み込んだときに、数値の配列を .npy、それ以外の情報を meta.json として
+CSVと同じディレクトリの .table_cache/ に書き出す。次回以降は CSV を解析せず、
+.npy をメモリマップ（mmap_mode='r'）で読み込むため、配列はコピーされずプロセス間でページを共有できる。
+
+CSVが常に正となる。キャッシュは CSV のサイズと更新時刻で照合し、更新時刻が変わっていても
+内容のハッシュ値（SHA-1）が同じであれば再利用する。キャッシュの書き込みに失敗した場合
+（読み取り専用のディレクトリなど）は何もせず、次回も CSV から読み込む。
+
+環境変数:
+    TABLE_CACHE_DIR: キャッシュの保存先（省略時は CSV と同じディレクトリの .table_cache）
+    TABLE_CACHE: false にするとキャッシュを使用しない
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR_NAME = '.table_cache'
+# キャッシュの形式を変更した場合は値を上げる（古いキャッシュは使用されない）
+FORMAT_VERSION = 1
+
+
+def is_enabled():
+    return os.getenv('TABLE_CACHE', 'true').lower() not in ('false', '0', 'no')
+
+
+def _sidecar_dir(source_path, kind):
+    """
+    CSVファイルと種類（'rate_table' など）に対応するキャッシュのディレクトリを返す
+    """
+    source_path = os.path.abspath(source_path)
+    base_dir = os.getenv('TABLE_CACHE_DIR')
+    if base_dir:
+        # 保存先を指定した場合は、別のディレクトリの同名ファイルと区別するためパスのハッシュ値を付ける
+        path_digest = hashlib.sha1(source_path.encode('utf-8')).hexdigest()[:12]
+        name = f"{os.path.basename(source_path)}.{path_digest}.{kind}"
+    else:
+        base_dir = os.path.join(os.path.dirname(source_path), CACHE_DIR_NAME)
+        name = f"{os.path.basename(source_path)}.{kind}"
+    return os.path.join(base_dir, name)
+
+
+def source_signature(source_path):
+    """
+    CSVファイルのサイズと更新時刻を返す（読み込み前に取得し、save に渡す）
+    """
+    stat = os.stat(source_path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _file_digest(source_path):
+    digest = hashlib.sha1()
+    with open(source_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _write_json(path, value):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(value, f, ensure_ascii=False)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def load(source_path, kind, params=None):
+    """
+    CSVファイルに対応するキャッシュを読み込む
+
+    Args:
+        source_path (str): CSVファイルのパス
+        kind (str): テーブルの種類（同じCSVから作る別の形式と区別する）
+        params (dict, optional): 作成時の条件（save と一致しない場合は使用しない）
+
+    Returns:
+        tuple: (meta.json に保存した情報, 配列名 → 読み取り専用のメモリマップ配列)。
+            キャッシュがない・古い場合は None
+    """
+    if not is_enabled():
+        return None
+
+    sidecar_dir = _sidecar_dir(source_path, kind)
+    meta_path = os.path.join(sidecar_dir, 'meta.json')
+    try:
+        with open(meta_path, encoding='utf-8') as f:
+            meta = json.load(f)
+        signature = source_signature(source_path)
+    except (OSError, ValueError):
+        return None
+
+    if meta.get('version') != FORMAT_VERSION or meta.get('kind') != kind or meta.get('params') != (params or {}):
+        return None
+
+    if meta.get('signature') != signature:
+        # 更新時刻だけが変わった場合（コピー・チェックアウトなど）は内容で照合する
+        if signature[0] != meta.get('signature', [None])[0] or _file_digest(source_path) != meta.get('sha1'):
+            return None
+        meta['signature'] = signature
+        try:
+            _write_json(meta_path, meta)
+        except OSError:
+            pass
+
+    try:
+        arrays = {
+            name: np.load(os.path.join(sidecar_dir, file_name), mmap_mode='r', allow_pickle=False)
+            for name, file_name in meta['arrays'].items()
+        }
+    except (OSError, ValueError) as e:
+        logger.warning("テーブルのキャッシュを読み込めませんでした: %s (%s)", sidecar_dir, e)
+        return None
+
+    logger.info("テーブルのキャッシュを読み込みました: %s", sidecar_dir)
+    return meta['fields'], arrays
+
+
+def save(source_path, kind, signature, fields, arrays, params=None):
+    """
+    CSVファイルから作成したテーブルをキャッシュに書き出す（失敗しても例外は送出しない）
+
+    Args:
+        source_path (str): CSVファイルのパス
+        kind (str): テーブルの種類
+        signature (list): CSVを読み込む前に source_signature で取得した値
+        fields (dict): JSON で保存する情報（文字列のリストなど）
+        arrays (dict): 配列名 → NumPy 配列（object 型は不可）
+        params (dict, optional): 作成時の条件
+    """
+    if not is_enabled():
+        return
+
+    sidecar_dir = _sidecar_dir(source_path, kind)
+    try:
+        digest = _file_digest(source_path)
+        # 読み込み中に CSV が更新された場合は書き出さない
+        if source_signature(source_path) != signature:
+            return
+
+        os.makedirs(sidecar_dir, exist_ok=True)
+        # 配列は内容ごとに別名で書き出し、最後に meta.json を置き換える
+        # （読み込み中のプロセスが古い meta.json で新しい配列を開くことはない）
+        file_names = {}
+        for name, array in arrays.items():
+            file_name = f"{digest[:12]}.{name}.npy"
+            fd, tmp_path = tempfile.mkstemp(dir=sidecar_dir, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, np.ascontiguousarray(array), allow_pickle=False)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, os.path.join(sidecar_dir, file_name))
+            file_names[name] = file_name
+
+        _write_json(os.path.join(sidecar_dir, 'meta.json'), {
+            'version': FORMAT_VERSION,
+            'kind': kind,
+            'params': params or {},
+            'signature': signature,
+            'sha1': digest,
+            'fields': fields,
+            'arrays': file_names
+        })
+
+        # 以前の内容の配列を削除する
+        for file_name in os.listdir(sidecar_dir):
+            if file_name.endswith('.npy') and file_name not in file_names.values():
+                try:
+                    os.unlink(os.path.join(sidecar_dir, file_name))
+                except OSError:
+                    pass
+    except (OSError, ValueError) as e:
+        logger.info("テーブルのキャッシュを書き出せませんでした: %s (%s)", sidecar_dir, e)
+
+
+def frame_to_arrays(df):
+    """
+    データフレームをキャッシュ用の配列に変換する
+
+    Returns:
+        tuple: (fields, arrays)。文字列以外のオブジェクトを含むなど変換できない場合は None
+    """
+    arrays = {}
+    columns = []
+    flat = df.reset_index()
+    for i, (name, series) in enumerate(list(flat.items())):
+        values = series.to_numpy()
+        if values.dtype == object:
+            if not all(isinstance(value, str) for value in values):
+                return None
+            values = values.astype(str)
+        elif values.dtype.kind not in 'biuf':
+            return None
+        arrays[f"c{i}"] = values
+        columns.append(str(name))
+
+    return {'columns': columns, 'index': columns[:df.index.nlevels]}, arrays
+
+
+def arrays_to_frame(fields, arrays):
+    """
+    frame_to_arrays で変換した配列からデータフレームを作成する
+
+    データフレームは呼び出し元で変更されることがあるため、メモリマップではなく配列をコピーして使う。
+    """
+    df = pd.DataFrame({
+        name: arrays[f"c{i}"].astype(object) if arrays[f"c{i}"].dtype.kind == 'U' else np.array(arrays[f"c{i}"])
+        for i, name in enumerate(fields['columns'])
+    })
+    return df.set_index(fields['index'])
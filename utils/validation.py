@@ -0,0 +1,171 @@
+"""
+アップロードされた送料CSVの検証
+
+見出し行だけを先に検証してから、型を指定して1回で解析し（フィールド数が見出しと異なる行はエラー）、
+そのまま計算に使える RateTable を返す。見出しが正しくないファイルや上限を超えるファイルは
+本文を解析する前にエラーにする。
+
+    送料単価: int32（数値以外・空欄・負の値はエラー）
+    サイズコード: category（空欄・重複はエラー）
+"""
+import csv
+import re
+import warnings
+from collections import defaultdict
+from io import BytesIO, StringIO
+
+import numpy as np
+import pandas as pd
+
+from utils.rate_table import META_COLUMNS, RateTable
+
+# アップロードの上限の既定値
+DEFAULT_MAX_BYTES = 1024 * 1024
+DEFAULT_MAX_ROWS = 1000
+
+# 文字コードの候補（Excel で保存した CSV は cp932 のことが多い）
+ENCODINGS = ('utf-8-sig', 'cp932')
+
+
+# C パーサーがフィールド数の多い行で出すエラー（例: "Expected 15 fields in line 4, saw 17"）
+_FIELD_COUNT_ERROR = re.compile(r'Expected (\d+) fields in line (\d+), saw (\d+)')
+
+
+class RateCsvError(ValueError):
+    """送料CSVの形式が正しくない場合のエラー"""
+
+
+def _decode_header(data):
+    """
+    見出し行を読み取り、(カラム名のリスト, 文字コード) を返す
+    """
+    header_line = data.split(b'\n', 1)[0]
+    for encoding in ENCODINGS:
+        try:
+            text = header_line.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+        columns = next(csv.reader(StringIO(text.rstrip('\r'))), [])
+        return columns, encoding
+    raise RateCsvError(f"文字コードを判別できません（{', '.join(ENCODINGS)} に対応しています）")
+
+
+def _find_invalid_rates(data, encoding, regions):
+    """
+    送料単価に数値以外の値を含む地域を探す（エラーメッセージ用、エラー時のみ実行）
+    """
+    df = pd.read_csv(BytesIO(data), usecols=regions, dtype=str, encoding=encoding, keep_default_na=False)
+    invalid = []
+    for region in regions:
+        values = pd.to_numeric(df[region].str.strip(), errors='coerce')
+        if values.isna().any() or (values % 1 != 0).any():
+            invalid.append(region)
+    return invalid
+
+
+def _field_count_error(message):
+    """
+    パーサーのフィールド数のエラーを、行番号を含むメッセージに変換する（該当しない場合は None）
+    """
+    match = _FIELD_COUNT_ERROR.search(message)
+    if match is None:
+        return None
+    expected, line_number, found = match.groups()
+    return f"{line_number}行目のフィールド数（{found}）が見出しのカラム数（{expected}）と一致しません"
+
+
+def read_rate_csv(data, regions, max_bytes=DEFAULT_MAX_BYTES, max_rows=DEFAULT_MAX_ROWS):
+    """
+    送料CSVを検証して RateTable に変換する
+
+    Args:
+        data (bytes): CSVファイルの内容
+        regions (list): 必須とする地域名のリスト（この順に送料単価の列を並べる）
+        max_bytes (int): ファイルサイズの上限
+        max_rows (int): 行数（見出しを除く）の上限
+
+    Returns:
+        RateTable: 送料単価を int32 で保持する送料テーブル
+
+    Raises:
+        RateCsvError: 上限を超える場合や、見出し・値が正しくない場合
+    """
+    if len(data) > max_bytes:
+        raise RateCsvError(f"ファイルサイズが上限（{max_bytes // 1024:,}KB）を超えています")
+
+    # 見出し行の検証（本文は解析しない）
+    columns, encoding = _decode_header(data)
+    regions = list(regions)
+    required_columns = list(META_COLUMNS) + regions
+    missing_columns = [col for col in required_columns if col not in columns]
+    if missing_columns:
+        raise RateCsvError(f"以下の必須カラムがCSVファイルに含まれていません: {', '.join(missing_columns)}")
+    duplicated_columns = sorted({col for col in columns if columns.count(col) > 1 and col in required_columns})
+    if duplicated_columns:
+        raise RateCsvError(f"以下のカラムが重複しています: {', '.join(duplicated_columns)}")
+
+    # 型を指定して1回で解析する（上限を1行超えたところで打ち切る）
+    # usecols を指定するとフィールド数の多い行がエラーにならず、値がずれて読み込まれるため、
+    # すべてのカラムを解析してパーサーにフィールド数を確認させる（必須以外のカラムは文字列のまま）
+    dtype = defaultdict(lambda: str, {'size_code': 'category', 'size_name': str, 'weight': str})
+    # int32 で直接解析すると範囲外の値が桁あふれするため、int64 で解析して範囲を確認してから int32 にする
+    dtype.update({region: np.int64 for region in regions})
+    try:
+        with warnings.catch_warnings():
+            # 1行目のデータのフィールド数が多い場合は、見出しとの不一致の警告をエラーにする
+            # （警告を無視すると余分な値が捨てられるか、先頭のカラムがインデックスになってずれる）
+            warnings.simplefilter('error', pd.errors.ParserWarning)
+            df = pd.read_csv(
+                BytesIO(data),
+                dtype=dtype,
+                encoding=encoding,
+                nrows=max_rows + 1,
+                index_col=False,
+                skipinitialspace=True
+            )
+    except UnicodeDecodeError:
+        raise RateCsvError(f"文字コード（{encoding}）で読み取れない行があります") from None
+    except pd.errors.ParserWarning:
+        raise RateCsvError(f"2行目のフィールド数が見出しのカラム数（{len(columns)}）と一致しません") from None
+    except pd.errors.ParserError as e:
+        message = _field_count_error(str(e))
+        raise RateCsvError(message or f"CSVファイルの形式が正しくありません: {e}") from None
+    except (ValueError, OverflowError):
+        try:
+            invalid_regions = _find_invalid_rates(data, encoding, regions)
+        except ValueError:
+            invalid_regions = []
+        if invalid_regions:
+            raise RateCsvError(
+                f"以下の地域の送料に整数以外の値（空欄を含む）があります: {', '.join(invalid_regions)}"
+            ) from None
+        raise RateCsvError("送料の値が範囲外、またはCSVファイルの形式が正しくありません") from None
+
+    if len(df) > max_rows:
+        raise RateCsvError(f"行数が上限（{max_rows:,}行）を超えています")
+    if len(df) == 0:
+        raise RateCsvError("送料データの行がありません")
+
+    size_codes = df['size_code']
+    if size_codes.isna().any():
+        raise RateCsvError("サイズコードが空欄の行があります")
+    if size_codes.duplicated().any():
+        duplicated = sorted(set(size_codes[size_codes.duplicated()].astype(str)))
+        raise RateCsvError(f"以下のサイズコードが重複しています: {', '.join(duplicated)}")
+    if df[['size_name', 'weight']].isna().any().any():
+        raise RateCsvError("サイズ名または重量が空欄の行があります")
+
+    rates = df[regions].to_numpy()
+    if (rates < 0).any():
+        raise RateCsvError("送料に負の値があります")
+    if (rates > np.iinfo(np.int32).max).any():
+        raise RateCsvError("送料の値が大きすぎます")
+    rates = rates.astype(np.int32)
+
+    return RateTable(
+        size_codes.astype(str).tolist(),
+        df['size_name'].tolist(),
+        df['weight'].tolist(),
+        regions,
+        rates
+    )
@@ -0,0 +1,144 @@
+import numpy as np
+import pandas as pd
+
+# 送料データの地域（運送会社の料金地域）の標準の並び
+REGIONS = ('北海道', '北東北', '南東北', '関東', '信越', '北陸', '中部', '関西', '中国', '四国', '九州', '沖縄')
+
+
+class ZoneTable:
+    """
+    ゾーン（都道府県・郵便番号ゾーンなど）と送料地域の対応表
+
+    ゾーンは 0 から始まる整数コードで表し、所属する地域のコードと人口を
+    NumPy 配列で保持する。ゾーン別の需要を地域別に集計する処理は
+    np.bincount 1回で行うため、ゾーン数が増えても計算量はほぼ線形に収まる。
+
+    Attributes:
+        zone_names (tuple): ゾーン名（コード順）
+        regions (tuple): 地域名（地域コード順）
+        zone_regions (ndarray): ゾーンごとの地域コード (ゾーン数の int32 配列)
+        population (ndarray): ゾーンごとの人口 (ゾーン数の float64 配列)
+        zone_index (dict): ゾーン名 → ゾーンコード（初回参照時に作成）
+    """
+
+    def __init__(self, zone_names, regions, zone_regions, population):
+        self.zone_names = tuple(str(name) for name in zone_names)
+        self.regions = tuple(regions)
+
+        zone_regions = np.ascontiguousarray(zone_regions, dtype=np.int32)
+        population = np.ascontiguousarray(population, dtype=np.float64)
+        if zone_regions.shape != (len(self.zone_names),) or population.shape != zone_regions.shape:
+            raise ValueError("ゾーン名・地域コード・人口の件数が一致しません")
+        if len(zone_regions) and (zone_regions.min() < 0 or zone_regions.max() >= len(self.regions)):
+            raise ValueError("地域コードが範囲外です")
+        zone_regions.flags.writeable = False
+        population.flags.writeable = False
+        self.zone_regions = zone_regions
+        self.population = population
+
+        self._zone_index = None
+        self._zone_labels = None
+
+    @classmethod
+    def from_dataframe(cls, zone_data, regions=REGIONS):
+        """
+        ゾーンデータ（zone, region, population のカラム）から ZoneTable を作成する
+
+        Args:
+            zone_data (DataFrame): ゾーンデータ
+            regions (list, optional): 地域名の並び。ここにない地域のゾーンはエラーとする
+
+        Returns:
+            ZoneTable: ゾーンと地域の対応表
+
+        Raises:
+            ValueError: 必須カラムの不足や未知の地域が含まれる場合
+        """
+        missing_columns = [col for col in ('zone', 'region', 'population') if col not in zone_data.columns]
+        if missing_columns:
+            raise ValueError(f"以下の必須カラムがゾーンデータに含まれていません: {', '.join(missing_columns)}")
+
+        region_codes = pd.Index(regions).get_indexer(zone_data['region'])
+        if (region_codes < 0).any():
+            unknown = sorted(set(zone_data['region'][region_codes < 0].astype(str)))
+            raise ValueError(f"以下の地域は送料地域に含まれていません: {', '.join(unknown)}")
+
+        population = pd.to_numeric(zone_data['population'], errors='coerce')
+        if population.isna().any():
+            raise ValueError("人口に数値以外の値が含まれています")
+
+        return cls(zone_data['zone'].tolist(), regions, region_codes, population.to_numpy())
+
+    @property
+    def zone_index(self):
+        # ゾーン数が多い場合に読み込みを遅くしないよう、使用するときに作成する
+        if self._zone_index is None:
+            self._zone_index = {name: i for i, name in enumerate(self.zone_names)}
+        return self._zone_index
+
+    def __len__(self):
+        return len(self.zone_names)
+
+    def __repr__(self):
+        return f"ZoneTable(zones={len(self.zone_names)}, regions={len(self.regions)})"
+
+    def encode(self, zone_names):
+        """
+        ゾーン名の配列をゾーンコードの配列に変換する（未知のゾーンは -1）
+        """
+        return pd.Index(self.zone_names).get_indexer(pd.Index(zone_names)).astype(np.int32)
+
+    def region_totals(self, zone_values):
+        """
+        ゾーン別の値（需要・出荷数など）を地域別に合計する
+
+        Args:
+            zone_values (ndarray): ゾーンごとの値 (ゾーン数)
+
+        Returns:
+            ndarray: 地域ごとの合計 (地域数)
+        """
+        return np.bincount(self.zone_regions, weights=zone_values, minlength=len(self.regions))
+
+    def region_population(self, zone_weights=None):
+        """
+        ゾーン別の人口（任意でゾーンごとの重みを掛けたもの）を地域別に集計する
+
+        Args:
+            zone_weights (ndarray, optional): ゾーンごとの需要の重み (ゾーン数)
+
+        Returns:
+            ndarray: 地域ごとの人口 (地域数)
+        """
+        demand = self.population if zone_weights is None else self.population * zone_weights
+        return self.region_totals(demand)
+
+    def zone_labels(self):
+        """
+        地域ごとの所属ゾーン名を '・' で連結した表示用ラベルを返す（初回のみ作成）
+        """
+        if self._zone_labels is None:
+            names_by_region = [[] for _ in self.regions]
+            for name, region_code in zip(self.zone_names, self.zone_regions):
+                names_by_region[region_code].append(name)
+            self._zone_labels = tuple('・'.join(names) for names in names_by_region)
+        return self._zone_labels
+
+    def to_population_data(self, zone_weights=None):
+        """
+        地域別人口データ（load_population_data と同じ形式）に集約する
+
+        Args:
+            zone_weights (ndarray, optional): ゾーンごとの需要の重み (ゾーン数)
+
+        Returns:
+            DataFrame: 地域別人口データ（indexを地域名に設定）
+        """
+        population = self.region_population(zone_weights)
+        total = population.sum()
+        df = pd.DataFrame({
+            'population': population,
+            'percentage': population / total if total > 0 else np.zeros(len(population)),
+            'prefectures': self.zone_labels()
+        }, index=pd.Index(self.regions, name='region'))
+        return df